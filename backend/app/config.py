@@ -1,6 +1,7 @@
 import logging
+from typing import Literal
 
-from pydantic import model_validator
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 logger = logging.getLogger(__name__)
@@ -20,6 +21,13 @@ class Settings(BaseSettings):
     AZURE_OPENAI_DALLE_DEPLOYMENT: str = "dall-e-3"
     AZURE_OPENAI_API_VERSION: str = "2024-10-21"
 
+    # Embeddings — "azure" calls the embedding deployment, "local" runs on CPU offline
+    AZURE_OPENAI_EMBEDDING_DEPLOYMENT: str = "text-embedding-3-small"
+    EMBEDDING_BACKEND: Literal["azure", "local"] = "azure"
+    EMBEDDING_BATCH_SIZE: int = 16  # max inputs per upstream request
+    EMBEDDING_CACHE_DIR: str = ""  # default: backend/data/embedding-cache
+    LOCAL_EMBEDDING_MODEL: str = "hashing"  # or a sentence-transformers model name
+
     # Azure AI Services (Computer Vision, etc.)
     AZURE_AI_SERVICES_ENDPOINT: str = ""
     AZURE_AI_SERVICES_KEY: str = ""
@@ -28,6 +36,43 @@ class Settings(BaseSettings):
     AZURE_SEARCH_ENDPOINT: str = ""
     AZURE_SEARCH_KEY: str = ""
     AZURE_SEARCH_INDEX: str = "ai102-index"
+    AZURE_SEARCH_SUGGESTER: str = ""  # index suggester name; set to pass suggest/autocomplete through to Azure
+
+    # Search backend — "azure" uses search_service as implemented in the labs,
+    # "local" uses the embedded BM25 engine (offline development and tests)
+    SEARCH_BACKEND: Literal["azure", "local"] = "azure"
+    LOCAL_SEARCH_DIR: str = ""  # default: backend/data/search-index
+
+    # Incremental indexing — chunk-level manifests so re-uploads only send changes
+    INCREMENTAL_INDEXING: bool = False
+    DOCUMENTS_DIR: str = ""  # folder for bulk sync, default: data/documents at the repo root
+
+    # Search result cache — invalidated on every upload/delete; TTL 0 disables it
+    SEARCH_CACHE_TTL_SECONDS: float = 60.0
+    SEARCH_CACHE_MAX_ENTRIES: int = 1024
+
+    # Local vector search — chunk embeddings fused with keyword results for RAG
+    VECTOR_SEARCH_ENABLED: bool = False
+    VECTOR_INDEX_DIR: str = ""  # default: backend/data/vector-index
+    VECTOR_DTYPE: Literal["float32", "float16"] = "float32"
+    VECTOR_ANN_MIN_SIZE: int = 2048  # below this, exact brute-force search is used
+    VECTOR_IVF_NPROBE: int = 8
+
+    # AI enrichment — local skillset pipeline run by incremental indexing and sync
+    ENRICHMENT_ENABLED: bool = False
+    ENRICHMENT_SKILLS: str = "extract,language,keyPhrases,entities,images,imageText"
+    ENRICHMENT_BATCH_SIZE: int = 8
+    ENRICHMENT_CONCURRENCY: int = 4  # workers per skill
+    ENRICHMENT_CACHE_FILE: str = ""  # default: backend/data/enrichment-cache.jsonl
+    ENRICHMENT_TIMEOUT_SECONDS: float = 600.0  # per pipeline run (one upload or sync pass)
+
+    # Background indexer — watches data/documents, data/images and data/audio
+    INDEXER_ENABLED: bool = False
+    INDEXER_RECONCILE_SECONDS: float = 60.0  # full rescan interval (the only detection without watchfiles)
+    INDEXER_BATCH_SIZE: int = 16
+    INDEXER_QUEUE_SIZE: int = 256
+    INDEXER_DEBOUNCE_SECONDS: float = 0.5
+    INDEXER_CHECKPOINT_FILE: str = ""  # default: backend/data/indexer-checkpoint.json
 
     # Azure Document Intelligence
     AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT: str = ""
@@ -44,6 +89,58 @@ class Settings(BaseSettings):
     # Azure Content Safety
     AZURE_CONTENT_SAFETY_ENDPOINT: str = ""
     AZURE_CONTENT_SAFETY_KEY: str = ""
+    # Guarded chat withholds replies with any category at or above this severity (0-6)
+    GUARDED_CHAT_SEVERITY_THRESHOLD: int = Field(default=4, ge=0, le=6)
+    # Local pre-filter — decide clearly safe / clearly injected prompts without calling Azure
+    SAFETY_PREFILTER_ENABLED: bool = False
+    SAFETY_PREFILTER_SAFE_MAX_CHARS: int = 200
+    SAFETY_PREFILTER_PATTERNS_FILE: str = ""
+
+    # Token accounting — prompt limit ("trim" drops oldest turns, "reject" returns 400),
+    # completion cap, and per-client (per IP) daily budget (0 = unlimited)
+    TOKEN_MAX_PROMPT_TOKENS: int = 16000
+    TOKEN_MAX_COMPLETION_TOKENS: int = 16384
+    PROMPT_LIMIT_POLICY: Literal["trim", "reject"] = "trim"
+    TOKEN_DAILY_BUDGET: int = 0
+
+    # Conversation sessions — server-side history when requests carry a conversation_id
+    CONVERSATION_MAX_SESSIONS: int = 1000
+    CONVERSATION_TTL_SECONDS: float = 3600.0
+    CONVERSATION_TOKEN_BUDGET: int = 3000
+    CONVERSATION_KEEP_RECENT_TURNS: int = 4
+
+    # Agent runtime — execute model tool calls for real instead of the Lab 06 simulation
+    AGENT_RUNTIME_ENABLED: bool = False
+    AGENT_MAX_STEPS: int = 5
+    AGENT_MAX_TOKENS: int = 8000
+    AGENT_TOOL_TIMEOUT_SECONDS: float = 15.0
+    AGENT_MAX_PARALLEL_TOOLS: int = 8
+
+    # Generated image cache — download once, serve from /api/generative/images/{hash}
+    IMAGE_CACHE_ENABLED: bool = False
+    IMAGE_CACHE_DIR: str = ""
+    IMAGE_CACHE_MAX_BYTES: int = 500 * 1024 * 1024
+    IMAGE_CACHE_PUBLIC_URL: str = ""  # backend base URL as browsers reach it; default: the request's
+
+    # Single-flight — identical concurrent image/vision/validate calls share one upstream call
+    SINGLEFLIGHT_ENABLED: bool = True
+
+    # Record/replay — "record" archives real service responses, "replay" serves them
+    REPLAY_MODE: Literal["off", "record", "replay"] = "off"
+    REPLAY_ARCHIVE: str = ""
+    REPLAY_MISS: Literal["passthrough", "error"] = "passthrough"
+    REPLAY_LATENCY: Literal["none", "recorded", "distribution"] = "none"
+    REPLAY_LATENCY_SCALE: float = 1.0
+
+    # Upload forwarding — pass the spooled upload file to services instead of a bytes copy
+    UPLOAD_ZERO_COPY: bool = False
+
+    # Managed identity — fetch Entra ID (AAD) tokens instead of using keys where supported
+    AZURE_USE_MANAGED_IDENTITY: bool = False
+
+    # Startup warm-up — pre-open connections and prefetch tokens before reporting ready
+    WARMUP_ON_STARTUP: bool = True
+    WARMUP_TIMEOUT_SECONDS: float = 10.0
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
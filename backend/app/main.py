@@ -1,10 +1,16 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app import metrics, uploads, warmup
 from app.config import settings
+from app.responses import FastJSONResponse
 from app.routers import generative, agents, vision, language, search, safety, progress, validate, documents
+from app.services import azure_clients, indexer, replay, tokens
 
 # Configure structured logging
 logging.basicConfig(
@@ -13,12 +19,38 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so /health answers immediately; /ready waits for it
+    warmup_task = asyncio.create_task(warmup.run_warmup())
+    if settings.INDEXER_ENABLED:
+        await indexer.get_indexer().start()
+    yield
+    warmup_task.cancel()
+    if settings.INDEXER_ENABLED:
+        await indexer.get_indexer().stop()
+    azure_clients.close()
+    replay.close()
+
+
 app = FastAPI(
     title="AI-102 Command Center API",
     description="Backend API for the AI-102 exam preparation command center",
     version="0.1.0",
+    lifespan=lifespan,
+    # orjson-backed; large payload routes bypass jsonable_encoder, see app/responses.py
+    default_response_class=FastJSONResponse,
 )
 
+# Record/replay backend — wraps service functions when REPLAY_MODE is record or replay
+replay.install()
+if settings.REPLAY_MODE == "replay" and settings.REPLAY_LATENCY != "none":
+    app.add_middleware(replay.LatencyMiddleware)
+
+# Reject oversized uploads before their body is buffered
+app.add_middleware(uploads.UploadLimitMiddleware)
+
 # CORS middleware — configurable via environment
 cors_origins = (
     [o.strip() for o in settings.CORS_ORIGINS.split(",") if o.strip()]
@@ -52,3 +84,24 @@ app.include_router(validate.router)
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "demo_mode": settings.DEMO_MODE}
+
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Counters and gauges recorded by caches and other infrastructure."""
+    return metrics.snapshot()
+
+
+@app.get("/api/usage")
+async def get_usage(request: Request):
+    """The caller's token usage today and remaining budget (other callers' usage is not exposed)."""
+    client_key = tokens.client_key(request)
+    return {"client_key": client_key, **tokens.usage_report(client_key)}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe — 503 until startup warm-up has finished."""
+    if not warmup.state.done:
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {"status": "ready", "warmup": warmup.state.report}
@@ -0,0 +1,41 @@
+"""In-process counters and gauges, exposed as JSON at /api/metrics.
+
+Services record events with incr() and register callables for values that
+are computed on demand (cache sizes, hit rates) with register_gauge().
+"""
+
+import threading
+from collections.abc import Callable
+
+_lock = threading.Lock()
+_counters: dict[str, float] = {}
+_gauges: dict[str, Callable[[], object]] = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get(name: str) -> float:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def register_gauge(name: str, fn: Callable[[], object]) -> None:
+    _gauges[name] = fn
+
+
+def ratio(numerator: str, denominator_parts: list[str]) -> float:
+    """numerator / sum(denominator_parts), 0.0 when nothing was recorded."""
+    with _lock:
+        total = sum(_counters.get(p, 0) for p in denominator_parts)
+        return round(_counters.get(numerator, 0) / total, 4) if total else 0.0
+
+
+def snapshot() -> dict:
+    with _lock:
+        data: dict[str, object] = dict(sorted(_counters.items()))
+    for name, fn in sorted(_gauges.items()):
+        data[name] = fn()
+    return data
@@ -0,0 +1,55 @@
+"""Fast JSON responses for large payloads.
+
+FastJSONResponse is the app's default response class. It renders with
+orjson when installed and falls back to stdlib json otherwise.
+
+For routes without a response model FastAPI first runs the return value
+through jsonable_encoder, which is almost all of the cost for large dicts
+(document analysis tables, search results, validation reports). Those
+routes return FastJSONResponse(...) directly to skip that step, and
+model_response() serializes response models with a TypeAdapter compiled
+once per type. benchmarks/bench_json.py compares the paths.
+"""
+
+import functools
+import json
+from collections.abc import Callable
+from types import ModuleType
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+from starlette.responses import Response
+
+orjson: ModuleType | None
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON; types orjson can't handle go through jsonable_encoder."""
+    if orjson is not None:
+        return orjson.dumps(content, default=jsonable_encoder, option=_ORJSON_OPTIONS)
+    return json.dumps(
+        content, default=jsonable_encoder, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+@functools.lru_cache(maxsize=128)
+def encoder(tp: Any) -> Callable[[Any], bytes]:
+    """JSON encoder for a type, built once; returns TypeAdapter(tp).dump_json."""
+    return TypeAdapter(tp).dump_json
+
+
+def model_response(model: BaseModel, status_code: int = 200) -> Response:
+    return Response(content=encoder(type(model))(model), status_code=status_code, media_type="application/json")
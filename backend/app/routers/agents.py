@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+import logging
 
-from app.services import openai_service
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+
+from app.config import settings
+from app.services import agent_runtime, conversations, openai_service, tokens, usage
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/agents", tags=["agents"])
 
@@ -18,32 +23,88 @@ class AgentChatRequest(BaseModel):
     agent_id: str
     messages: list[dict]
     agent_config: AgentConfig
+    # Keep history per agent server-side: new_conversation=true returns a conversation_id;
+    # requests with that id send only the new turn
+    new_conversation: bool = False
+    conversation_id: str | None = Field(None, min_length=1, max_length=128)
 
 
 class ToolCall(BaseModel):
     tool: str
     input: str
     output: str
+    status: str | None = None
+    duration_ms: float | None = None
 
 
 class AgentChatResponse(BaseModel):
     message: str
     tool_calls: list[ToolCall] | None = None
+    steps: int | None = None
+    total_tokens: int | None = None
+    conversation_id: str | None = None
+    usage: dict | None = None
+
+
+@router.get("/tools")
+async def list_tools():
+    """Tools the agent runtime can execute."""
+    return [{"name": t.name, "description": t.description} for t in agent_runtime.TOOLS.values()]
 
 
 @router.post("/chat", response_model=AgentChatResponse)
-async def agent_chat(req: AgentChatRequest):
+async def agent_chat(req: AgentChatRequest, request: Request):
+    request_usage = usage.track()
+    client_key = tokens.client_key(request)
+    conversation_id = req.conversation_id or (conversations.new_id() if req.new_conversation else None)
+    key = conversations.agent_key(client_key, req.agent_id, conversation_id) if conversation_id else None
     try:
-        result = openai_service.chat_with_tools(
-            messages=req.messages,
-            system_instructions=req.agent_config.instructions,
-            tools=req.agent_config.tools,
-        )
-        return AgentChatResponse(
-            message=result["message"],
-            tool_calls=[ToolCall(**tc) for tc in result["tool_calls"]] if result["tool_calls"] else None,
-        )
+        async with conversations.turn(key, create=not req.conversation_id) as session:
+            messages = conversations.with_history(session, req.messages)
+            admission = tokens.admit(client_key, messages)
+            try:
+                if settings.AGENT_RUNTIME_ENABLED:
+                    result = await agent_runtime.run(
+                        messages=admission.messages,
+                        instructions=req.agent_config.instructions,
+                        tool_names=req.agent_config.tools,
+                        knowledge_sources=req.agent_config.knowledgeSources,
+                    )
+                else:
+                    result = openai_service.chat_with_tools(
+                        messages=admission.messages,
+                        system_instructions=req.agent_config.instructions,
+                        tools=req.agent_config.tools,
+                    )
+            except BaseException:
+                tokens.release(admission)
+                raise
+            tokens.settle(admission, result["message"])
+            conversations.record(session, req.messages, result["message"])
+            return AgentChatResponse(
+                message=result["message"],
+                tool_calls=[ToolCall(**tc) for tc in result["tool_calls"]] if result["tool_calls"] else None,
+                steps=result.get("steps"),
+                total_tokens=result.get("total_tokens"),
+                conversation_id=conversation_id,
+                usage=request_usage.as_dict(),
+            )
+    except conversations.ConversationNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except tokens.TokenLimitError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except tokens.BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except RuntimeError as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
+        logger.error("Agent chat error", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.delete("/{agent_id}/conversations/{conversation_id}")
+async def delete_conversation(agent_id: str, conversation_id: str, request: Request):
+    # Keys include the caller, so another client's conversation is not found
+    if not conversations.delete(conversations.agent_key(tokens.client_key(request), agent_id, conversation_id)):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"status": "deleted", "agent_id": agent_id, "conversation_id": conversation_id}
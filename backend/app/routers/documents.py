@@ -4,6 +4,8 @@ import logging
 
 from fastapi import APIRouter, HTTPException, UploadFile, File
 
+from app import uploads
+from app.responses import FastJSONResponse
 from app.services import document_service
 
 logger = logging.getLogger(__name__)
@@ -19,6 +21,8 @@ ALLOWED_DOC_TYPES = {
     "image/bmp",
 }
 
+uploads.register_limit(router.prefix + "/analyze", MAX_FILE_SIZE)
+
 
 @router.post("/analyze")
 async def analyze_document(
@@ -27,23 +31,9 @@ async def analyze_document(
 ):
     """Analyze a document using a prebuilt or custom model."""
     try:
-        content_type = file.content_type or ""
-        if content_type not in ALLOWED_DOC_TYPES:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported file type '{content_type}'. Allowed: PDF, JPEG, PNG, TIFF, BMP.",
-            )
-        doc_bytes = await file.read()
-        if len(doc_bytes) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large. Maximum is {MAX_FILE_SIZE // (1024*1024)} MB.",
-            )
-        if len(doc_bytes) == 0:
-            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
-
-        result = document_service.analyze_document(doc_bytes, model)
-        return result
+        document = await uploads.open_upload(file, MAX_FILE_SIZE, ALLOWED_DOC_TYPES)
+        result = document_service.analyze_document(document, model)
+        return FastJSONResponse(result)
     except HTTPException:
         raise
     except RuntimeError as e:
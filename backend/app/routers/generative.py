@@ -1,10 +1,24 @@
 import logging
+import re
+from collections.abc import Callable
+from typing import Literal
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel, Field
-from typing import Literal
 
-from app.services import openai_service, search_service
+from app.responses import model_response
+from app.services import (
+    conversations,
+    embeddings,
+    guarded_chat,
+    image_cache,
+    openai_service,
+    prompt_builder,
+    retrieval,
+    singleflight,
+    tokens,
+    usage,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -25,11 +39,21 @@ class ChatRequest(BaseModel):
     frequency_penalty: float = Field(0.0, ge=-2, le=2)
     presence_penalty: float = Field(0.0, ge=-2, le=2)
     use_rag: bool = False
+    # Screen the prompt (Prompt Shield) and the reply (Content Safety) — see guarded_chat
+    guarded: bool = False
+    # Keep history server-side: new_conversation=true returns a conversation_id;
+    # requests with that id send only the new turn
+    new_conversation: bool = False
+    conversation_id: str | None = Field(None, min_length=1, max_length=128)
 
 
 class ChatResponse(BaseModel):
     message: str
     sources: list[str] | None = None
+    safety: dict | None = None
+    conversation_id: str | None = None
+    # Upstream token usage, including prompt tokens served from the provider's cache
+    usage: dict | None = None
 
 
 class ImageRequest(BaseModel):
@@ -40,54 +64,121 @@ class ImageResponse(BaseModel):
     url: str
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+class EmbeddingsRequest(BaseModel):
+    input: list[str] = Field(..., min_length=1, max_length=2048)
+
+
+class EmbeddingsResponse(BaseModel):
+    model: str
+    dimensions: int
+    data: list[list[float]]
+
+
+def _last_user_message(messages: list[ChatMessage]) -> str:
+    for msg in reversed(messages):
+        if msg.role == "user":
+            return msg.content
+    return ""
+
+
+def _prepare_messages(
+    req: ChatRequest, session: conversations.Conversation | None
+) -> tuple[list[dict], list[str] | None]:
+    """Build upstream messages with stored history and RAG context, ordered for prompt caching."""
+    sources: list[str] | None = None
+    conversation = conversations.with_history(session, [{"role": m.role, "content": m.content} for m in req.messages])
+
+    if req.use_rag:
+        last_user_msg = _last_user_message(req.messages)
+        if last_user_msg:
+            try:
+                search_results = retrieval.retrieve(last_user_msg, top=5)
+                context_parts = []
+                sources = []
+                for r in search_results:
+                    context_parts.append(r.get("content", ""))
+                    # Several chunks can come from the same document
+                    if r.get("source") and r["source"] not in sources:
+                        sources.append(r["source"])
+
+                if context_parts:
+                    # Retrieved context changes every turn — keep it after the cacheable prefix
+                    context = "\n\n".join(context_parts)
+                    return prompt_builder.build(conversation, prompt_builder.RAG_INSTRUCTIONS, context), sources
+            except Exception:
+                logger.warning("RAG search failed, proceeding without context", exc_info=True)
+                sources = None
+
+    return conversation, sources
+
+
+def _record_turn(req: ChatRequest, session: conversations.Conversation | None, reply: str) -> None:
+    conversations.record(session, [{"role": m.role, "content": m.content} for m in req.messages], reply)
+
+
+def _generate(req: ChatRequest, messages: list[dict], client_key: str) -> tuple[str, Callable[[bool], None]]:
+    """Call the model; returns the reply and finish(delivered), which charges the caller or releases the tokens."""
+    admission = tokens.admit(client_key, messages, req.max_tokens)
     try:
-        sources = None
-
-        if req.use_rag:
-            last_user_msg = ""
-            for msg in reversed(req.messages):
-                if msg.role == "user":
-                    last_user_msg = msg.content
-                    break
-
-            if last_user_msg:
-                try:
-                    search_results = search_service.search_documents(last_user_msg)
-                    context_parts = []
-                    sources = []
-                    for r in search_results[:5]:
-                        context_parts.append(r.get("content", ""))
-                        if r.get("source"):
-                            sources.append(r["source"])
-
-                    if context_parts:
-                        context = "\n\n".join(context_parts)
-                        system_msg = ChatMessage(
-                            role="system",
-                            content=(
-                                "Answer the user's question using the following context from their documents. "
-                                "If the context doesn't contain relevant information, say so.\n\n"
-                                f"Context:\n{context}"
-                            ),
-                        )
-                        req.messages = [system_msg, *req.messages]
-                except Exception:
-                    logger.warning("RAG search failed, proceeding without context", exc_info=True)
-                    sources = None
-
-        messages_dicts = [{"role": m.role, "content": m.content} for m in req.messages]
-        message = openai_service.chat_completion(
-            messages=messages_dicts,
+        reply = openai_service.chat_completion(
+            messages=admission.messages,
             model=req.model,
             temperature=req.temperature,
             top_p=req.top_p,
-            max_tokens=req.max_tokens,
+            max_tokens=admission.max_tokens if admission.max_tokens is not None else req.max_tokens,
             frequency_penalty=req.frequency_penalty,
             presence_penalty=req.presence_penalty,
         )
-        return ChatResponse(message=message, sources=sources)
+    except BaseException:
+        tokens.release(admission)
+        raise
+
+    def finish(delivered: bool) -> None:
+        if delivered:
+            tokens.settle(admission, reply)
+        else:
+            tokens.release(admission)
+
+    return reply, finish
+
+
+def _complete(req: ChatRequest, messages: list[dict], client_key: str) -> str:
+    reply, finish = _generate(req, messages, client_key)
+    finish(True)
+    return reply
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest, request: Request):
+    request_usage = usage.track()
+    client_key = tokens.client_key(request)
+    conversation_id = req.conversation_id or (conversations.new_id() if req.new_conversation else None)
+    key = conversations.chat_key(client_key, conversation_id) if conversation_id else None
+    try:
+        async with conversations.turn(key, create=not req.conversation_id) as session:
+            if req.guarded:
+                result = await guarded_chat.run(
+                    prompt=_last_user_message(req.messages),
+                    prepare=lambda: _prepare_messages(req, session),
+                    generate=lambda messages: _generate(req, messages, client_key),
+                )
+                _record_turn(req, session, result["message"])
+                return ChatResponse(**result, conversation_id=conversation_id, usage=request_usage.as_dict())
+
+            messages_dicts, sources = _prepare_messages(req, session)
+            message = _complete(req, messages_dicts, client_key)
+            _record_turn(req, session, message)
+            return ChatResponse(
+                message=message, sources=sources, conversation_id=conversation_id, usage=request_usage.as_dict()
+            )
+    except conversations.ConversationNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except guarded_chat.PromptBlockedError as e:
+        raise HTTPException(status_code=400, detail=f"Prompt blocked by content safety: {e.reason}")
+    except tokens.TokenLimitError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except tokens.BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except RuntimeError as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
@@ -95,13 +186,86 @@ async def chat(req: ChatRequest):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.get("/conversations/{conversation_id}")
+async def get_conversation(conversation_id: str, request: Request):
+    # Keys include the caller, so another client's conversation is not found
+    info = conversations.info(conversations.chat_key(tokens.client_key(request), conversation_id))
+    if info is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"conversation_id": conversation_id, **info}
+
+
+@router.delete("/conversations/{conversation_id}")
+async def delete_conversation(conversation_id: str, request: Request):
+    if not conversations.delete(conversations.chat_key(tokens.client_key(request), conversation_id)):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"status": "deleted", "conversation_id": conversation_id}
+
+
 @router.post("/image", response_model=ImageResponse)
-async def generate_image(req: ImageRequest):
+async def generate_image(req: ImageRequest, request: Request):
     try:
-        url = openai_service.generate_image(req.prompt)
+        url = await singleflight.call(image_cache.generate, req.prompt, str(request.base_url))
         return ImageResponse(url=url)
     except RuntimeError as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error("Image generation error", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Parse a single "bytes=start-end" range; None when unsatisfiable or unsupported."""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    start_text, end_text = match.groups()
+    if start_text:
+        start = int(start_text)
+        end = min(int(end_text), size - 1) if end_text else size - 1
+    else:
+        start, end = max(size - int(end_text), 0), size - 1
+    return (start, end) if start <= end < size else None
+
+
+@router.get("/images/{digest}")
+async def get_cached_image(digest: str, request: Request):
+    """Serve a cached generated image; content never changes for a given hash."""
+    entry = image_cache.get_cache().get(digest) if image_cache.is_valid_hash(digest) else None
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    path, info = entry
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": f'"{digest}"',
+        "Accept-Ranges": "bytes",
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    data = path.read_bytes()
+    range_header = request.headers.get("range")
+    if range_header:
+        byte_range = _parse_range(range_header, len(data))
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(data)}"})
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        return Response(data[start : end + 1], status_code=206, media_type=info["content_type"], headers=headers)
+    return Response(data, media_type=info["content_type"], headers=headers)
+
+
+@router.post("/embeddings", response_model=EmbeddingsResponse)
+async def create_embeddings(req: EmbeddingsRequest):
+    if any(not text or len(text) > 50000 for text in req.input):
+        raise HTTPException(status_code=400, detail="Each input must be 1-50000 characters.")
+    try:
+        vectors = openai_service.embed(req.input)
+        return model_response(
+            EmbeddingsResponse(model=embeddings.model_name(), dimensions=len(vectors[0]), data=vectors)
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error("Embeddings error", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
@@ -3,6 +3,7 @@ import logging
 from fastapi import APIRouter, HTTPException, UploadFile, File
 from pydantic import BaseModel, Field
 
+from app import uploads
 from app.services import language_service
 
 logger = logging.getLogger(__name__)
@@ -12,6 +13,8 @@ router = APIRouter(prefix="/api/language", tags=["language"])
 MAX_AUDIO_SIZE = 100 * 1024 * 1024  # 100 MB
 ALLOWED_AUDIO_TYPES = {"audio/wav", "audio/mpeg", "audio/mp3", "audio/ogg", "audio/webm", "audio/x-wav"}
 
+uploads.register_limit(router.prefix + "/speech-to-text", MAX_AUDIO_SIZE, label="Audio file")
+
 
 class AnalyzeRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=50000)
@@ -55,15 +58,8 @@ async def translate_text(req: TranslateRequest):
 @router.post("/speech-to-text")
 async def speech_to_text(file: UploadFile = File(...)):
     try:
-        audio_bytes = await file.read()
-        if len(audio_bytes) > MAX_AUDIO_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"Audio file too large. Maximum is {MAX_AUDIO_SIZE // (1024*1024)} MB.",
-            )
-        if len(audio_bytes) == 0:
-            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
-        text = language_service.speech_to_text(audio_bytes)
+        audio = await uploads.open_upload(file, MAX_AUDIO_SIZE, ALLOWED_AUDIO_TYPES, label="Audio file")
+        text = language_service.speech_to_text(audio)
         return {"text": text}
     except HTTPException:
         raise
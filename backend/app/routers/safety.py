@@ -3,7 +3,7 @@ import logging
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
-from app.services import safety_service
+from app.services import safety_prefilter
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +21,7 @@ class CheckPromptRequest(BaseModel):
 @router.post("/analyze-text")
 async def analyze_text(req: AnalyzeTextRequest):
     try:
-        result = safety_service.analyze_text(req.text)
+        result = safety_prefilter.analyze_text(req.text)
         return result
     except RuntimeError as e:
         raise HTTPException(status_code=503, detail=str(e))
@@ -33,10 +33,16 @@ async def analyze_text(req: AnalyzeTextRequest):
 @router.post("/check-prompt")
 async def check_prompt(req: CheckPromptRequest):
     try:
-        result = safety_service.check_prompt(req.prompt)
+        result = safety_prefilter.check_prompt(req.prompt)
         return result
     except RuntimeError as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error("Prompt shield error", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/prefilter")
+async def prefilter_stats():
+    """Local pre-filter decisions and the share escalated to Azure."""
+    return safety_prefilter.stats()
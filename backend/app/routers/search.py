@@ -1,10 +1,15 @@
+import asyncio
 import logging
 import pathlib
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, Query, UploadFile, File
 from pydantic import BaseModel, Field
 
-from app.services import search_service
+from app import uploads
+from app.config import settings
+from app.responses import FastJSONResponse
+from app.services import indexer, indexing, retrieval, search_cache, search_service, suggest
+from app.services.search_query import SearchOptions
 
 logger = logging.getLogger(__name__)
 
@@ -13,16 +18,45 @@ router = APIRouter(prefix="/api/search", tags=["search"])
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
 ALLOWED_DOC_TYPES = {"text/plain", "text/markdown", "application/pdf", "text/csv"}
 
+uploads.register_limit(router.prefix + "/upload", MAX_FILE_SIZE)
+
 
 class SearchRequest(BaseModel):
-    query: str = Field(..., min_length=1, max_length=5000)
+    query: str = Field(..., min_length=1, max_length=5000)  # "*" matches every document
+    filter: str | None = Field(None, max_length=2000)  # OData, e.g. "category eq 'tutorial'"
+    facets: list[str] = Field(default_factory=list, max_length=20)  # e.g. ["category", "keyPhrases,count:20"]
+    select: list[str] | None = Field(None, max_length=50)
+    orderby: str | None = Field(None, max_length=1000)  # e.g. "title asc"
+    top: int = Field(10, ge=1, le=1000)
+    cursor: str | None = Field(None, max_length=4096)  # next_cursor of the previous page
+
+    def options(self) -> SearchOptions | None:
+        """Search options, or None for a plain query."""
+        advanced = self.filter or self.facets or self.select is not None or self.orderby or self.cursor
+        if not advanced and self.top == 10:
+            return None
+        return SearchOptions(
+            filter=self.filter,
+            facets=tuple(self.facets),
+            select=tuple(self.select) if self.select is not None else None,
+            orderby=self.orderby,
+            top=self.top,
+            cursor=self.cursor,
+        )
 
 
 @router.post("/query")
 async def search_query(req: SearchRequest):
+    """Full-text search. With filter, facets, select, orderby, top or cursor the response
+    also has count, facets and next_cursor."""
     try:
-        results = search_service.search_documents(req.query)
-        return {"results": results}
+        options = req.options()
+        if options is not None:
+            return FastJSONResponse(search_cache.cached_query(req.query, options))
+        results = search_cache.cached_search(req.query)
+        return FastJSONResponse({"results": results})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
@@ -30,24 +64,52 @@ async def search_query(req: SearchRequest):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.get("/suggest")
+async def search_suggest(
+    q: str = Query(..., min_length=1, max_length=100), top: int = Query(5, ge=1, le=suggest.MAX_RESULTS)
+):
+    """Titles and key phrases matching what has been typed so far."""
+    try:
+        return {"suggestions": suggest.suggest(q, top)}
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error("Search suggest error", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/autocomplete")
+async def search_autocomplete(
+    q: str = Query(..., min_length=1, max_length=100), top: int = Query(5, ge=1, le=suggest.MAX_RESULTS)
+):
+    """Completions for the last, partially typed word."""
+    try:
+        return {"completions": suggest.autocomplete(q, top)}
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error("Search autocomplete error", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 @router.post("/upload")
 async def upload_document(file: UploadFile = File(...)):
     try:
-        content_bytes = await file.read()
-        if len(content_bytes) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large. Maximum is {MAX_FILE_SIZE // (1024*1024)} MB.",
-            )
-        if len(content_bytes) == 0:
-            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+        content_bytes = await uploads.read_upload(file, MAX_FILE_SIZE, ALLOWED_DOC_TYPES)
 
         # Sanitize filename to prevent path traversal
         raw_name = file.filename or "unknown"
         filename = pathlib.Path(raw_name).name
 
         content = content_bytes.decode("utf-8", errors="replace")
+        if settings.INCREMENTAL_INDEXING:
+            # Enrichment and the index upload can take minutes; keep them off the event loop
+            stats = await asyncio.to_thread(indexing.sync_document, filename, content)
+            return {"status": "ok", "filename": filename, "sync": stats}
         search_service.upload_document(filename, content)
+        retrieval.index_document(filename, content)
+        suggest.add_document(filename)
+        search_cache.bump_index_version()
         return {"status": "ok", "filename": filename}
     except HTTPException:
         raise
@@ -56,3 +118,44 @@ async def upload_document(file: UploadFile = File(...)):
     except Exception as e:
         logger.error("Document upload error", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/cache")
+async def cache_stats():
+    """Query-result cache size, index version and hit rate."""
+    return search_cache.stats()
+
+
+@router.get("/indexer")
+async def indexer_status():
+    """Background indexer state, queue depth, counters and throughput."""
+    return indexer.get_indexer().status()
+
+
+@router.post("/sync")
+async def sync_documents():
+    """Incrementally sync the documents folder into the index, propagating deletes."""
+    try:
+        return await asyncio.to_thread(indexing.sync_directory)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error("Document sync error", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.delete("/documents/{filename}")
+async def delete_document(filename: str):
+    """Remove all indexed chunks of a document tracked by the incremental manifest."""
+    try:
+        stats = indexing.remove_document(pathlib.Path(filename).name)
+        if not stats["chunks_deleted"]:
+            raise HTTPException(status_code=404, detail="Document not found in index manifest.")
+        return {"status": "ok", **stats}
+    except HTTPException:
+        raise
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error("Document delete error", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
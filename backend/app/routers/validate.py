@@ -2,6 +2,9 @@
 
 from fastapi import APIRouter
 
+from app.responses import FastJSONResponse
+from app.services import replay, singleflight
+
 router = APIRouter(prefix="/api/validate", tags=["validate"])
 
 # Maps each lab to its layers and the service function + minimal test args.
@@ -194,7 +197,9 @@ def _validate_layer(layer_def: dict) -> dict:
 
         module = importlib.import_module(module_path)
         func = getattr(module, func_name)
-        func(*layer_def["args"], **layer_def["kwargs"])
+        # Validation checks the student's code, never recorded responses
+        with replay.bypass():
+            func(*layer_def["args"], **layer_def["kwargs"])
         return {
             "layer": layer_def["layer"],
             "name": layer_def["name"],
@@ -231,14 +236,19 @@ def _validate_layer(layer_def: dict) -> dict:
         }
 
 
+def _validate_lab_layers(lab: str) -> list[dict]:
+    return [_validate_layer(layer_def) for layer_def in LAB_LAYERS[lab]]
+
+
 @router.get("/{lab}")
 async def validate_lab(lab: str):
     """Validate all layers for a given lab (e.g., /api/validate/01)."""
     if lab not in LAB_LAYERS:
         return {"lab": lab, "error": "Unknown lab identifier."}
 
-    results = [_validate_layer(layer_def) for layer_def in LAB_LAYERS[lab]]
-    return {"lab": lab, "layers": results}
+    # A whole class validating the same lab at once shares one run
+    results = await singleflight.call(_validate_lab_layers, lab)
+    return FastJSONResponse({"lab": lab, "layers": results})
 
 
 @router.get("")
@@ -246,6 +256,5 @@ async def validate_all():
     """Validate all labs at once."""
     all_results = {}
     for lab_id in sorted(LAB_LAYERS.keys()):
-        results = [_validate_layer(layer_def) for layer_def in LAB_LAYERS[lab_id]]
-        all_results[lab_id] = results
-    return {"labs": all_results}
+        all_results[lab_id] = await singleflight.call(_validate_lab_layers, lab_id)
+    return FastJSONResponse({"labs": all_results})
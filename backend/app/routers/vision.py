@@ -2,7 +2,9 @@ import logging
 
 from fastapi import APIRouter, HTTPException, UploadFile, File
 
-from app.services import vision_service
+from app import uploads
+from app.responses import FastJSONResponse
+from app.services import singleflight, vision_service
 
 logger = logging.getLogger(__name__)
 
@@ -11,32 +13,21 @@ router = APIRouter(prefix="/api/vision", tags=["vision"])
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp", "image/bmp", "image/tiff"}
 
+uploads.register_limit(router.prefix + "/analyze", MAX_FILE_SIZE)
+uploads.register_limit(router.prefix + "/ocr", MAX_FILE_SIZE)
 
-async def _validate_image(file: UploadFile) -> bytes:
-    """Read and validate an uploaded image file."""
-    content_type = file.content_type or ""
-    if content_type not in ALLOWED_IMAGE_TYPES:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported file type '{content_type}'. Allowed: JPEG, PNG, GIF, WebP, BMP, TIFF.",
-        )
-    image_bytes = await file.read()
-    if len(image_bytes) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large ({len(image_bytes) / (1024*1024):.1f} MB). Maximum is {MAX_FILE_SIZE // (1024*1024)} MB.",
-        )
-    if len(image_bytes) == 0:
-        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
-    return image_bytes
+
+async def _validate_image(file: UploadFile) -> uploads.UploadSource:
+    """Validate an uploaded image file; bytes, or the file itself with UPLOAD_ZERO_COPY."""
+    return await uploads.open_upload(file, MAX_FILE_SIZE, ALLOWED_IMAGE_TYPES)
 
 
 @router.post("/analyze")
 async def analyze_image(file: UploadFile = File(...)):
     try:
-        image_bytes = await _validate_image(file)
-        result = vision_service.analyze_image(image_bytes)
-        return result
+        image = await _validate_image(file)
+        result = await singleflight.call(vision_service.analyze_image, image)
+        return FastJSONResponse(result)
     except HTTPException:
         raise
     except RuntimeError as e:
@@ -49,9 +40,9 @@ async def analyze_image(file: UploadFile = File(...)):
 @router.post("/ocr")
 async def ocr_image(file: UploadFile = File(...)):
     try:
-        image_bytes = await _validate_image(file)
-        result = vision_service.ocr_image(image_bytes)
-        return result
+        image = await _validate_image(file)
+        result = await singleflight.call(vision_service.ocr_image, image)
+        return FastJSONResponse(result)
     except HTTPException:
         raise
     except RuntimeError as e:
@@ -0,0 +1,370 @@
+"""Agent tool runtime — executes model tool calls against the lab services.
+
+Used by agents.router when AGENT_RUNTIME_ENABLED is on; otherwise the router
+keeps calling openai_service.chat_with_tools (the Lab 06 simulation).
+
+Each turn loops:
+    1. Ask the model for the next step, offering the agent's tools as native
+       function definitions.
+    2. Run every tool call the model returned concurrently, each under its
+       own timeout, and append the results to the conversation.
+    3. Stop when the model answers without tool calls, or force a final
+       answer when the step or token budget is spent.
+In demo mode a scripted planner stands in for the model, but the tools still
+run through the real services (which return their own mock data).
+
+Tool handlers are synchronous and run in worker threads. A thread cannot be
+interrupted, so a tool that times out is only abandoned: its thread keeps
+running until the handler returns, and its result is discarded. Handlers
+that do I/O bound it themselves (the pooled HTTP client's timeouts, the
+download deadline in image_analysis) so abandoned threads do not pile up.
+
+The agent's knowledgeSources restrict the knowledge_retrieval tool to those
+documents; an agent with knowledge sources always gets that tool.
+"""
+
+import ast
+import asyncio
+import json
+import logging
+import operator
+import re
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from app.config import settings
+from app.services import prompt_builder, usage
+
+logger = logging.getLogger(__name__)
+
+MAX_TOOL_OUTPUT_CHARS = 4000
+# Same cap and types as images uploaded to /api/vision/analyze
+MAX_IMAGE_BYTES = 50 * 1024 * 1024
+IMAGE_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp", "image/bmp", "image/tiff"}
+# Calculator limits: every operand and intermediate result, and exponents
+MAX_CALC_MAGNITUDE = 10**100
+MAX_CALC_EXPONENT = 100
+
+
+@dataclass
+class ToolContext:
+    """Per-request data tools may need (e.g. the agent's knowledge sources)."""
+
+    knowledge_sources: list[str] = field(default_factory=list)
+
+
+@dataclass
+class Tool:
+    name: str
+    description: str
+    parameters: dict
+    handler: Callable[[dict, ToolContext], str]
+
+    def schema(self) -> dict:
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters},
+        }
+
+
+TOOLS: dict[str, Tool] = {}
+
+
+def register(tool: Tool) -> Tool:
+    TOOLS[tool.name] = tool
+    return tool
+
+
+def _object_schema(properties: dict, required: list[str]) -> dict:
+    return {"type": "object", "properties": properties, "required": required}
+
+
+# === Tool handlers ===
+
+
+def _matches_source(result: dict, sources: list[str]) -> bool:
+    metadata = result.get("metadata", {})
+    names = {str(v).casefold() for v in (result.get("source"), metadata.get("title"), metadata.get("category")) if v}
+    return any(s.casefold() in names or any(s.casefold() in n for n in names) for s in sources)
+
+
+def _knowledge_retrieval(args: dict, context: ToolContext) -> str:
+    from app.services import retrieval
+
+    query = args["query"]
+    results = retrieval.retrieve(query, top=10 if context.knowledge_sources else 5)
+    if context.knowledge_sources:
+        results = [r for r in results if _matches_source(r, context.knowledge_sources)][:5]
+    if not results:
+        return "No matching documents found."
+    return "\n\n".join(f"[{r.get('source', 'unknown')}] {r.get('content', '')}" for r in results)
+
+
+def _translate(args: dict, context: ToolContext) -> str:
+    from app.services import language_service
+
+    return language_service.translate_text(args["text"], args.get("source", "en"), args["target"])
+
+
+def _analyze_text(args: dict, context: ToolContext) -> str:
+    from app.services import language_service
+
+    return json.dumps(language_service.analyze_text(args["text"], args.get("analysis_type", "all")))
+
+
+def _analyze_image(args: dict, context: ToolContext) -> str:
+    from app import uploads
+    from app.services import vision_service
+
+    # The URL comes from the model (and so from the user's prompt): public http(s) only
+    image = uploads.download(
+        args["image_url"], MAX_IMAGE_BYTES, IMAGE_TYPES, label="Image", timeout=settings.AGENT_TOOL_TIMEOUT_SECONDS
+    )
+    return json.dumps(vision_service.analyze_image(image))
+
+
+_OPERATORS: dict[type, Callable[..., float]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+
+def _bounded(value: float) -> float:
+    # Checked after every step, so no operation ever starts on a huge number
+    # (a timed-out tool thread can't be stopped, only abandoned)
+    if abs(value) > MAX_CALC_MAGNITUDE:
+        raise ValueError("Number too large")
+    return value
+
+
+def _evaluate(node: ast.AST) -> float:
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return _bounded(node.value)
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+        left, right = _evaluate(node.left), _evaluate(node.right)
+        if isinstance(node.op, ast.Pow) and abs(right) > MAX_CALC_EXPONENT:
+            raise ValueError("Exponent too large")
+        return _bounded(_OPERATORS[type(node.op)](left, right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _OPERATORS:
+        return _bounded(_OPERATORS[type(node.op)](_evaluate(node.operand)))
+    raise ValueError("Only arithmetic expressions are supported")
+
+
+def _calculator(args: dict, context: ToolContext) -> str:
+    return str(_evaluate(ast.parse(args["expression"], mode="eval")))
+
+
+register(
+    Tool(
+        "knowledge_retrieval",
+        "Search the indexed documents and return the most relevant passages.",
+        _object_schema({"query": {"type": "string", "description": "Search query"}}, ["query"]),
+        _knowledge_retrieval,
+    )
+)
+register(
+    Tool(
+        "translator",
+        "Translate text into another language.",
+        _object_schema(
+            {
+                "text": {"type": "string"},
+                "target": {"type": "string", "description": "Target language code, e.g. 'fr'"},
+                "source": {"type": "string", "description": "Source language code, default 'en'"},
+            },
+            ["text", "target"],
+        ),
+        _translate,
+    )
+)
+register(
+    Tool(
+        "text_analytics",
+        "Detect sentiment, key phrases, entities and language of a text.",
+        _object_schema(
+            {
+                "text": {"type": "string"},
+                "analysis_type": {"type": "string", "enum": ["all", "sentiment", "keyPhrases", "entities", "language"]},
+            },
+            ["text"],
+        ),
+        _analyze_text,
+    )
+)
+register(
+    Tool(
+        "image_analysis",
+        "Describe an image at a URL: caption, tags and detected objects.",
+        _object_schema({"image_url": {"type": "string"}}, ["image_url"]),
+        _analyze_image,
+    )
+)
+register(
+    Tool(
+        "calculator",
+        "Evaluate an arithmetic expression.",
+        _object_schema({"expression": {"type": "string", "description": "e.g. '(3 + 4) * 2'"}}, ["expression"]),
+        _calculator,
+    )
+)
+
+
+def resolve_tools(names: list[str], knowledge_sources: list[str]) -> list[Tool]:
+    """Map the agent's configured tool names to registered tools; unknown names are skipped."""
+    selected = [TOOLS[n] for n in dict.fromkeys(names) if n in TOOLS]
+    unknown = [n for n in names if n not in TOOLS]
+    if unknown:
+        logger.info("Agent tools without a runtime implementation skipped: %s", unknown)
+    if knowledge_sources and TOOLS["knowledge_retrieval"] not in selected:
+        selected.append(TOOLS["knowledge_retrieval"])
+    return selected
+
+
+# === Execution ===
+
+
+async def _execute(call: dict, tools: dict[str, Tool], context: ToolContext, semaphore: asyncio.Semaphore) -> dict:
+    start = time.perf_counter()
+    async with semaphore:
+        tool = tools.get(call["name"])
+        try:
+            if tool is None:
+                raise ValueError(f"Unknown tool '{call['name']}'")
+            args = json.loads(call["arguments"] or "{}")
+            # On timeout the worker thread is abandoned, not stopped (see module docstring)
+            output = await asyncio.wait_for(
+                asyncio.to_thread(tool.handler, args, context), timeout=settings.AGENT_TOOL_TIMEOUT_SECONDS
+            )
+            status = "ok"
+        except TimeoutError:
+            output, status = f"Error: tool timed out after {settings.AGENT_TOOL_TIMEOUT_SECONDS:g}s", "timeout"
+        except Exception as e:
+            logger.warning("Agent tool %s failed", call["name"], exc_info=True)
+            output, status = f"Error: {e}", "error"
+    return {
+        "id": call["id"],
+        "tool": call["name"],
+        "input": call["arguments"],
+        "output": str(output)[:MAX_TOOL_OUTPUT_CHARS],
+        "status": status,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def _azure_step(messages: list[dict], tools: list[Tool], allow_tools: bool) -> dict:
+    from app.services import azure_clients
+
+    kwargs: dict = {}
+    if tools:
+        kwargs["tools"] = prompt_builder.tool_schemas(tools)
+        kwargs["tool_choice"] = "auto" if allow_tools else "none"
+    response = azure_clients.get_openai_client().chat.completions.create(
+        model=settings.AZURE_OPENAI_DEPLOYMENT, messages=messages, **kwargs
+    )
+    usage.record_response(response)
+    message = response.choices[0].message
+    return {
+        "content": message.content or "",
+        "tool_calls": [
+            {"id": tc.id, "name": tc.function.name, "arguments": tc.function.arguments}
+            for tc in (message.tool_calls or [])
+        ],
+        "tokens": response.usage.total_tokens if response.usage else 0,
+    }
+
+
+_ARITHMETIC = re.compile(r"[\d.]+(?:\s*[-+*/%]\s*\(?[\d.]+\)?)+")
+
+
+def _demo_step(messages: list[dict], tools: list[Tool], allow_tools: bool) -> dict:
+    """Scripted planner: call every applicable tool once, then summarize."""
+    tool_results = [m for m in messages if m.get("role") == "tool"]
+    question = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    if tool_results or not allow_tools:
+        summary = " ".join(m["content"][:200] for m in tool_results)
+        content = f"Demo agent answer based on {len(tool_results)} tool result(s). {summary}".strip()
+        return {"content": content, "tool_calls": [], "tokens": 0}
+
+    arguments = {
+        "knowledge_retrieval": {"query": question},
+        "translator": {"text": question, "target": "fr"},
+        "text_analytics": {"text": question},
+    }
+    expression = _ARITHMETIC.search(question)
+    if expression:
+        arguments["calculator"] = {"expression": expression.group(0)}
+    calls = [
+        {"id": f"call_{i}", "name": t.name, "arguments": json.dumps(arguments[t.name])}
+        for i, t in enumerate(t for t in tools if t.name in arguments)
+    ]
+    return {"content": "", "tool_calls": calls, "tokens": 0}
+
+
+def _chat_messages(messages: list[dict], instructions: str) -> list[dict]:
+    history = [
+        {"role": m["role"], "content": m.get("content", "")}
+        for m in messages
+        if m.get("role") in ("system", "user", "assistant")
+    ]
+    # Agent instructions form the static prefix; tool results are appended after the history
+    return prompt_builder.build(history, instructions=instructions or "You are a helpful assistant.")
+
+
+async def run(
+    messages: list[dict],
+    instructions: str,
+    tool_names: list[str],
+    knowledge_sources: list[str] | None = None,
+) -> dict:
+    """Run one agent turn with real tool execution.
+
+    Returns: Dict with "message", "tool_calls" (each with status and duration_ms),
+    "steps" and "total_tokens".
+    """
+    knowledge_sources = knowledge_sources or []
+    tools = resolve_tools(tool_names, knowledge_sources)
+    by_name = {t.name: t for t in tools}
+    context = ToolContext(knowledge_sources=knowledge_sources)
+    semaphore = asyncio.Semaphore(settings.AGENT_MAX_PARALLEL_TOOLS)
+    step = _demo_step if settings.DEMO_MODE else _azure_step
+
+    conversation = _chat_messages(messages, instructions)
+    tool_calls: list[dict] = []
+    total_tokens = 0
+    steps = 0
+    while True:
+        budget_left = steps < settings.AGENT_MAX_STEPS and total_tokens < settings.AGENT_MAX_TOKENS
+        result = await asyncio.to_thread(step, conversation, tools, budget_left)
+        steps += 1
+        total_tokens += result["tokens"]
+        if not result["tool_calls"] or not budget_left:
+            break
+
+        conversation.append(
+            {
+                "role": "assistant",
+                "content": result["content"] or None,
+                "tool_calls": [
+                    {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+                    for c in result["tool_calls"]
+                ],
+            }
+        )
+        executed = await asyncio.gather(*(_execute(c, by_name, context, semaphore) for c in result["tool_calls"]))
+        for call in executed:
+            conversation.append({"role": "tool", "tool_call_id": call["id"], "content": call["output"]})
+        tool_calls.extend(executed)
+
+    if steps > settings.AGENT_MAX_STEPS or total_tokens >= settings.AGENT_MAX_TOKENS:
+        logger.info("Agent turn stopped by budget after %d steps, %d tokens", steps, total_tokens)
+    return {"message": result["content"], "tool_calls": tool_calls, "steps": steps, "total_tokens": total_tokens}
@@ -0,0 +1,155 @@
+"""Shared Azure connection state — pooled HTTP client and managed identity credential.
+
+Service modules and startup warm-up share these objects so that connections
+opened (and tokens fetched) once are reused by later requests.
+"""
+
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Entra ID scopes for the resources the labs talk to
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+SEARCH_SCOPE = "https://search.azure.com/.default"
+
+TRANSLATOR_ENDPOINT = "https://api.cognitive.microsofttranslator.com/"
+
+_lock = threading.Lock()
+_http_client: httpx.Client | None = None
+_credential = None
+_openai_client = None
+_search_client = None
+
+
+def get_http_client() -> httpx.Client:
+    """Return the process-wide pooled HTTP client for Azure REST calls."""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                timeout=httpx.Timeout(30.0, connect=10.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+        return _http_client
+
+
+def get_token_credential():
+    """Return a cached DefaultAzureCredential when managed identity is enabled.
+
+    The credential caches tokens internally, so a token fetched during warm-up
+    is served from memory to the first real request.
+    Returns None when AZURE_USE_MANAGED_IDENTITY is off.
+    """
+    global _credential
+    if not settings.AZURE_USE_MANAGED_IDENTITY:
+        return None
+    with _lock:
+        if _credential is None:
+            try:
+                from azure.identity import DefaultAzureCredential
+            except ImportError as e:
+                raise RuntimeError(
+                    "AZURE_USE_MANAGED_IDENTITY is set but azure-identity is not installed. "
+                    "Run: pip install azure-identity"
+                ) from e
+            _credential = DefaultAzureCredential()
+        return _credential
+
+
+def get_openai_client():
+    """Return a shared AzureOpenAI client for infrastructure calls (embeddings, agent runtime).
+
+    Uses a managed identity token provider when enabled, otherwise the API key.
+    The client sends its requests through the pooled HTTP client, so connections
+    opened by warm-up are the ones it reuses.
+    Raises RuntimeError when Azure OpenAI is not configured.
+    """
+    global _openai_client
+    if not settings.AZURE_OPENAI_ENDPOINT or not (settings.AZURE_OPENAI_KEY or settings.AZURE_USE_MANAGED_IDENTITY):
+        raise RuntimeError("Azure OpenAI not configured. Set AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_KEY.")
+    credential = get_token_credential()
+    http_client = get_http_client()
+    with _lock:
+        if _openai_client is None:
+            from openai import AzureOpenAI
+
+            if credential is not None:
+                from azure.identity import get_bearer_token_provider
+
+                _openai_client = AzureOpenAI(
+                    azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+                    azure_ad_token_provider=get_bearer_token_provider(credential, COGNITIVE_SERVICES_SCOPE),
+                    api_version=settings.AZURE_OPENAI_API_VERSION,
+                    http_client=http_client,
+                )
+            else:
+                _openai_client = AzureOpenAI(
+                    azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+                    api_key=settings.AZURE_OPENAI_KEY,
+                    api_version=settings.AZURE_OPENAI_API_VERSION,
+                    http_client=http_client,
+                )
+        return _openai_client
+
+
+def get_search_client():
+    """Return a shared SearchClient for infrastructure calls (incremental indexing, facets).
+
+    Raises RuntimeError when Azure AI Search is not configured.
+    """
+    global _search_client
+    if not settings.AZURE_SEARCH_ENDPOINT or not (settings.AZURE_SEARCH_KEY or settings.AZURE_USE_MANAGED_IDENTITY):
+        raise RuntimeError("Azure AI Search not configured. Set AZURE_SEARCH_ENDPOINT and AZURE_SEARCH_KEY.")
+    credential = get_token_credential()
+    with _lock:
+        if _search_client is None:
+            from azure.core.credentials import AzureKeyCredential
+            from azure.search.documents import SearchClient
+
+            _search_client = SearchClient(
+                endpoint=settings.AZURE_SEARCH_ENDPOINT,
+                index_name=settings.AZURE_SEARCH_INDEX,
+                credential=credential or AzureKeyCredential(settings.AZURE_SEARCH_KEY),
+            )
+        return _search_client
+
+
+def configured_endpoints() -> dict[str, str]:
+    """Return {service_name: base_url} for every Azure service configured in Settings."""
+    endpoints: dict[str, str] = {}
+    if settings.AZURE_OPENAI_ENDPOINT:
+        endpoints["openai"] = settings.AZURE_OPENAI_ENDPOINT
+    if settings.AZURE_AI_SERVICES_ENDPOINT:
+        endpoints["ai_services"] = settings.AZURE_AI_SERVICES_ENDPOINT
+    if settings.AZURE_SEARCH_ENDPOINT:
+        endpoints["search"] = settings.AZURE_SEARCH_ENDPOINT
+    if settings.AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT:
+        endpoints["document_intelligence"] = settings.AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT
+    if settings.AZURE_CONTENT_SAFETY_ENDPOINT:
+        endpoints["content_safety"] = settings.AZURE_CONTENT_SAFETY_ENDPOINT
+    if settings.AZURE_TRANSLATOR_KEY or settings.AZURE_AI_SERVICES_KEY:
+        endpoints["translator"] = TRANSLATOR_ENDPOINT
+    if settings.AZURE_SPEECH_KEY and settings.AZURE_SPEECH_REGION:
+        endpoints["speech"] = f"https://{settings.AZURE_SPEECH_REGION}.stt.speech.microsoft.com/"
+    return endpoints
+
+
+def hostname(url: str) -> str:
+    """Extract the host part of an endpoint URL."""
+    return urlsplit(url).hostname or ""
+
+
+def close() -> None:
+    """Close pooled connections (called on application shutdown)."""
+    global _http_client, _openai_client
+    with _lock:
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+        _openai_client = None  # it sends through the closed pool
@@ -0,0 +1,222 @@
+"""Server-side conversation sessions for chat and agents.
+
+A request with new_conversation=true gets a server-minted conversation_id
+(a random UUID) in its response; later requests carrying that id send only
+the new turn, and the server prepends the stored history and appends the
+reply after the call. Sessions belong to the caller that started them: keys
+are "chat:{client}:{conversation_id}" for /api/generative/chat and
+"agent:{client}:{agent_id}:{conversation_id}" for /api/agents/chat, with the
+client from tokens.client_key(), so another caller's id is simply not found.
+Turns on one conversation run one at a time (turn()), so a second request
+sees the history including the first one's reply.
+
+The store is an in-process LRU bounded by CONVERSATION_MAX_SESSIONS, and
+idle sessions expire after CONVERSATION_TTL_SECONDS. Each session is kept
+under CONVERSATION_TOKEN_BUDGET: when it grows past the budget the oldest
+turns (never the last CONVERSATION_KEEP_RECENT_TURNS) are folded into a
+rolling extractive summary, sent upstream as one system message.
+"""
+
+import asyncio
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from app import metrics
+from app.config import settings
+from app.services import tokens
+
+# Characters kept per folded turn in the rolling summary
+SUMMARY_LINE_CHARS = 200
+
+_FIRST_SENTENCE = re.compile(r"(.+?[.!?])(\s|$)", re.DOTALL)
+
+
+class ConversationNotFoundError(Exception):
+    """The conversation does not exist, has expired, or belongs to another caller."""
+
+
+def estimate_tokens(text: str) -> int:
+    return tokens.count(text) + tokens.TOKENS_PER_MESSAGE
+
+
+def _summary_line(turn: dict) -> str:
+    text = " ".join(turn.get("content", "").split())
+    match = _FIRST_SENTENCE.match(text)
+    sentence = match.group(1) if match else text
+    if len(sentence) > SUMMARY_LINE_CHARS:
+        sentence = sentence[: SUMMARY_LINE_CHARS - 3] + "..."
+    speaker = "User" if turn.get("role") == "user" else "Assistant"
+    return f"- {speaker}: {sentence}"
+
+
+@dataclass
+class Conversation:
+    key: str
+    turns: list[dict] = field(default_factory=list)
+    summary_lines: list[str] = field(default_factory=list)
+    tokens: int = 0
+    summarized_turns: int = 0
+    updated_at: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    # Held for a whole request, so concurrent turns do not interleave
+    turn_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def history(self) -> list[dict]:
+        """Messages to send upstream before the new turn."""
+        with self.lock:
+            return self._history()
+
+    def _history(self) -> list[dict]:
+        messages = []
+        if self.summary_lines:
+            messages.append(
+                {
+                    "role": "system",
+                    "content": "Summary of the earlier conversation:\n" + "\n".join(self.summary_lines),
+                }
+            )
+        return messages + [dict(t) for t in self.turns]
+
+    def append(self, turns: list[dict]) -> None:
+        with self.lock:
+            for turn in turns:
+                self.turns.append({"role": turn["role"], "content": turn["content"]})
+                self.tokens += estimate_tokens(turn["content"])
+            self._compact()
+            self.updated_at = time.monotonic()
+
+    def _compact(self) -> None:
+        budget = settings.CONVERSATION_TOKEN_BUDGET
+        keep = settings.CONVERSATION_KEEP_RECENT_TURNS
+        while self.tokens > budget and len(self.turns) > keep:
+            turn = self.turns.pop(0)
+            self.tokens -= estimate_tokens(turn["content"])
+            line = _summary_line(turn)
+            self.summary_lines.append(line)
+            self.tokens += estimate_tokens(line)
+            self.summarized_turns += 1
+            metrics.incr("conversations.summarized_turns")
+        # The summary itself stays within a quarter of the budget
+        while self.summary_lines and sum(estimate_tokens(line) for line in self.summary_lines) > budget // 4:
+            self.tokens -= estimate_tokens(self.summary_lines.pop(0))
+
+    def info(self) -> dict:
+        return {
+            "turns": len(self.turns),
+            "summarized_turns": self.summarized_turns,
+            "estimated_tokens": self.tokens,
+            "summary": "\n".join(self.summary_lines),
+        }
+
+
+class ConversationStore:
+    """Bounded LRU of conversations with idle expiry."""
+
+    def __init__(self, max_sessions: int, ttl_seconds: float) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: OrderedDict[str, Conversation] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, conversation: Conversation) -> bool:
+        return time.monotonic() - conversation.updated_at > self.ttl_seconds
+
+    def get(self, key: str) -> Conversation | None:
+        with self._lock:
+            conversation = self._sessions.get(key)
+            if conversation is None:
+                return None
+            if self._expired(conversation):
+                del self._sessions[key]
+                metrics.incr("conversations.expired")
+                return None
+            self._sessions.move_to_end(key)
+            return conversation
+
+    def get_or_create(self, key: str) -> Conversation:
+        conversation = self.get(key)
+        if conversation is not None:
+            return conversation
+        with self._lock:
+            conversation = self._sessions.setdefault(key, Conversation(key))
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                metrics.incr("conversations.evicted")
+            return conversation
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(key, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+_store = ConversationStore(settings.CONVERSATION_MAX_SESSIONS, settings.CONVERSATION_TTL_SECONDS)
+
+metrics.register_gauge("conversations.active", lambda: len(_store))
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex
+
+
+def chat_key(client: str, conversation_id: str) -> str:
+    return f"chat:{client}:{conversation_id}"
+
+
+def agent_key(client: str, agent_id: str, conversation_id: str) -> str:
+    return f"agent:{client}:{agent_id}:{conversation_id}"
+
+
+@asynccontextmanager
+async def turn(key: str | None, create: bool = False) -> AsyncIterator[Conversation | None]:
+    """Hold a conversation for one request; yields None when key is None (no stored history).
+
+    create=True starts the session (for a freshly minted id); otherwise it must exist.
+    Raises: ConversationNotFoundError.
+    """
+    if key is None:
+        yield None
+        return
+    conversation = _store.get_or_create(key) if create else _store.get(key)
+    if conversation is None:
+        raise ConversationNotFoundError("Conversation not found")
+    async with conversation.turn_lock:
+        yield conversation
+
+
+def with_history(conversation: Conversation | None, new_turns: list[dict]) -> list[dict]:
+    """Stored history followed by the new turn(s) from the request.
+
+    System messages in the request come first, as the client sent them.
+    """
+    if conversation is None:
+        return new_turns
+    system = [m for m in new_turns if m.get("role") == "system"]
+    rest = [m for m in new_turns if m.get("role") != "system"]
+    return system + conversation.history() + rest
+
+
+def record(conversation: Conversation | None, new_turns: list[dict], reply: str) -> None:
+    """Store the request's user/assistant turns and the reply."""
+    if conversation is None:
+        return
+    turns = [m for m in new_turns if m.get("role") in ("user", "assistant") and m.get("content")]
+    conversation.append([*turns, {"role": "assistant", "content": reply}])
+
+
+def info(key: str) -> dict | None:
+    conversation = _store.get(key)
+    return conversation.info() if conversation else None
+
+
+def delete(key: str) -> bool:
+    return _store.delete(key)
@@ -5,6 +5,7 @@ The router (documents.py) calls these functions — signatures must not change.
 """
 
 import logging
+from typing import BinaryIO
 
 from app.config import settings
 
@@ -17,10 +18,13 @@ logger = logging.getLogger(__name__)
 # Docs: https://learn.microsoft.com/en-us/azure/ai-services/document-intelligence/quickstarts/get-started-sdks-rest-api
 
 
-def analyze_document(document_bytes: bytes, model_id: str = "prebuilt-invoice") -> dict:
+def analyze_document(document_bytes: bytes | BinaryIO, model_id: str = "prebuilt-invoice") -> dict:
     """Analyze a document using a prebuilt or custom model.
 
     Called by: documents.router /api/documents/analyze
+    Args:
+        document_bytes: Document contents, or with UPLOAD_ZERO_COPY the uploaded
+            file object — begin_analyze_document accepts either without copying.
     Returns: Dict with keys like "fields", "tables", "pages".
     """
     if settings.DEMO_MODE:
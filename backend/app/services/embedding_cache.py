@@ -0,0 +1,104 @@
+"""Persistent embedding cache keyed by content hash.
+
+One append-only file per embedding model:
+    header   8 bytes  b"EMBC" + uint32 dimensions
+    records  32-byte SHA-256 of the text, then `dimensions` float32 values
+
+The digest -> offset map is rebuilt by scanning record keys when the file is
+opened; vectors are read back with positional reads, so the cache never has
+to be loaded into memory as a whole.
+"""
+
+import hashlib
+import logging
+import os
+import pathlib
+import re
+import struct
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"EMBC"
+HEADER = struct.Struct("<4sI")
+DIGEST_SIZE = 32
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Append-only vector store for one embedding model."""
+
+    def __init__(self, directory: pathlib.Path, model: str) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        self.path = directory / f"{safe_name}.vec"
+        self.dimensions: int | None = None
+        self._offsets: dict[bytes, int] = {}
+        self._lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._load()
+
+    @property
+    def _record_size(self) -> int:
+        return DIGEST_SIZE + 4 * (self.dimensions or 0)
+
+    def _load(self) -> None:
+        size = os.fstat(self._fd).st_size
+        if size < HEADER.size:
+            return
+        magic, dimensions = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+        if magic != MAGIC:
+            logger.warning("Ignoring unreadable embedding cache %s", self.path)
+            os.ftruncate(self._fd, 0)
+            return
+        self.dimensions = dimensions
+        # Drop a partially written trailing record, if any
+        records = (size - HEADER.size) // self._record_size
+        os.ftruncate(self._fd, HEADER.size + records * self._record_size)
+        for i in range(records):
+            offset = HEADER.size + i * self._record_size
+            self._offsets[os.pread(self._fd, DIGEST_SIZE, offset)] = offset + DIGEST_SIZE
+
+    def get_many(self, digests: list[bytes]) -> dict[bytes, np.ndarray]:
+        """Return cached vectors for the digests that are present."""
+        found = {}
+        with self._lock:
+            for digest in digests:
+                offset = self._offsets.get(digest)
+                if offset is not None:
+                    raw = os.pread(self._fd, self._record_size - DIGEST_SIZE, offset)
+                    found[digest] = np.frombuffer(raw, dtype="<f4")
+        return found
+
+    def put_many(self, items: dict[bytes, np.ndarray]) -> None:
+        """Append vectors; digests already cached are skipped."""
+        if not items:
+            return
+        with self._lock:
+            dimensions = self.dimensions or len(next(iter(items.values())))
+            if any(len(vector) != dimensions for vector in items.values()):
+                raise ValueError(f"Expected {dimensions}-dimensional vectors")
+            if self.dimensions is None:
+                self.dimensions = dimensions
+                os.pwrite(self._fd, HEADER.pack(MAGIC, dimensions), 0)
+            end = os.fstat(self._fd).st_size
+            chunks = []
+            for digest, vector in items.items():
+                if digest in self._offsets:
+                    continue
+                self._offsets[digest] = end + DIGEST_SIZE
+                chunks.append(digest + np.asarray(vector, dtype="<f4").tobytes())
+                end += self._record_size
+            if chunks:
+                os.pwrite(self._fd, b"".join(chunks), end - len(chunks) * self._record_size)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def close(self) -> None:
+        os.close(self._fd)
@@ -0,0 +1,126 @@
+"""Embedding computation — batching, in-batch dedupe and a persistent cache.
+
+openai_service.embed() and the /api/generative/embeddings route delegate here.
+Texts are hashed, looked up in the on-disk cache, deduplicated, and only the
+missing ones are sent upstream in batches of EMBEDDING_BATCH_SIZE.
+
+Backends:
+    azure   the AZURE_OPENAI_EMBEDDING_DEPLOYMENT deployment
+    local   CPU-only, offline — the hashing embedder, or a sentence-transformers
+            model if LOCAL_EMBEDDING_MODEL names one (optional dependency)
+Demo mode always uses the local backend.
+"""
+
+import logging
+import pathlib
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.services import azure_clients, local_embeddings, usage
+from app.services.embedding_cache import EmbeddingCache, content_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = pathlib.Path(__file__).resolve().parent.parent.parent / "data" / "embedding-cache"
+
+_lock = threading.Lock()
+_caches: dict[str, EmbeddingCache] = {}
+_sentence_models: dict[str, object] = {}
+
+
+def _use_local() -> bool:
+    return settings.DEMO_MODE or settings.EMBEDDING_BACKEND == "local"
+
+
+def model_name() -> str:
+    """Identifier of the active embedding model (also the cache namespace)."""
+    if _use_local():
+        return f"local-{settings.LOCAL_EMBEDDING_MODEL}"
+    return f"azure-{settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT}"
+
+
+def _get_cache(model: str) -> EmbeddingCache:
+    with _lock:
+        if model not in _caches:
+            directory = (
+                pathlib.Path(settings.EMBEDDING_CACHE_DIR) if settings.EMBEDDING_CACHE_DIR else DEFAULT_CACHE_DIR
+            )
+            _caches[model] = EmbeddingCache(directory, model)
+        return _caches[model]
+
+
+def _sentence_transformer(name: str):
+    with _lock:
+        if name not in _sentence_models:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise RuntimeError(
+                    f"LOCAL_EMBEDDING_MODEL={name} needs sentence-transformers. "
+                    "Run: pip install sentence-transformers (or use LOCAL_EMBEDDING_MODEL=hashing)"
+                ) from e
+            _sentence_models[name] = SentenceTransformer(name, device="cpu")
+        return _sentence_models[name]
+
+
+def _embed_batch(texts: list[str]) -> np.ndarray:
+    """Embed one batch with the active backend."""
+    if _use_local():
+        if settings.LOCAL_EMBEDDING_MODEL == "hashing":
+            return local_embeddings.embed(texts)
+        model = _sentence_transformer(settings.LOCAL_EMBEDDING_MODEL)
+        return np.asarray(model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    client = azure_clients.get_openai_client()
+    response = client.embeddings.create(model=settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT, input=texts)
+    usage.record_response(response)
+    ordered = sorted(response.data, key=lambda item: item.index)
+    return np.asarray([item.embedding for item in ordered], dtype=np.float32)
+
+
+def embed_texts(texts: list[str]) -> np.ndarray:
+    """Return a (len(texts), dimensions) float32 matrix, using the cache where possible."""
+    if not texts:
+        return np.zeros((0, dimensions()), dtype=np.float32)
+
+    # The hashing embedder is cheaper to recompute than to read back from disk
+    cacheable = not (_use_local() and settings.LOCAL_EMBEDDING_MODEL == "hashing")
+    digests = [content_hash(t) for t in texts]
+    vectors: dict[bytes, np.ndarray] = _get_cache(model_name()).get_many(digests) if cacheable else {}
+
+    # Deduplicate: each distinct missing text is embedded exactly once
+    missing: dict[bytes, str] = {}
+    for digest, text in zip(digests, texts, strict=True):
+        if digest not in vectors:
+            missing.setdefault(digest, text)
+
+    if missing:
+        pending = list(missing.items())
+        batch_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+        computed: dict[bytes, np.ndarray] = {}
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start : start + batch_size]
+            for (digest, _), vector in zip(batch, _embed_batch([text for _, text in batch]), strict=True):
+                computed[digest] = vector
+        if cacheable:
+            _get_cache(model_name()).put_many(computed)
+        vectors.update(computed)
+        logger.debug("Embedded %d texts (%d cached, %d computed)", len(texts), len(texts) - len(missing), len(missing))
+
+    return np.vstack([vectors[d] for d in digests]).astype(np.float32, copy=False)
+
+
+_dimensions: dict[str, int] = {}
+
+
+def dimensions() -> int:
+    """Vector size of the active model (probed once per model)."""
+    model = model_name()
+    if model not in _dimensions:
+        if _use_local() and settings.LOCAL_EMBEDDING_MODEL == "hashing":
+            _dimensions[model] = local_embeddings.DEFAULT_DIMENSIONS
+        else:
+            _dimensions[model] = embed_texts(["dimension probe"]).shape[1]
+    return _dimensions[model]
@@ -0,0 +1,477 @@
+"""Local AI enrichment pipeline — the offline counterpart of an Azure AI Search skillset.
+
+With ENRICHMENT_ENABLED on, incremental indexing (sync_document, directory
+sync) runs each document through the skills named in ENRICHMENT_SKILLS
+before chunking. Skills call the lab service functions:
+    extract         document cracking for binary sources: text files are
+                    decoded, images OCR'd (vision_service.ocr_image), PDFs
+                    analyzed (document_service.analyze_document), audio
+                    transcribed (language_service.speech_to_text)
+    language        detected language code (language_service.analyze_text)
+    keyPhrases      key phrases, per 5000-character segment, deduplicated
+    entities        named entity texts, deduplicated
+    images          local images referenced from Markdown/HTML in the text
+    imageText       OCR of those embedded images
+Like skillset skills, each declares its input and output fields. The
+pipeline derives the dependency graph from them and streams records
+through it: every skill is a stage with its own bounded queue, batches of
+up to ENRICHMENT_BATCH_SIZE records and ENRICHMENT_CONCURRENCY workers, and
+a record moves on to a skill as soon as that skill's inputs are ready.
+A skill whose inputs are missing is skipped; a failing skill adds a warning
+to the record instead of failing the document. enrich_blocking() gives up
+after ENRICHMENT_TIMEOUT_SECONDS.
+
+Skill outputs are cached by skill version and a hash of the skill's inputs
+(backend/data/enrichment-cache.jsonl), so re-indexing unchanged content
+doesn't call the services again. index_fields() maps outputs to index
+fields ("output field mappings"); indexed_content() merges OCR'd image
+text into the content. With SEARCH_BACKEND=azure the index needs
+keyPhrases and entities (Collection(Edm.String)) and language fields.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import pathlib
+import re
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from app import metrics, uploads
+from app.config import settings
+from app.services import document_service, language_service, vision_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_FILE = pathlib.Path(__file__).resolve().parent.parent.parent / "data" / "enrichment-cache.jsonl"
+DEFAULT_IMAGES_DIR = pathlib.Path(__file__).resolve().parent.parent.parent.parent / "data" / "images"
+
+# Text Analytics accepts up to 5120 characters per document
+MAX_TEXT_CHARS = 5000
+MAX_SEGMENTS = 10
+MAX_PHRASES = 50
+MAX_IMAGES = 10
+QUEUE_SIZE = 64
+
+# Enriched record field -> index field
+INDEX_FIELDS = {"keyPhrases": "keyPhrases", "entities": "entities", "language": "language"}
+
+_IMAGE_LINK_RE = re.compile(r"!\[[^\]]*\]\(\s*<?([^)\s>]+)>?[^)]*\)|<img\s[^>]*src=[\"']([^\"']+)[\"']", re.IGNORECASE)
+_IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff", ".webp"}
+
+
+@dataclass
+class Skill:
+    name: str
+    inputs: tuple[str, ...]
+    outputs: tuple[str, ...]
+    run: Callable[[dict], dict]  # one record -> its outputs; blocking service calls are fine
+    version: str = "1"  # bump when run() changes to invalidate cached outputs
+    cacheable: bool = True
+
+
+# --- Skills ---
+
+
+def _segments(text: str) -> list[str]:
+    end = min(len(text), MAX_TEXT_CHARS * MAX_SEGMENTS)
+    return [text[i : i + MAX_TEXT_CHARS] for i in range(0, end, MAX_TEXT_CHARS)]
+
+
+def _unique(values: Iterable[str], limit: int = MAX_PHRASES) -> list[str]:
+    seen: dict[str, str] = {}
+    for value in values:
+        if value and value.lower() not in seen:
+            seen[value.lower()] = value
+    return list(seen.values())[:limit]
+
+
+def _document_text(result: dict) -> str:
+    if result.get("content"):
+        return result["content"]
+    # Prebuilt models without a content field: fall back to field values and table cells
+    parts = [f"{name}: {field.get('value')}" for name, field in result.get("fields", {}).items()]
+    for table in result.get("tables", []):
+        parts.extend(cell.get("content", "") for cell in table.get("cells", []))
+    return "\n".join(p for p in parts if p)
+
+
+def extract_text(data: bytes) -> str | None:
+    """Text of a file by sniffed type: decoded text, image OCR, PDF analysis or audio transcript.
+
+    None when the type is not supported.
+    """
+    content_type = uploads.sniff_content_type(data[: uploads.SNIFF_BYTES])
+    if content_type == "text/plain":
+        return data.decode("utf-8", errors="replace")
+    if content_type and content_type.startswith("image/"):
+        return "\n".join(vision_service.ocr_image(data).get("text", []))
+    if content_type == "application/pdf":
+        return _document_text(document_service.analyze_document(data, "prebuilt-read"))
+    if content_type and content_type.startswith("audio/"):
+        return language_service.speech_to_text(data)
+    return None
+
+
+def _extract(record: dict) -> dict:
+    content = extract_text(record["data"])
+    return {"content": content} if content is not None else {}
+
+
+def _language(record: dict) -> dict:
+    result = language_service.analyze_text(record["content"][:MAX_TEXT_CHARS], "language")
+    language = result.get("language") or {}
+    return {"language": language.get("iso") or language.get("name")}
+
+
+def _key_phrases(record: dict) -> dict:
+    phrases: list[str] = []
+    for segment in _segments(record["content"]):
+        phrases.extend(language_service.analyze_text(segment, "keyPhrases").get("keyPhrases", []))
+    return {"keyPhrases": _unique(phrases)}
+
+
+def _entities(record: dict) -> dict:
+    names: list[str] = []
+    for segment in _segments(record["content"]):
+        names.extend(e.get("text", "") for e in language_service.analyze_text(segment, "entities").get("entities", []))
+    return {"entities": _unique(names)}
+
+
+def _image_roots() -> list[pathlib.Path]:
+    from app.services.indexing import DEFAULT_DOCUMENTS_DIR
+
+    documents = pathlib.Path(settings.DOCUMENTS_DIR) if settings.DOCUMENTS_DIR else DEFAULT_DOCUMENTS_DIR
+    return [documents.resolve(), DEFAULT_IMAGES_DIR.resolve()]
+
+
+def _images(record: dict) -> dict:
+    base = pathlib.Path(record["path"]).parent
+    roots = _image_roots()
+    images = []
+    for match in _IMAGE_LINK_RE.finditer(record["content"]):
+        link = match.group(1) or match.group(2)
+        if "://" in link or link.startswith("data:"):
+            continue
+        path = (base / link).resolve()
+        # Only local images under the data folders — never follow links elsewhere on disk
+        if path.suffix.lower() in _IMAGE_SUFFIXES and path.is_file() and any(path.is_relative_to(r) for r in roots):
+            images.append(path.read_bytes())
+            if len(images) == MAX_IMAGES:
+                break
+    return {"images": images} if images else {}
+
+
+def _image_text(record: dict) -> dict:
+    lines = []
+    for image in record["images"]:
+        lines.extend(vision_service.ocr_image(image).get("text", []))
+    return {"imageText": "\n".join(lines)}
+
+
+SKILLS: dict[str, Skill] = {
+    skill.name: skill
+    for skill in [
+        Skill("extract", ("data",), ("content",), _extract),
+        Skill("language", ("content",), ("language",), _language),
+        Skill("keyPhrases", ("content",), ("keyPhrases",), _key_phrases),
+        Skill("entities", ("content",), ("entities",), _entities),
+        Skill("images", ("content", "path"), ("images",), _images, cacheable=False),
+        Skill("imageText", ("images",), ("imageText",), _image_text),
+    ]
+}
+
+
+# --- Cache ---
+
+
+def _feed(hasher, value) -> None:
+    if isinstance(value, (bytes, bytearray)):
+        hasher.update(b"b%d:" % len(value))
+        hasher.update(value)
+    elif isinstance(value, list):
+        hasher.update(b"l%d:" % len(value))
+        for item in value:
+            _feed(hasher, item)
+    else:
+        encoded = json.dumps(value, sort_keys=True).encode("utf-8")
+        hasher.update(b"j%d:" % len(encoded))
+        hasher.update(encoded)
+
+
+def cache_key(skill: Skill, record: dict) -> str:
+    hasher = hashlib.sha256(f"{skill.name}:{skill.version}".encode())
+    for field in skill.inputs:
+        _feed(hasher, record[field])
+    return hasher.hexdigest()
+
+
+class EnrichmentCache:
+    """Skill outputs by cache key, loaded from and appended to a JSON lines file."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a torn last line from an interrupted write
+                    self._entries[entry["key"]] = entry["outputs"]
+
+    def get(self, key: str) -> dict | None:
+        return self._entries.get(key)
+
+    def put(self, key: str, outputs: dict) -> None:
+        line = json.dumps({"key": key, "outputs": outputs}, separators=(",", ":"))
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = outputs
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: EnrichmentCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> EnrichmentCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            path = (
+                pathlib.Path(settings.ENRICHMENT_CACHE_FILE) if settings.ENRICHMENT_CACHE_FILE else DEFAULT_CACHE_FILE
+            )
+            _cache = EnrichmentCache(path)
+            metrics.register_gauge("enrichment.cached_outputs", _cache.__len__)
+        return _cache
+
+
+# --- Pipeline ---
+
+
+@dataclass
+class _State:
+    record: dict
+    waiting: dict[str, int]  # skill -> upstream skills not finished yet for this record
+    remaining: int
+
+
+class Pipeline:
+    """Streams records through skills in dependency order, each skill a batched, concurrent stage."""
+
+    def __init__(
+        self,
+        skills: list[Skill],
+        cache: EnrichmentCache | None = None,
+        batch_size: int = 8,
+        concurrency: int = 4,
+    ) -> None:
+        self.skills = {s.name: s for s in skills}
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        producers = {field: s.name for s in skills for field in s.outputs}
+        self.upstream = {s.name: {producers[f] for f in s.inputs if f in producers} - {s.name} for s in skills}
+        self.downstream: dict[str, list[str]] = {name: [] for name in self.skills}
+        for name, deps in self.upstream.items():
+            for dep in deps:
+                self.downstream[dep].append(name)
+        self._check_acyclic()
+
+    def _check_acyclic(self) -> None:
+        waiting = {name: len(deps) for name, deps in self.upstream.items()}
+        ready = [name for name, n in waiting.items() if n == 0]
+        visited = 0
+        while ready:
+            name = ready.pop()
+            visited += 1
+            for child in self.downstream[name]:
+                waiting[child] -= 1
+                if waiting[child] == 0:
+                    ready.append(child)
+        if visited != len(self.skills):
+            raise ValueError("Enrichment skills have a dependency cycle")
+
+    async def run(self, records: Iterable[dict]) -> list[dict]:
+        """Enrich records (in place) and return them in input order."""
+        records = list(records)
+        if not records or not self.skills:
+            return records
+        queues: dict[str, asyncio.Queue[_State]] = {name: asyncio.Queue(maxsize=QUEUE_SIZE) for name in self.skills}
+        finished: asyncio.Queue[_State] = asyncio.Queue()
+        states = [
+            _State(r, {name: len(deps) for name, deps in self.upstream.items()}, len(self.skills)) for r in records
+        ]
+
+        async def complete(state: _State, skill: str) -> None:
+            state.remaining -= 1
+            if state.remaining == 0:
+                finished.put_nowait(state)
+                return
+            for child in self.downstream[skill]:
+                state.waiting[child] -= 1
+                if state.waiting[child] == 0:
+                    await queues[child].put(state)
+
+        async def worker(skill: Skill) -> None:
+            queue = queues[skill.name]
+            while True:
+                batch = [await queue.get()]
+                while len(batch) < self.batch_size and not queue.empty():
+                    batch.append(queue.get_nowait())
+                try:
+                    await self._run_batch(skill, batch)
+                except Exception as e:
+                    # The records still move on; a dead worker would leave them unfinished
+                    metrics.incr("enrichment.errors")
+                    logger.warning("Enrichment skill %s failed for a batch", skill.name, exc_info=True)
+                    for state in batch:
+                        state.record.setdefault("warnings", []).append(f"{skill.name}: {e}")
+                for state in batch:
+                    await complete(state, skill.name)
+
+        async def feed() -> None:
+            sources = [name for name, deps in self.upstream.items() if not deps]
+            for state in states:
+                for name in sources:
+                    # Bounded queues: a slow stage holds back intake instead of buffering everything
+                    await queues[name].put(state)
+
+        async def collect() -> None:
+            for _ in states:
+                await finished.get()
+
+        collector = asyncio.create_task(collect())
+        tasks = [asyncio.create_task(feed())]
+        tasks += [asyncio.create_task(worker(s)) for s in self.skills.values() for _ in range(self.concurrency)]
+        try:
+            # Fail instead of waiting forever if the feeder or a worker dies
+            watched = {collector, *tasks}
+            while not collector.done():
+                done, watched = await asyncio.wait(watched, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is not None:
+                        raise error
+        finally:
+            collector.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return records
+
+    async def _run_batch(self, skill: Skill, batch: list[_State]) -> None:
+        cache = self.cache if skill.cacheable else None
+        pending = []
+        for state in batch:
+            record = state.record
+            if not all(record.get(f) for f in skill.inputs) or all(f in record for f in skill.outputs):
+                continue  # inputs missing, or outputs supplied by the caller
+            key = None
+            if cache is not None:
+                try:
+                    key = cache_key(skill, record)
+                except (TypeError, ValueError):
+                    logger.warning("Uncacheable %s inputs for %s", skill.name, record.get("filename"))
+            cached = cache.get(key) if cache is not None and key else None
+            if cached is not None:
+                metrics.incr("enrichment.cache_hits")
+                record.update(cached)
+            else:
+                pending.append((record, key))
+        if not pending:
+            return
+        results = await asyncio.to_thread(self._call_skill, skill, [record for record, _ in pending])
+        for (record, key), outputs in zip(pending, results, strict=True):
+            if isinstance(outputs, Exception):
+                record.setdefault("warnings", []).append(f"{skill.name}: {outputs}")
+                continue
+            record.update(outputs)
+            if cache is not None and key:
+                try:
+                    cache.put(key, outputs)
+                except (OSError, TypeError, ValueError):
+                    # Not JSON-serializable or the cache file is unwritable: keep the outputs, skip the cache
+                    metrics.incr("enrichment.cache_errors")
+                    logger.warning("Could not cache %s outputs", skill.name, exc_info=True)
+
+    @staticmethod
+    def _call_skill(skill: Skill, records: list[dict]) -> list[dict | Exception]:
+        results: list[dict | Exception] = []
+        for record in records:
+            metrics.incr(f"enrichment.{skill.name}.calls")
+            try:
+                results.append({k: v for k, v in skill.run(record).items() if k in skill.outputs})
+            except NotImplementedError as e:
+                results.append(e)
+            except Exception as e:
+                metrics.incr("enrichment.errors")
+                logger.warning("Enrichment skill %s failed for %s", skill.name, record.get("filename"), exc_info=True)
+                results.append(e)
+        return results
+
+
+def configured_skills() -> list[Skill]:
+    names = [n.strip() for n in settings.ENRICHMENT_SKILLS.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SKILLS]
+    if unknown:
+        raise ValueError(f"Unknown enrichment skills: {', '.join(unknown)}. Available: {', '.join(SKILLS)}")
+    return [SKILLS[n] for n in names]
+
+
+def pipeline() -> Pipeline:
+    return Pipeline(
+        configured_skills(),
+        cache=get_cache(),
+        batch_size=settings.ENRICHMENT_BATCH_SIZE,
+        concurrency=settings.ENRICHMENT_CONCURRENCY,
+    )
+
+
+async def enrich(records: Iterable[dict]) -> list[dict]:
+    """Run records ({"filename", and "content" text or "data" bytes, optional "path"}) through the pipeline."""
+    return await pipeline().run(records)
+
+
+_runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="enrichment")
+
+
+def enrich_blocking(records: Iterable[dict], timeout: float | None = None) -> list[dict]:
+    """enrich() for synchronous callers. Blocks until done: call it from a worker thread, not the event loop.
+
+    Raises: RuntimeError if the run takes longer than timeout seconds
+    (default ENRICHMENT_TIMEOUT_SECONDS); the run is cancelled, service calls
+    already in progress finish in the background.
+    """
+    timeout = settings.ENRICHMENT_TIMEOUT_SECONDS if timeout is None else timeout
+    future = _runner.submit(asyncio.run, asyncio.wait_for(enrich(list(records)), timeout))
+    try:
+        return future.result(timeout)
+    except TimeoutError as e:
+        metrics.incr("enrichment.timeouts")
+        raise RuntimeError(f"Enrichment did not finish within {timeout:g}s") from e
+
+
+def index_fields(record: dict) -> dict:
+    """Enriched values to store on every chunk of the document."""
+    return {target: record[source] for source, target in INDEX_FIELDS.items() if record.get(source)}
+
+
+def indexed_content(record: dict) -> str:
+    """Document text with the OCR'd text of embedded images appended."""
+    content = record.get("content") or ""
+    if record.get("imageText"):
+        content = f"{content}\n\n{record['imageText']}" if content else record["imageText"]
+    return content
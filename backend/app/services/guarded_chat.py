@@ -0,0 +1,187 @@
+"""Guarded chat — Content Safety screening overlapped with retrieval and generation.
+
+Used by generative.router when a ChatRequest sets guarded=true. Instead of
+two serial safety round trips per turn:
+    1. Prompt Shield (safety_service.check_prompt) runs concurrently with RAG
+       retrieval, and generation starts as soon as retrieval is done — without
+       waiting for the shield verdict.
+    2. If the shield flags the prompt, the in-flight generation is cancelled
+       and its result discarded.
+    3. Output moderation (safety_service.analyze_text) runs incrementally:
+       text is cut into sentence-aligned segments as it arrives and each
+       segment is screened concurrently, so moderation overlaps generation
+       when the text is streamed and parallelizes it when it is not.
+Both checks go through safety_prefilter, so cached or clearly-decided text
+never makes a round trip. The caller is only charged (tokens.settle) for a
+reply it actually receives; a blocked prompt, a cancelled turn or a withheld
+response releases the generation's token reservation instead.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from collections.abc import Callable
+
+from app.config import settings
+from app.services import safety_prefilter
+
+logger = logging.getLogger(__name__)
+
+# Content Safety accepts up to 10k characters per call; smaller segments finish sooner
+SEGMENT_CHARS = 1000
+MAX_CONCURRENT_MODERATION = 4
+
+_SENTENCE_END = re.compile(r"[.!?]\s|\n")
+
+
+class PromptBlockedError(Exception):
+    """Raised when Prompt Shield flags the user's prompt."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _flagged_categories(result: dict) -> list[dict]:
+    threshold = settings.GUARDED_CHAT_SEVERITY_THRESHOLD
+    return [c for c in result.get("categories", []) if c.get("severity", 0) >= threshold]
+
+
+class IncrementalModerator:
+    """Screens text with analyze_text segment by segment as it is fed in."""
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._tasks: list[asyncio.Task] = []
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_MODERATION)
+
+    def feed(self, text: str) -> None:
+        """Add generated text; complete segments are screened immediately."""
+        self._buffer += text
+        while len(self._buffer) >= SEGMENT_CHARS:
+            # Cut at the last sentence boundary inside the segment, if there is one
+            boundaries = [m.end() for m in _SENTENCE_END.finditer(self._buffer, 0, SEGMENT_CHARS)]
+            cut = boundaries[-1] if boundaries else SEGMENT_CHARS
+            self._submit(self._buffer[:cut])
+            self._buffer = self._buffer[cut:]
+
+    def _submit(self, segment: str) -> None:
+        if segment.strip():
+            self._tasks.append(asyncio.create_task(self._screen(segment)))
+
+    async def _screen(self, segment: str) -> dict:
+        async with self._semaphore:
+            return await asyncio.to_thread(safety_prefilter.analyze_text, segment)
+
+    async def finish(self) -> dict:
+        """Screen the remaining text and return the combined verdict."""
+        self._submit(self._buffer)
+        self._buffer = ""
+        results = await asyncio.gather(*self._tasks)
+        flagged = [c for r in results for c in _flagged_categories(r)]
+        return {"flagged": bool(flagged), "segments": len(results), "categories": flagged}
+
+    def cancel(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+
+# Abandoned generations finish in the background; keep them referenced until then
+_background: set[asyncio.Task] = set()
+
+
+class _AbandonedError(Exception):
+    """Ends a generation whose turn was blocked or cancelled."""
+
+
+def _discard(task: asyncio.Task) -> None:
+    # Retrieve the outcome of a task whose result is not used, so a failure
+    # is not reported as "Task exception was never retrieved"
+    _background.discard(task)
+    if not task.cancelled():
+        task.exception()
+
+
+async def run(
+    prompt: str,
+    prepare: Callable[[], tuple[list[dict], list[str] | None]],
+    generate: Callable[[list[dict]], tuple[str, Callable[[bool], object]]],
+) -> dict:
+    """Run one guarded chat turn.
+
+    Args:
+        prompt: The latest user message, screened by Prompt Shield.
+        prepare: Builds the upstream messages (including any RAG context); returns (messages, sources).
+        generate: Calls the model with the prepared messages; returns the reply and a
+            finish(delivered) callback that settles its cost when the reply is delivered
+            and releases its token reservation otherwise. finish is called exactly once.
+    Returns: Dict with "message", "sources" and a "safety" report.
+    Raises: PromptBlockedError if the shield flags the prompt.
+    """
+    start = time.perf_counter()
+    timings: dict[str, float] = {}
+    abandoned = False
+
+    def elapsed() -> float:
+        return round((time.perf_counter() - start) * 1000, 1)
+
+    async def shield() -> dict:
+        result = await asyncio.to_thread(safety_prefilter.check_prompt, prompt)
+        timings["shield_ms"] = elapsed()
+        return result
+
+    async def retrieve_and_generate() -> tuple[str, Callable[[bool], object], list[str] | None]:
+        messages, sources = await asyncio.to_thread(prepare)
+        timings["retrieval_ms"] = elapsed()
+        if abandoned:
+            raise _AbandonedError  # blocked or cancelled while retrieving: skip the model call
+        # Speculative: generation starts before the shield verdict is known
+        reply, finish = await asyncio.to_thread(generate, messages)
+        timings["generation_ms"] = elapsed()
+        if abandoned:
+            finish(False)
+            raise _AbandonedError
+        return reply, finish, sources
+
+    def abandon(task: asyncio.Task) -> None:
+        # The worker thread cannot be interrupted, so the task is not cancelled:
+        # it runs to the end in the background and releases its reservation
+        nonlocal abandoned
+        abandoned = True
+        _background.add(task)
+        task.add_done_callback(_discard)
+
+    shield_task = asyncio.create_task(shield())
+    generation_task = asyncio.create_task(retrieve_and_generate())
+    try:
+        shield_result = await shield_task
+        if shield_result.get("flagged"):
+            logger.info("Guarded chat: prompt blocked by Prompt Shield after %.1f ms", elapsed())
+            raise PromptBlockedError(shield_result.get("reason") or "Prompt flagged by Prompt Shield.")
+        # Shielded, so a cancelled request abandons the generation instead of cancelling it
+        reply, finish, sources = await asyncio.shield(generation_task)
+    except BaseException:
+        abandon(generation_task)
+        raise
+
+    moderator = IncrementalModerator()
+    try:
+        moderator.feed(reply)
+        output = await moderator.finish()
+    except BaseException:
+        moderator.cancel()
+        finish(False)
+        raise
+    timings["moderation_ms"] = elapsed()
+
+    if output["flagged"]:
+        logger.info("Guarded chat: response withheld, flagged categories %s", output["categories"])
+        reply = "The response was withheld because it was flagged by content safety."
+    finish(not output["flagged"])
+
+    return {
+        "message": reply,
+        "sources": sources,
+        "safety": {"prompt": shield_result, "output": output, "timings_ms": {**timings, "total_ms": elapsed()}},
+    }
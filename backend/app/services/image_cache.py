@@ -0,0 +1,210 @@
+"""Local cache for generated images, served from /api/generative/images/{hash}.
+
+Azure OpenAI returns image URLs that expire after a while, and regenerating
+the same prompt costs seconds and money. With IMAGE_CACHE_ENABLED on,
+generate() downloads each generated image once and stores it on local disk
+under the SHA-256 of its bytes. Requests for an identical (prompt, size,
+quality) reuse the stored image and get a stable backend URL that browsers
+and CDNs may cache forever (the content at a hash never changes). The URL is
+absolute — the frontend runs on another origin — and built from
+IMAGE_CACHE_PUBLIC_URL, or the incoming request's base URL when unset.
+
+The store is evicted least-recently-used first once it exceeds
+IMAGE_CACHE_MAX_BYTES. In demo mode the placeholder URL is returned as-is.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import re
+import tempfile
+import threading
+import time
+
+from app import metrics, uploads
+from app.config import settings
+from app.services import openai_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = pathlib.Path(__file__).resolve().parent.parent.parent / "data" / "images"
+INDEX_FILE = "index.json"
+ROUTE_PREFIX = "/api/generative/images/"
+
+# generate_image always uses the service defaults for these
+DEFAULT_SIZE = "1024x1024"
+DEFAULT_QUALITY = "standard"
+
+# DALL-E images are a few MB; anything far larger is not what we asked for
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+IMAGE_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp"}
+
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+]
+
+
+def sniff_content_type(data: bytes) -> str:
+    for signature, content_type in _SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def request_key(prompt: str, size: str = DEFAULT_SIZE, quality: str = DEFAULT_QUALITY) -> str:
+    normalized = " ".join(prompt.split())
+    return hashlib.sha256(json.dumps([normalized, size, quality]).encode("utf-8")).hexdigest()
+
+
+def is_valid_hash(value: str) -> bool:
+    return bool(_HASH_PATTERN.match(value))
+
+
+class ImageCache:
+    """Content-addressed image files plus an index of requests and blobs."""
+
+    def __init__(self, directory: pathlib.Path, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # requests: request key -> blob hash; blobs: hash -> {content_type, size, last_used}
+        self._requests: dict[str, str] = {}
+        self._blobs: dict[str, dict] = {}
+        self._load()
+
+    def _index_path(self) -> pathlib.Path:
+        return self.directory / INDEX_FILE
+
+    def blob_path(self, digest: str) -> pathlib.Path:
+        return self.directory / digest[:2] / digest
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self._index_path().read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError):
+            logger.warning("Image cache index unreadable, starting empty", exc_info=True)
+            return
+        self._blobs = {h: b for h, b in data.get("blobs", {}).items() if self.blob_path(h).exists()}
+        self._requests = {k: h for k, h in data.get("requests", {}).items() if h in self._blobs}
+
+    def _save(self) -> None:
+        payload = json.dumps({"requests": self._requests, "blobs": self._blobs})
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp, self._index_path())
+
+    def total_bytes(self) -> int:
+        return sum(b["size"] for b in self._blobs.values())
+
+    def lookup(self, key: str) -> str | None:
+        with self._lock:
+            digest = self._requests.get(key)
+            if digest is None:
+                return None
+            if not self.blob_path(digest).exists():
+                del self._requests[key]
+                self._blobs.pop(digest, None)
+                return None
+            self._blobs[digest]["last_used"] = time.time()
+            return digest
+
+    def get(self, digest: str) -> tuple[pathlib.Path, dict] | None:
+        with self._lock:
+            info = self._blobs.get(digest)
+            if info is None:
+                return None
+            info["last_used"] = time.time()
+            return self.blob_path(digest), dict(info)
+
+    def put(self, key: str, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        with self._lock:
+            if digest not in self._blobs or not path.exists():
+                path.parent.mkdir(exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+                self._blobs[digest] = {"content_type": sniff_content_type(data), "size": len(data)}
+            self._blobs[digest]["last_used"] = time.time()
+            self._requests[key] = digest
+            self._evict(keep=digest)
+            self._save()
+        return digest
+
+    def _evict(self, keep: str) -> None:
+        total = self.total_bytes()
+        for digest in sorted(self._blobs, key=lambda h: self._blobs[h].get("last_used", 0)):
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            total -= self._blobs.pop(digest)["size"]
+            self.blob_path(digest).unlink(missing_ok=True)
+            self._requests = {k: h for k, h in self._requests.items() if h != digest}
+            metrics.incr("image_cache.evictions")
+
+
+_cache: ImageCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ImageCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            directory = pathlib.Path(settings.IMAGE_CACHE_DIR) if settings.IMAGE_CACHE_DIR else DEFAULT_CACHE_DIR
+            _cache = ImageCache(directory, settings.IMAGE_CACHE_MAX_BYTES)
+            metrics.register_gauge("image_cache.bytes", _cache.total_bytes)
+        return _cache
+
+
+def _download(url: str) -> bytes:
+    return uploads.download(url, MAX_IMAGE_BYTES, IMAGE_TYPES, label="Generated image")
+
+
+def image_url(base_url: str, digest: str) -> str:
+    return (settings.IMAGE_CACHE_PUBLIC_URL or base_url).rstrip("/") + ROUTE_PREFIX + digest
+
+
+def generate(prompt: str, base_url: str) -> str:
+    """openai_service.generate_image with the local cache in front.
+
+    Args:
+        base_url: The backend's base URL as the caller reached it; used
+            unless IMAGE_CACHE_PUBLIC_URL is set.
+
+    Returns: An absolute .../api/generative/images/{hash} URL when the cache
+    is on, otherwise the upstream URL.
+    """
+    if not settings.IMAGE_CACHE_ENABLED or settings.DEMO_MODE:
+        return openai_service.generate_image(prompt)
+
+    cache = get_cache()
+    key = request_key(prompt)
+    digest = cache.lookup(key)
+    if digest is not None:
+        metrics.incr("image_cache.hits")
+        return image_url(base_url, digest)
+
+    metrics.incr("image_cache.misses")
+    url = openai_service.generate_image(prompt)
+    try:
+        digest = cache.put(key, _download(url))
+    except Exception:
+        # The upstream URL still works for a while — better than failing the request
+        logger.warning("Could not cache generated image, returning upstream URL", exc_info=True)
+        return url
+    return image_url(base_url, digest)
@@ -0,0 +1,427 @@
+"""Background indexer — keeps the search index in line with the data folders.
+
+Watches data/documents (or DOCUMENTS_DIR), data/images and data/audio and
+indexes files as they are added, changed or deleted:
+    detect      watchfiles (installed with uvicorn[standard]) reports
+                changes as they happen; a periodic reconcile scan compares
+                the folders with the checkpoint and catches anything missed
+                (the only detection when watchfiles is not available)
+    queue       changed paths go to a bounded queue — when it is full the
+                watcher and scanner wait, so a bulk copy can't buffer
+                unbounded work — and are deduplicated while queued
+    process     batches of up to INDEXER_BATCH_SIZE files, collected after a
+                short debounce: extraction (text, PDF analysis, image OCR,
+                audio transcription), enrichment and chunked upload through
+                indexing.sync_batch()
+    checkpoint  mtime and size of every processed file, written after each
+                batch (backend/data/indexer-checkpoint.json), so a restart
+                only picks up what changed while it was stopped
+
+Documents keep their folder-relative names (same as POST /api/search/sync),
+images and audio are indexed as "images/<name>" and "audio/<name>". Files
+that fail extraction are checkpointed as failed and retried once they change.
+When a whole batch fails (enrichment, index upload), its files are listed in
+recent_errors and retried by the next reconcile.
+
+Runs from the app lifespan with INDEXER_ENABLED=true (status at
+GET /api/search/indexer), or standalone from backend/:
+    python -m app.services.indexer          # watch until Ctrl+C
+    python -m app.services.indexer --once   # reconcile, index, exit
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from dataclasses import dataclass
+
+from app import metrics
+from app.config import settings
+from app.services import enrichment, indexing
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = pathlib.Path(__file__).resolve().parent.parent.parent.parent / "data"
+DEFAULT_CHECKPOINT_FILE = pathlib.Path(__file__).resolve().parent.parent.parent / "data" / "indexer-checkpoint.json"
+
+MAX_FILE_BYTES = 50 * 1024 * 1024  # same limit as /api/search/upload
+THROUGHPUT_WINDOW_SECONDS = 60.0
+MAX_RECENT_ERRORS = 20
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff"}
+
+
+@dataclass(frozen=True)
+class Root:
+    directory: pathlib.Path
+    prefix: str  # prepended to the folder-relative name
+    suffixes: frozenset[str]
+
+    def name(self, path: pathlib.Path) -> str:
+        return self.prefix + path.relative_to(self.directory).as_posix()
+
+    def origin(self, path: pathlib.Path) -> str:
+        # Text documents share the "directory" origin with POST /api/search/sync,
+        # which would otherwise delete them as files it doesn't track
+        if not self.prefix and path.suffix.lower() in indexing.TEXT_SUFFIXES:
+            return "directory"
+        return "indexer"
+
+
+def default_roots() -> list[Root]:
+    documents = pathlib.Path(settings.DOCUMENTS_DIR) if settings.DOCUMENTS_DIR else indexing.DEFAULT_DOCUMENTS_DIR
+    # Resolved: watchfiles reports absolute paths
+    return [
+        Root(documents.resolve(), "", frozenset(indexing.TEXT_SUFFIXES | {".pdf"})),
+        Root((DATA_DIR / "images").resolve(), "images/", frozenset(IMAGE_SUFFIXES)),
+        Root((DATA_DIR / "audio").resolve(), "audio/", frozenset({".wav", ".mp3", ".ogg", ".flac", ".webm"})),
+    ]
+
+
+class Checkpoint:
+    """Processed files by index name: {"path", "mtime", "size", "status"[, "error"]}."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self.files: dict[str, dict] = {}
+        if path.exists():
+            try:
+                self.files = json.loads(path.read_text(encoding="utf-8")).get("files", {})
+            except (json.JSONDecodeError, OSError):
+                logger.warning("Indexer checkpoint %s is unreadable; starting from a full scan", path)
+
+    def current(self, name: str, stat: os.stat_result) -> bool:
+        entry = self.files.get(name)
+        return entry is not None and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"files": self.files, "updated": time.time()}), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+class Indexer:
+    def __init__(self, roots: list[Root] | None = None, checkpoint_file: pathlib.Path | None = None) -> None:
+        self.roots = roots if roots is not None else default_roots()
+        if checkpoint_file is None:
+            checkpoint_file = (
+                pathlib.Path(settings.INDEXER_CHECKPOINT_FILE)
+                if settings.INDEXER_CHECKPOINT_FILE
+                else DEFAULT_CHECKPOINT_FILE
+            )
+        self.checkpoint = Checkpoint(checkpoint_file)
+        self.batch_size = max(1, settings.INDEXER_BATCH_SIZE)
+        # Replaced by start() and run_once(); asyncio binds them to a loop on first use
+        self._queue: asyncio.Queue[pathlib.Path] = asyncio.Queue(maxsize=settings.INDEXER_QUEUE_SIZE)
+        self._queued: set[pathlib.Path] = set()
+        self._stop = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._lock = threading.Lock()  # stats are updated from the processing thread
+        self._recent: collections.deque[tuple[float, int]] = collections.deque()
+        self._errors: collections.deque[dict] = collections.deque(maxlen=MAX_RECENT_ERRORS)
+        self._stats = {
+            "files_indexed": 0,
+            "files_removed": 0,
+            "files_failed": 0,
+            "files_skipped": 0,
+            "batches": 0,
+            "batches_failed": 0,
+            "chunks_uploaded": 0,
+            "bytes_sent": 0,
+            "busy_seconds": 0.0,
+        }
+        self.watcher = "stopped"
+        self.started: float | None = None
+        self.last_reconcile: float | None = None
+        self.in_flight = 0
+
+    # --- Detection ---
+
+    def _root_for(self, path: pathlib.Path) -> Root | None:
+        if path.name.startswith(".") or path.name.endswith("~"):
+            return None  # hidden and editor temp files
+        for root in self.roots:
+            if path.is_relative_to(root.directory) and path.suffix.lower() in root.suffixes:
+                return root
+        return None
+
+    def scan(self) -> list[pathlib.Path]:
+        """Paths whose state differs from the checkpoint: new, changed or deleted."""
+        changed = []
+        present = set()
+        for root in self.roots:
+            if not root.directory.is_dir():
+                continue
+            for path in sorted(p for p in root.directory.rglob("*") if p.is_file() and self._root_for(p) is root):
+                name = root.name(path)
+                present.add(name)
+                if not self.checkpoint.current(name, path.stat()):
+                    changed.append(path)
+        # list(): the processing thread may update the checkpoint meanwhile
+        changed += [pathlib.Path(e["path"]) for n, e in list(self.checkpoint.files.items()) if n not in present]
+        return changed
+
+    async def _enqueue(self, path: pathlib.Path) -> None:
+        if path in self._queued:
+            return
+        self._queued.add(path)
+        # Blocks while the queue is full: back-pressure on the watcher and scanner
+        await self._queue.put(path)
+
+    async def reconcile(self) -> int:
+        """Scan the folders and queue everything that changed; returns the number queued."""
+        paths = await asyncio.to_thread(self.scan)
+        for path in paths:
+            await self._enqueue(path)
+        self.last_reconcile = time.time()
+        return len(paths)
+
+    async def _reconcile_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await self.reconcile()
+            except Exception:
+                logger.error("Indexer reconcile failed", exc_info=True)
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._stop.wait(), timeout=settings.INDEXER_RECONCILE_SECONDS)
+
+    async def _watch(self) -> None:
+        try:
+            from watchfiles import awatch
+        except ImportError:
+            self.watcher = "polling"
+            logger.info("watchfiles not installed; indexer polls every %ss", settings.INDEXER_RECONCILE_SECONDS)
+            return
+        directories = [str(r.directory) for r in self.roots if r.directory.is_dir()]
+        if not directories:
+            self.watcher = "polling"
+            return
+        self.watcher = "watchfiles"
+        async for changes in awatch(*directories, stop_event=self._stop):
+            for _, raw in changes:
+                path = pathlib.Path(raw)
+                if self._root_for(path) is not None:
+                    await self._enqueue(path)
+
+    # --- Processing ---
+
+    async def _consume(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            # Let a burst of events (a copy in progress, an editor save) settle into one batch
+            await asyncio.sleep(settings.INDEXER_DEBOUNCE_SECONDS)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self._queued.difference_update(batch)
+            self.in_flight = len(batch)
+            try:
+                await asyncio.to_thread(self.process, batch)
+            except Exception as e:
+                logger.error("Indexer batch failed", exc_info=True)
+                self._batch_failed(batch, f"{type(e).__name__}: {e}")
+            finally:
+                self.in_flight = 0
+
+    def _fail(self, name: str, path: pathlib.Path, stat: os.stat_result, error: str) -> None:
+        self.checkpoint.files[name] = {
+            "path": str(path),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "status": "failed",
+            "error": error,
+        }
+        with self._lock:
+            self._stats["files_failed"] += 1
+            self._errors.append({"file": name, "error": error, "time": time.time()})
+        metrics.incr("indexer.files_failed")
+        logger.warning("Indexer could not index %s: %s", name, error)
+
+    def _batch_failed(self, batch: list[pathlib.Path], error: str) -> None:
+        # Not checkpointed as failed: the files are picked up again by the next reconcile
+        now = time.time()
+        with self._lock:
+            self._stats["batches_failed"] += 1
+            for path in batch:
+                root = self._root_for(path)
+                self._errors.append({"file": root.name(path) if root else str(path), "error": error, "time": now})
+        metrics.incr("indexer.batches_failed")
+
+    def process(self, batch: list[pathlib.Path]) -> dict:
+        """Extract, enrich and index a batch of paths (deleted paths are removed from the index)."""
+        start = time.perf_counter()
+        by_origin: dict[str, list[dict]] = {}
+        removed = skipped = 0
+        for path in batch:
+            root = self._root_for(path)
+            if root is None:
+                continue
+            name = root.name(path)
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                if self.checkpoint.files.pop(name, None) is not None:
+                    indexing.remove_document(name)
+                    removed += 1
+                continue
+            if self.checkpoint.current(name, stat):
+                skipped += 1  # duplicate event for a file already processed
+                continue
+            if stat.st_size > MAX_FILE_BYTES:
+                self._fail(name, path, stat, f"larger than {MAX_FILE_BYTES // (1024 * 1024)} MB")
+                continue
+            try:
+                content = enrichment.extract_text(path.read_bytes())
+            except Exception as e:
+                self._fail(name, path, stat, f"{type(e).__name__}: {e}")
+                continue
+            if content is None:
+                self._fail(name, path, stat, "unsupported file content")
+                continue
+            if not content.strip():
+                self._fail(name, path, stat, "no text extracted")
+                continue
+            file_state = {"mtime": stat.st_mtime, "size": stat.st_size}
+            record: dict = {"filename": name, "content": content, "path": str(path), "file_state": file_state}
+            by_origin.setdefault(root.origin(path), []).append(record)
+
+        chunks_uploaded = bytes_sent = indexed = 0
+        for origin, records in by_origin.items():
+            totals = indexing.sync_batch(records, origin)
+            chunks_uploaded += totals["chunks_uploaded"]
+            bytes_sent += totals["bytes_sent"]
+            indexed += len(records)
+            for record in records:
+                self.checkpoint.files[record["filename"]] = {
+                    "path": record["path"],
+                    **record["file_state"],
+                    "status": "indexed",
+                }
+        self.checkpoint.save()
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats["files_indexed"] += indexed
+            self._stats["files_removed"] += removed
+            self._stats["files_skipped"] += skipped
+            self._stats["batches"] += 1
+            self._stats["chunks_uploaded"] += chunks_uploaded
+            self._stats["bytes_sent"] += bytes_sent
+            self._stats["busy_seconds"] += elapsed
+            self._recent.append((time.monotonic(), indexed + removed))
+        metrics.incr("indexer.files_indexed", indexed)
+        metrics.incr("indexer.batches")
+        if indexed or removed:
+            logger.info("Indexer batch: %d indexed, %d removed in %.2fs", indexed, removed, elapsed)
+        return {"indexed": indexed, "removed": removed, "skipped": skipped, "seconds": round(elapsed, 3)}
+
+    # --- Lifecycle ---
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.INDEXER_QUEUE_SIZE)
+        self._stop = asyncio.Event()
+        self.started = time.time()
+        self._tasks = [
+            asyncio.create_task(self._consume()),
+            asyncio.create_task(self._reconcile_loop()),
+            asyncio.create_task(self._watch()),
+        ]
+        logger.info("Indexer started for %s", ", ".join(str(r.directory) for r in self.roots))
+
+    async def stop(self) -> None:
+        if not self._tasks:
+            return
+        self._stop.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.watcher = "stopped"
+        logger.info("Indexer stopped")
+
+    async def run_once(self) -> None:
+        """Index everything that changed since the checkpoint, without watching."""
+        self._queue = asyncio.Queue(maxsize=settings.INDEXER_QUEUE_SIZE)
+        consumer = asyncio.create_task(self._consume())
+        try:
+            await self.reconcile()
+            while self._queued or self.in_flight:
+                await asyncio.sleep(0.05)
+        finally:
+            consumer.cancel()
+            await asyncio.gather(consumer, return_exceptions=True)
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0][0] > THROUGHPUT_WINDOW_SECONDS:
+                self._recent.popleft()
+            recent_files = sum(n for _, n in self._recent)
+            stats = dict(self._stats)
+            errors = list(self._errors)
+        busy = stats.pop("busy_seconds")
+        failed = [n for n, e in list(self.checkpoint.files.items()) if e.get("status") == "failed"]
+        return {
+            "running": bool(self._tasks),
+            "watcher": self.watcher,
+            "roots": [str(r.directory) for r in self.roots],
+            "started": self.started,
+            "last_reconcile": self.last_reconcile,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "in_flight": self.in_flight,
+            "tracked_files": len(self.checkpoint.files),
+            "failed_files": failed[:MAX_RECENT_ERRORS],
+            **stats,
+            "throughput": {
+                "files_per_minute": round(recent_files * 60 / THROUGHPUT_WINDOW_SECONDS, 1),
+                "files_per_busy_second": round((stats["files_indexed"] + stats["files_removed"]) / busy, 2)
+                if busy
+                else 0.0,
+                "avg_batch_seconds": round(busy / stats["batches"], 3) if stats["batches"] else 0.0,
+            },
+            "recent_errors": errors,
+        }
+
+
+_indexer: Indexer | None = None
+
+
+def get_indexer() -> Indexer:
+    global _indexer
+    if _indexer is None:
+        _indexer = Indexer()
+    return _indexer
+
+
+async def _run_cli(once: bool) -> None:
+    indexer = get_indexer()
+    if once:
+        await indexer.run_once()
+    else:
+        await indexer.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await indexer.stop()
+    print(json.dumps(indexer.status(), indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="Index what changed since the checkpoint, then exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(_run_cli(args.once))
+
+
+if __name__ == "__main__":
+    main()
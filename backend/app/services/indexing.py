@@ -0,0 +1,423 @@
+"""Incremental indexing — per-document chunk manifests with delete propagation.
+
+Enabled for /api/search/upload with INCREMENTAL_INDEXING=true; bulk syncs of
+the documents folder (POST /api/search/sync) always use it.
+
+Each document is chunked at headings and paragraph breaks and every chunk
+gets a content-addressed id, so a re-upload can be diffed against the
+previous version:
+    new/changed chunks    uploaded
+    removed chunks        deleted from the index
+    unchanged chunks      skipped
+The manifest (backend/data/index-manifest.json) records which chunk ids each
+document currently owns. Writes go to the active keyword backend and, when
+VECTOR_SEARCH_ENABLED is on, to the vector index.
+
+With ENRICHMENT_ENABLED on, documents go through the enrichment pipeline
+(services/enrichment.py) first: OCR'd image text is appended to the content
+and key phrases, entities and language are stored on every chunk.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import re
+import threading
+import time
+
+from app.config import settings
+from app.services import search_cache, suggest
+from app.services.local_search import document_id
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = pathlib.Path(__file__).resolve().parent.parent.parent / "data" / "index-manifest.json"
+DEFAULT_DOCUMENTS_DIR = pathlib.Path(__file__).resolve().parent.parent.parent.parent / "data" / "documents"
+TEXT_SUFFIXES = {".txt", ".md", ".csv"}
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# Azure AI Search batch limits: 1000 documents or 16 MB per request
+UPLOAD_BATCH_DOCS = 1000
+UPLOAD_BATCH_BYTES = 15 * 1024 * 1024
+
+_HEADING_RE = re.compile(r"\n(?=#{1,6}\s)")
+_PARAGRAPH_RE = re.compile(r"\n[ \t]*\n")
+
+_lock = threading.Lock()
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
+    """Split text into overlapping fixed-size chunks (Lab 02, Layer 4 strategy)."""
+    if len(text) <= chunk_size:
+        return [text] if text.strip() else []
+    chunks = []
+    start = 0
+    while start < len(text):
+        chunk = text[start : start + chunk_size]
+        if chunk.strip():
+            chunks.append(chunk)
+        start += chunk_size - overlap
+    return chunks
+
+
+def content_chunks(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
+    """Split text at Markdown headings and blank lines, packing paragraphs up to chunk_size.
+
+    Boundaries come from the text rather than fixed offsets, so an edit only
+    re-chunks the rest of its own section and every other chunk keeps its id.
+    Paragraphs longer than chunk_size are packed line by line; only a single
+    line longer than that falls back to fixed-size chunk_text() windows.
+    """
+    chunks: list[str] = []
+    for section in _HEADING_RE.split(text):
+        _pack(_PARAGRAPH_RE.split(section), "\n\n", chunk_size, overlap, chunks)
+    return chunks
+
+
+def _pack(pieces: list[str], separator: str, chunk_size: int, overlap: int, chunks: list[str]) -> None:
+    current = ""
+    for piece in pieces:
+        if not piece.strip():
+            continue
+        if len(piece) > chunk_size:
+            if current:
+                chunks.append(current)
+                current = ""
+            if separator != "\n":
+                _pack(piece.split("\n"), "\n", chunk_size, overlap, chunks)
+            else:
+                chunks.extend(chunk_text(piece, chunk_size, overlap))
+            continue
+        if current and len(current) + len(separator) + len(piece) > chunk_size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}{separator}{piece}" if current else piece
+    if current:
+        chunks.append(current)
+
+
+def _sha256(data: str | bytes) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def build_chunks(filename: str, content: str, fields: dict | None = None) -> list[dict]:
+    """Chunk a document into index documents with content-addressed ids.
+
+    fields (enrichment outputs) are copied onto every chunk and are part of
+    the chunk digest, so re-enriched chunks are re-uploaded.
+    """
+    doc_key = document_id(filename)
+    fields_json = json.dumps(fields, sort_keys=True) if fields else ""
+    seen: dict[str, int] = {}
+    chunks = []
+    for piece in content_chunks(content):
+        digest = _sha256(piece + fields_json)
+        # Repeated identical chunks within one document still need distinct keys
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        chunk_id = f"{doc_key}_{digest[:16]}" + (f"_{occurrence}" if occurrence else "")
+        chunks.append({"id": chunk_id, "content": piece, "source": filename, "title": filename, **(fields or {})})
+    return chunks
+
+
+# --- Manifest ---
+
+
+def _read_manifest() -> dict:
+    if MANIFEST_FILE.exists():
+        try:
+            return json.loads(MANIFEST_FILE.read_text(encoding="utf-8"))
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning("Failed to read index manifest, starting fresh: %s", e)
+    return {"documents": {}}
+
+
+def _write_manifest(manifest: dict) -> None:
+    MANIFEST_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    os.replace(tmp, MANIFEST_FILE)
+
+
+def indexed_documents() -> list[str]:
+    """Names of the documents in the manifest (no lock needed: writes replace the file atomically)."""
+    return list(_read_manifest().get("documents", {}))
+
+
+# --- Backend writes ---
+
+
+def _payload_size(doc: dict) -> int:
+    return len(json.dumps(doc).encode("utf-8"))
+
+
+def _upload(docs: list[dict]) -> int:
+    """Send chunk documents to the index backends.
+
+    Returns the payload bytes written to the keyword backend (0 in demo mode
+    with the azure backend, where nothing is sent).
+    """
+    if not docs:
+        return 0
+    sent = 0
+    if settings.SEARCH_BACKEND == "local":
+        from app.services.local_search import get_index
+
+        get_index().upload(docs)
+        sent = sum(_payload_size(doc) for doc in docs)
+    elif not settings.DEMO_MODE:
+        from app.services.azure_clients import get_search_client
+
+        client = get_search_client()
+        batch: list[dict] = []
+        batch_bytes = 0
+        for doc in docs:
+            size = _payload_size(doc)
+            if batch and (len(batch) >= UPLOAD_BATCH_DOCS or batch_bytes + size > UPLOAD_BATCH_BYTES):
+                client.merge_or_upload_documents(documents=batch)
+                sent += batch_bytes
+                batch, batch_bytes = [], 0
+            batch.append(doc)
+            batch_bytes += size
+        client.merge_or_upload_documents(documents=batch)
+        sent += batch_bytes
+
+    if settings.VECTOR_SEARCH_ENABLED:
+        from app.services import embeddings
+        from app.services.vector_index import get_index as get_vector_index
+
+        get_vector_index().add(docs, embeddings.embed_texts([d["content"] for d in docs]))
+    return sent
+
+
+def _delete(ids: list[str]) -> None:
+    if not ids:
+        return
+    if settings.SEARCH_BACKEND == "local":
+        from app.services.local_search import get_index
+
+        get_index().delete(ids)
+    elif not settings.DEMO_MODE:
+        from app.services.azure_clients import get_search_client
+
+        client = get_search_client()
+        for start in range(0, len(ids), UPLOAD_BATCH_DOCS):
+            client.delete_documents(documents=[{"id": i} for i in ids[start : start + UPLOAD_BATCH_DOCS]])
+
+    if settings.VECTOR_SEARCH_ENABLED:
+        from app.services.vector_index import get_index as get_vector_index
+
+        get_vector_index().delete(ids)
+
+
+# --- Sync ---
+
+
+def _empty_stats() -> dict:
+    return {"chunks_uploaded": 0, "chunks_deleted": 0, "chunks_unchanged": 0, "bytes_sent": 0}
+
+
+def _enrich(records: list[dict]) -> list[tuple[str, dict | None]]:
+    """(content to index, chunk fields) per {"filename", "content", "path"} record."""
+    if not settings.ENRICHMENT_ENABLED:
+        return [(r["content"], None) for r in records]
+    from app.services import enrichment
+
+    enriched = enrichment.enrich_blocking(records)
+    for record in enriched:
+        for warning in record.get("warnings", []):
+            logger.warning("Enrichment of %s: %s", record["filename"], warning)
+    return [(enrichment.indexed_content(r), enrichment.index_fields(r)) for r in enriched]
+
+
+def _sync_locked(
+    manifest: dict,
+    filename: str,
+    content: str,
+    origin: str,
+    file_state: dict | None = None,
+    fields: dict | None = None,
+    source_sha256: str | None = None,
+) -> dict:
+    documents = manifest.setdefault("documents", {})
+    previous = documents.get(filename)
+    chunks = build_chunks(filename, content, fields)
+    new_ids = {c["id"] for c in chunks}
+    old_ids = set(previous["chunks"]) if previous else set()
+
+    to_upload = [c for c in chunks if c["id"] not in old_ids]
+    to_delete = sorted(old_ids - new_ids)
+    if previous is None:
+        # Whole-document / positional entries may exist from a non-incremental upload
+        to_delete.append(document_id(filename))
+        if settings.VECTOR_SEARCH_ENABLED:
+            from app.services.vector_index import get_index as get_vector_index
+
+            get_vector_index().delete_source(filename)
+
+    _delete(to_delete)
+    bytes_sent = _upload(to_upload)
+    suggest.add_document(filename, key_phrases=(fields or {}).get("keyPhrases"))
+
+    documents[filename] = {
+        "chunks": sorted(new_ids),
+        "origin": origin,
+        "content_sha256": source_sha256 or _sha256(content),
+        "enriched": fields is not None,
+        "updated": time.time(),
+        **(file_state or {}),
+    }
+    return {
+        "filename": filename,
+        "chunks_total": len(chunks),
+        "chunks_uploaded": len(to_upload),
+        "chunks_deleted": len(old_ids - new_ids),
+        "chunks_unchanged": len(chunks) - len(to_upload),
+        "bytes_sent": bytes_sent,
+    }
+
+
+def sync_document(filename: str, content: str) -> dict:
+    """Index a document, sending only the chunks that changed since the last upload."""
+    source_sha256 = _sha256(content)
+    # Enrich outside the lock: service calls are the slow part
+    [(indexed, fields)] = _enrich([{"filename": filename, "content": content}])
+    with _lock:
+        manifest = _read_manifest()
+        stats = _sync_locked(manifest, filename, indexed, origin="upload", fields=fields, source_sha256=source_sha256)
+        _write_manifest(manifest)
+    search_cache.bump_index_version()
+    logger.info(
+        "Synced %s: %d uploaded, %d deleted, %d unchanged, %d bytes",
+        filename,
+        stats["chunks_uploaded"],
+        stats["chunks_deleted"],
+        stats["chunks_unchanged"],
+        stats["bytes_sent"],
+    )
+    return stats
+
+
+def sync_batch(records: list[dict], origin: str) -> dict:
+    """Index several documents with one enrichment run; used by the background indexer.
+
+    records: {"filename", "content", optional "path" and "file_state"}.
+    Returns totals like sync_directory().
+    """
+    totals = {"files_changed": len(records), **_empty_stats()}
+    if not records:
+        return totals
+    enriched = _enrich([{"filename": r["filename"], "content": r["content"], "path": r.get("path")} for r in records])
+    with _lock:
+        manifest = _read_manifest()
+        for record, (indexed, fields) in zip(records, enriched, strict=True):
+            stats = _sync_locked(
+                manifest,
+                record["filename"],
+                indexed,
+                origin=origin,
+                file_state=record.get("file_state"),
+                fields=fields,
+                source_sha256=_sha256(record["content"]),
+            )
+            for key in ("chunks_uploaded", "chunks_deleted", "chunks_unchanged", "bytes_sent"):
+                totals[key] += stats[key]
+        _write_manifest(manifest)
+    search_cache.bump_index_version()
+    return totals
+
+
+def remove_document(filename: str) -> dict:
+    """Delete every chunk a document owns. Returns stats (chunks_deleted is 0 if unknown)."""
+    with _lock:
+        manifest = _read_manifest()
+        entry = manifest.get("documents", {}).pop(filename, None)
+        stats = {"filename": filename, **_empty_stats()}
+        if entry:
+            _delete(entry["chunks"])
+            suggest.remove_document(filename)
+            stats["chunks_deleted"] = len(entry["chunks"])
+            _write_manifest(manifest)
+    if stats["chunks_deleted"]:
+        search_cache.bump_index_version()
+    return stats
+
+
+def sync_directory(directory: pathlib.Path | None = None) -> dict:
+    """Bring the index in line with a folder: add/update changed files, remove deleted ones."""
+    if directory is None:
+        directory = pathlib.Path(settings.DOCUMENTS_DIR) if settings.DOCUMENTS_DIR else DEFAULT_DOCUMENTS_DIR
+    start = time.perf_counter()
+    totals = {"files_scanned": 0, "files_changed": 0, "files_removed": 0, **_empty_stats()}
+
+    # Scan against a snapshot of the manifest (writes replace the file atomically)
+    snapshot = _read_manifest().get("documents", {})
+    present = set()
+    changed = []
+    touched = {}
+    for path in sorted(p for p in directory.rglob("*") if p.is_file() and p.suffix.lower() in TEXT_SUFFIXES):
+        name = path.relative_to(directory).as_posix()
+        present.add(name)
+        totals["files_scanned"] += 1
+        stat = path.stat()
+        file_state = {"mtime": stat.st_mtime, "size": stat.st_size}
+        entry = snapshot.get(name)
+        # Turning enrichment on or off re-indexes every file
+        current = entry and entry.get("enriched", False) == settings.ENRICHMENT_ENABLED
+        # Cheap check first: untouched files are not even read
+        if current and entry.get("mtime") == stat.st_mtime and entry.get("size") == stat.st_size:
+            totals["chunks_unchanged"] += len(entry["chunks"])
+            continue
+        content = path.read_bytes().decode("utf-8", errors="replace")
+        if current and entry.get("content_sha256") == _sha256(content):
+            touched[name] = file_state
+            totals["chunks_unchanged"] += len(entry["chunks"])
+            continue
+        changed.append(({"filename": name, "content": content, "path": str(path)}, file_state))
+
+    # One pipeline run for all changed files, so skills batch across documents.
+    # Enrichment calls services and can take long; it runs before taking the lock.
+    enriched = _enrich([r for r, _ in changed])
+
+    with _lock:
+        manifest = _read_manifest()
+        documents = manifest.setdefault("documents", {})
+        for name, file_state in touched.items():
+            if name in documents:
+                documents[name].update(file_state)
+
+        for (record, file_state), (indexed, fields) in zip(changed, enriched, strict=True):
+            stats = _sync_locked(
+                manifest,
+                record["filename"],
+                indexed,
+                origin="directory",
+                file_state=file_state,
+                fields=fields,
+                source_sha256=_sha256(record["content"]),
+            )
+            totals["files_changed"] += 1
+            for key in ("chunks_uploaded", "chunks_deleted", "chunks_unchanged", "bytes_sent"):
+                totals[key] += stats[key]
+
+        # Propagate deletes for files that disappeared from the folder
+        for name in [n for n, e in documents.items() if e.get("origin") == "directory" and n not in present]:
+            entry = documents.pop(name)
+            _delete(entry["chunks"])
+            suggest.remove_document(name)
+            totals["files_removed"] += 1
+            totals["chunks_deleted"] += len(entry["chunks"])
+
+        _write_manifest(manifest)
+
+    if totals["files_changed"] or totals["files_removed"]:
+        search_cache.bump_index_version()
+    totals["seconds"] = round(time.perf_counter() - start, 3)
+    logger.info("Directory sync of %s: %s", directory, totals)
+    return totals
@@ -5,6 +5,7 @@ The router (language.py) calls these functions — signatures must not change.
 """
 
 import logging
+from typing import BinaryIO
 
 from app.config import settings
 
@@ -76,12 +77,14 @@ def translate_text(text: str, source: str, target: str) -> str:
 # See docs/labs/05-language.md — Layer 4
 
 
-def speech_to_text(audio_bytes: bytes) -> str:
+def speech_to_text(audio_bytes: bytes | BinaryIO) -> str:
     """Convert speech audio to text using the Speech REST API.
 
     Called by: language.router /api/language/speech-to-text
     Args:
-        audio_bytes: WAV audio file contents.
+        audio_bytes: WAV audio file contents, or with UPLOAD_ZERO_COPY the
+            uploaded file object. Pass content=uploads.iter_chunks(audio_bytes)
+            to httpx to stream either one as a chunked request body.
     Returns: The recognized text string.
     """
     if settings.DEMO_MODE:
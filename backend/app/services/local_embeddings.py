@@ -0,0 +1,41 @@
+"""CPU-only hashing embedder — offline vectors without a model download.
+
+Words and character trigrams are hashed into a fixed number of signed
+buckets (the "hashing trick") and L2-normalized. Texts sharing vocabulary
+land close together, which is enough for local development, tests and demo
+mode; it is not a substitute for a trained embedding model.
+"""
+
+import math
+import re
+import zlib
+
+import numpy as np
+
+DEFAULT_DIMENSIONS = 384
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _features(text: str) -> dict[str, float]:
+    counts: dict[str, float] = {}
+    for word in _WORD_RE.findall(text.lower()):
+        counts[word] = counts.get(word, 0.0) + 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            gram = "3:" + padded[i : i + 3]
+            counts[gram] = counts.get(gram, 0.0) + 0.5
+    return counts
+
+
+def embed(texts: list[str], dimensions: int = DEFAULT_DIMENSIONS) -> np.ndarray:
+    """Return a (len(texts), dimensions) float32 array of unit vectors."""
+    vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feature, count in _features(text).items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vectors[row, h % dimensions] += sign * (1.0 + math.log(count))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -0,0 +1,639 @@
+"""Embedded BM25 search engine — offline stand-in for Azure AI Search.
+
+Selected with SEARCH_BACKEND=local. Results use the same dict shape as the
+Azure implementation in search_service (content, score, source, highlights,
+metadata), so routers and RAG work unchanged.
+
+On-disk layout (one directory, default backend/data/search-index):
+    manifest.json          live segments with their deleted doc ordinals
+    seg-NNNNNN.docs.json   stored fields and token length, one entry per doc ordinal
+    seg-NNNNNN.terms.json  term -> [byte offset, doc freq] into the postings file
+    seg-NNNNNN.post        per term: doc ordinals (uint32) then term freqs (uint16)
+
+Segments are immutable. Uploads write a new small segment, deletes are recorded
+as tombstones in the manifest, and segments are merged once there are too many.
+The postings file is memory-mapped, so only the terms touched by a query are read.
+
+Filters and facets (LocalSearchIndex.query) run on columns: the first time a
+field is used, each segment dictionary-encodes it into a numpy array of value
+codes per document (or doc/code pairs for collections such as keyPhrases).
+A filter is evaluated once per distinct value and expanded to a document
+mask; facet counts are a bincount of the codes under the result mask, so
+their cost doesn't depend on how many results are returned.
+"""
+
+import functools
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import pathlib
+import re
+import threading
+from array import array
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+
+from app.config import settings
+from app.services import odata
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = pathlib.Path(__file__).resolve().parent.parent.parent / "data" / "search-index"
+
+# BM25 parameters — same defaults as Azure AI Search
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MAX_SEGMENTS = 10
+MAX_TERM_FREQ = 0xFFFF
+HIGHLIGHT_WINDOW = 80
+MAX_HIGHLIGHTS = 5
+
+SEARCHABLE_FIELDS = ("title", "content", "keyPhrases")  # keyPhrases: set by enrichment
+METADATA_FIELDS = ("title", "category", "source")
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokenizer shared by indexing and querying."""
+    return [t.lower() for t in _TOKEN_RE.findall(text)]
+
+
+def field_text(value) -> str:
+    """Searchable text of a field value; collection fields (lists) are joined."""
+    if isinstance(value, list):
+        return " ".join(str(v) for v in value)
+    return str(value or "")
+
+
+def document_id(filename: str) -> str:
+    """Index key for a filename — same sanitizing rule as the Lab 02 solution."""
+    return filename.replace(" ", "_").replace(".", "_")
+
+
+def _write_atomic(path: pathlib.Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class Column:
+    """One field of a doc table, dictionary-encoded for filtering and faceting.
+
+    Scalar fields keep a code per document (-1 when missing); collection
+    fields keep one (document, code) pair per distinct element.
+    """
+
+    def __init__(self, values_per_doc: list) -> None:
+        self.size = len(values_per_doc)
+        self.values: list = []
+        codes: dict = {}
+
+        def encode(value) -> int:
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, sort_keys=True)
+            key = (type(value), value)  # keeps True and 1 apart
+            code = codes.get(key)
+            if code is None:
+                code = codes[key] = len(self.values)
+                self.values.append(value)
+            return code
+
+        self.collection = any(isinstance(v, list) for v in values_per_doc)
+        if self.collection:
+            docs, entries = [], []
+            for ordinal, value in enumerate(values_per_doc):
+                items = value if isinstance(value, list) else ([] if value is None else [value])
+                for code in dict.fromkeys(encode(item) for item in items if item is not None):
+                    docs.append(ordinal)
+                    entries.append(code)
+            self.entry_docs = np.array(docs, dtype=np.int32)
+            self.entry_codes = np.array(entries, dtype=np.int32)
+        else:
+            self.codes = np.array([-1 if v is None else encode(v) for v in values_per_doc], dtype=np.int32)
+
+    def _value_mask(self, test: Callable[[Any], bool]) -> np.ndarray:
+        return np.fromiter((test(v) for v in self.values), dtype=bool, count=len(self.values))
+
+    def where(self, test: Callable[[Any], bool]) -> np.ndarray:
+        """Documents whose value passes test (missing values are tested as None)."""
+        if self.collection:
+            raise ValueError("Collection fields need any() or all(), e.g. keyPhrases/any(k: k eq 'azure')")
+        ok = self._value_mask(test)
+        mask = np.full(self.size, test(None), dtype=bool)
+        present = self.codes >= 0
+        mask[present] = ok[self.codes[present]]
+        return mask
+
+    def any(self, test: Callable[[Any], bool] | None) -> np.ndarray:
+        if not self.collection:
+            return (self.codes >= 0) & (self.where(test) if test else True)
+        entries = self.entry_docs if test is None else self.entry_docs[self._value_mask(test)[self.entry_codes]]
+        mask = np.zeros(self.size, dtype=bool)
+        mask[entries] = True
+        return mask
+
+    def all(self, test: Callable[[Any], bool]) -> np.ndarray:
+        if not self.collection:
+            return (self.codes < 0) | self.where(test)
+        failing = self.entry_docs[~self._value_mask(test)[self.entry_codes]]
+        return np.bincount(failing, minlength=self.size) == 0
+
+    def counts(self, doc_mask: np.ndarray) -> np.ndarray:
+        """Documents per value code among the documents in doc_mask."""
+        if self.collection:
+            codes = self.entry_codes[doc_mask[self.entry_docs]]
+        else:
+            codes = self.codes[doc_mask]
+            codes = codes[codes >= 0]
+        return np.bincount(codes, minlength=len(self.values))
+
+
+class DocTable:
+    """Stored documents by ordinal, with columns built on first use."""
+
+    def __init__(self, docs: list[dict]) -> None:
+        self.docs = docs
+        self._columns: dict[str, Column] = {}
+
+    def column(self, field: str) -> Column:
+        column = self._columns.get(field)
+        if column is None:
+            column = self._columns[field] = Column([doc.get(field) for doc in self.docs])
+        return column
+
+    def filter(self, node: tuple) -> np.ndarray:
+        """Boolean document mask for a parsed filter (see odata.parse_filter)."""
+        kind = node[0]
+        if kind in ("cmp", "in"):
+            return self.column(node[2] if kind == "cmp" else node[1]).where(functools.partial(odata.matches, node))
+        if kind == "const":
+            return np.full(len(self.docs), node[1], dtype=bool)
+        if kind == "and":
+            return self.filter(node[1]) & self.filter(node[2])
+        if kind == "or":
+            return self.filter(node[1]) | self.filter(node[2])
+        if kind == "not":
+            return ~self.filter(node[1])
+        _, field, _, inner = node
+        if kind == "all":
+            return self.column(field).all(functools.partial(odata.matches, inner))
+        return self.column(field).any(functools.partial(odata.matches, inner) if inner is not None else None)
+
+
+class Segment:
+    """An immutable, memory-mapped index segment."""
+
+    def __init__(self, directory: pathlib.Path, name: str, deleted: set[int] | None = None) -> None:
+        self.name = name
+        self.deleted: set[int] = deleted or set()
+        self.docs: list[dict] = json.loads((directory / f"{name}.docs.json").read_text(encoding="utf-8"))
+        self.terms: dict[str, list[int]] = json.loads((directory / f"{name}.terms.json").read_text(encoding="utf-8"))
+        self._file = open(directory / f"{name}.post", "rb")  # noqa: SIM115 — kept open for the mmap
+        size = os.fstat(self._file.fileno()).st_size
+        self._postings = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._table: DocTable | None = None
+
+    @classmethod
+    def write(cls, directory: pathlib.Path, name: str, docs: list[dict]) -> "Segment":
+        """Build a segment from documents and write it to disk."""
+        inverted: dict[str, dict[int, int]] = {}
+        stored = []
+        for ordinal, doc in enumerate(docs):
+            tokens = tokenize(" ".join(field_text(doc.get(f)) for f in SEARCHABLE_FIELDS))
+            for token in tokens:
+                freqs = inverted.setdefault(token, {})
+                freqs[ordinal] = freqs.get(ordinal, 0) + 1
+            stored.append({"fields": doc, "length": len(tokens)})
+
+        terms: dict[str, list[int]] = {}
+        postings = bytearray()
+        for term in sorted(inverted):
+            freqs = inverted[term]
+            terms[term] = [len(postings), len(freqs)]
+            postings += array("I", freqs.keys()).tobytes()
+            postings += array("H", (min(tf, MAX_TERM_FREQ) for tf in freqs.values())).tobytes()
+
+        _write_atomic(directory / f"{name}.post", bytes(postings))
+        _write_atomic(directory / f"{name}.terms.json", json.dumps(terms, separators=(",", ":")).encode())
+        _write_atomic(directory / f"{name}.docs.json", json.dumps(stored, separators=(",", ":")).encode())
+        return cls(directory, name)
+
+    def postings(self, term: str) -> tuple[array, array]:
+        """Return (doc ordinals, term freqs) for a term, including deleted docs."""
+        entry = self.terms.get(term)
+        ordinals, freqs = array("I"), array("H")
+        if entry is None:
+            return ordinals, freqs
+        offset, count = entry
+        split = offset + count * ordinals.itemsize
+        ordinals.frombytes(self._postings[offset:split])
+        freqs.frombytes(self._postings[split : split + count * freqs.itemsize])
+        return ordinals, freqs
+
+    def live_ordinals(self):
+        return (i for i in range(len(self.docs)) if i not in self.deleted)
+
+    @property
+    def table(self) -> DocTable:
+        if self._table is None:
+            self._table = DocTable([doc["fields"] for doc in self.docs])
+        return self._table
+
+    def live_mask(self) -> np.ndarray:
+        mask = np.ones(len(self.docs), dtype=bool)
+        if self.deleted:
+            mask[np.fromiter(self.deleted, dtype=np.int64)] = False
+        return mask
+
+    def close(self) -> None:
+        if isinstance(self._postings, mmap.mmap):
+            self._postings.close()
+        self._file.close()
+
+    def remove_files(self, directory: pathlib.Path) -> None:
+        for suffix in (".docs.json", ".terms.json", ".post"):
+            (directory / f"{self.name}{suffix}").unlink(missing_ok=True)
+
+
+class LocalSearchIndex:
+    """Segment-based inverted index with BM25 ranking and incremental updates."""
+
+    def __init__(self, directory: pathlib.Path) -> None:
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._segments: list[Segment] = []
+        self._next_segment = 1
+        self._locations: dict[str, tuple[Segment, int]] = {}
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self) -> None:
+        manifest_path = self.directory / "manifest.json"
+        if not manifest_path.exists():
+            return
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        self._next_segment = manifest.get("next_segment", 1)
+        for entry in manifest.get("segments", []):
+            segment = Segment(self.directory, entry["name"], set(entry.get("deleted", [])))
+            self._segments.append(segment)
+        self._rebuild_locations()
+        logger.info("Loaded local search index: %d docs in %d segments", self.doc_count, len(self._segments))
+
+    def _save_manifest(self) -> None:
+        manifest = {
+            "next_segment": self._next_segment,
+            "segments": [{"name": s.name, "deleted": sorted(s.deleted)} for s in self._segments],
+        }
+        _write_atomic(self.directory / "manifest.json", json.dumps(manifest).encode())
+
+    def _rebuild_locations(self) -> None:
+        self._locations = {}
+        for segment in self._segments:
+            for ordinal in segment.live_ordinals():
+                self._locations[segment.docs[ordinal]["fields"]["id"]] = (segment, ordinal)
+
+    def _new_segment_name(self) -> str:
+        name = f"seg-{self._next_segment:06d}"
+        self._next_segment += 1
+        return name
+
+    # --- Writes ---
+
+    def upload(self, docs: list[dict]) -> None:
+        """Add or fully replace documents (same semantics as upload_documents)."""
+        if not docs:
+            return
+        with self._lock:
+            # Last write wins for duplicate ids within one batch
+            unique = list({doc["id"]: doc for doc in docs}.values())
+            self._tombstone(doc["id"] for doc in unique)
+            segment = Segment.write(self.directory, self._new_segment_name(), unique)
+            self._segments.append(segment)
+            for ordinal, doc in enumerate(unique):
+                self._locations[doc["id"]] = (segment, ordinal)
+            if len(self._segments) > MAX_SEGMENTS:
+                self._merge()
+            self._save_manifest()
+
+    def delete(self, ids) -> int:
+        """Delete documents by id. Returns how many existed."""
+        with self._lock:
+            removed = self._tombstone(ids)
+            if removed:
+                self._save_manifest()
+            return removed
+
+    def _tombstone(self, ids) -> int:
+        removed = 0
+        for doc_id in ids:
+            location = self._locations.pop(doc_id, None)
+            if location is not None:
+                segment, ordinal = location
+                segment.deleted.add(ordinal)
+                removed += 1
+        return removed
+
+    def merge(self) -> None:
+        """Compact all segments into one, dropping deleted documents."""
+        with self._lock:
+            self._merge()
+            self._save_manifest()
+
+    def _merge(self) -> None:
+        live = [segment.docs[o]["fields"] for segment in self._segments for o in segment.live_ordinals()]
+        old = self._segments
+        self._segments = [Segment.write(self.directory, self._new_segment_name(), live)] if live else []
+        self._rebuild_locations()
+        # Manifest must point at the new segment before old files disappear
+        self._save_manifest()
+        for segment in old:
+            segment.close()
+            segment.remove_files(self.directory)
+
+    # --- Reads ---
+
+    @property
+    def doc_count(self) -> int:
+        return len(self._locations)
+
+    def live_documents(self) -> list[dict]:
+        """Stored fields of every live document."""
+        with self._lock:
+            return [segment.docs[ordinal]["fields"] for segment, ordinal in self._locations.values()]
+
+    def get(self, doc_id: str) -> dict | None:
+        location = self._locations.get(doc_id)
+        if location is None:
+            return None
+        segment, ordinal = location
+        return segment.docs[ordinal]["fields"]
+
+    def search(self, query: str, top: int = 10) -> list[dict]:
+        """Run a BM25 query and return results in the search_service dict shape."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            scored = self._score(terms)
+            best = heapq.nlargest(top, scored.items(), key=lambda item: item[1])
+            return [_to_result(self._segments[s].docs[o]["fields"], score, terms) for (s, o), score in best]
+
+    def query(
+        self,
+        query: str,
+        filter_node: tuple | None = None,
+        facets: list[tuple[str, int, str]] | None = None,
+        orderby: list[tuple[str, bool]] | None = None,
+        select: list[str] | None = None,
+        top: int = 10,
+        after: list | None = None,
+    ) -> dict:
+        """Search with filter, facets, ordering and search-after paging; "*" matches every document.
+
+        Returns {"results", "count", "facets", "after"}; "after" holds the last
+        result's sort values when there are more results, for the next page.
+        """
+        match_all = query.strip() == "*"
+        terms = [] if match_all else list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            scores: list[dict[int, float]] = [{} for _ in self._segments]
+            for (seg_index, ordinal), score in self._score(terms).items():
+                scores[seg_index][ordinal] = score
+            parts: list[tuple[DocTable, np.ndarray | None, dict[int, float] | None]] = [
+                (s.table, s.live_mask(), None if match_all else scores[i]) for i, s in enumerate(self._segments)
+            ]
+            return execute(parts, terms, filter_node, facets or [], orderby or [], select, top, after)
+
+    def _score(self, terms: list[str]) -> dict[tuple[int, int], float]:
+        doc_count = self.doc_count
+        if not doc_count or not terms:
+            return {}
+        total_length = sum(s.docs[o]["length"] for s in self._segments for o in s.live_ordinals())
+        avg_length = total_length / doc_count or 1.0
+
+        scores: dict[tuple[int, int], float] = {}
+        for term in terms:
+            # Collect live postings first — document frequency must ignore deleted docs
+            matches: list[tuple[int, int, int]] = []
+            for seg_index, segment in enumerate(self._segments):
+                ordinals, freqs = segment.postings(term)
+                deleted = segment.deleted
+                matches.extend((seg_index, o, tf) for o, tf in zip(ordinals, freqs, strict=True) if o not in deleted)
+            if not matches:
+                continue
+            df = len(matches)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for seg_index, ordinal, tf in matches:
+                length = self._segments[seg_index].docs[ordinal]["length"]
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                key = (seg_index, ordinal)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return scores
+
+    def upload_document(self, filename: str, content: str) -> None:
+        """Index a whole file as one document, mirroring search_service.upload_document."""
+        self.upload([{"id": document_id(filename), "content": content, "source": filename, "title": filename}])
+
+    def close(self) -> None:
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+
+
+def _to_result(fields: dict, score: float, terms: list[str], select: list[str] | None = None) -> dict:
+    if select is not None:
+        # Selected fields only, as Azure returns them
+        item = {"score": round(score, 4), **{key: fields[key] for key in select if key in fields}}
+        if "content" in select and (highlights := highlight(fields.get("content", ""), terms)):
+            item["highlights"] = highlights
+        return item
+    item = {"content": fields.get("content", ""), "score": round(score, 4)}
+    if fields.get("source"):
+        item["source"] = fields["source"]
+    highlights = highlight(item["content"], terms)
+    if highlights:
+        item["highlights"] = highlights
+    metadata = {key: fields[key] for key in METADATA_FIELDS if fields.get(key)}
+    if metadata:
+        item["metadata"] = metadata
+    return item
+
+
+@functools.total_ordering
+class _SortValue:
+    """One orderby value: missing values sort first ascending, last descending (as in Azure)."""
+
+    __slots__ = ("value", "descending")
+
+    def __init__(self, value, descending: bool) -> None:
+        self.value = value
+        self.descending = descending
+
+    def __eq__(self, other) -> bool:
+        return self.value == other.value
+
+    def __lt__(self, other) -> bool:
+        a, b = self.value, other.value
+        if a == b:
+            return False
+        if a is None or b is None:
+            less = a is None
+        else:
+            try:
+                less = a < b
+            except TypeError:
+                less = str(a) < str(b)
+        return less != self.descending
+
+
+def _top_by_score(
+    candidates: list[tuple[dict, float]], descending: bool, limit: int, after: list | None
+) -> list[tuple[dict, float]]:
+    """First `limit` candidates after the cursor in (score, id) order, selected with numpy.
+
+    Relevance order is the default, so this keeps large result sets (and
+    "*", where every score ties) from building a sort key per result.
+    """
+    if len(candidates) <= limit and after is None:
+        return candidates
+    rank = np.fromiter((score for _, score in candidates), dtype=np.float64, count=len(candidates))
+    if descending:
+        rank = -rank
+    selected = np.arange(len(candidates))
+    if after is not None:
+        # Drop everything up to the cursor before picking the top, or ties already
+        # returned would take places on this page
+        start = -after[0] if descending else after[0]
+        ties = selected[rank == start]
+        tie_ids = np.array([candidates[i][0].get("id") or "" for i in ties.tolist()], dtype=str)
+        selected = np.concatenate([selected[rank > start], ties[tie_ids > (after[-1] or "")]])
+    if len(selected) > limit:
+        threshold = np.partition(rank[selected], limit - 1)[limit - 1]
+        selected = selected[rank[selected] <= threshold]
+    ids = np.array([candidates[i][0].get("id") or "" for i in selected.tolist()], dtype=str)
+    best = selected[np.lexsort((ids, rank[selected]))[:limit]]
+    return [candidates[i] for i in best.tolist()]
+
+
+def execute(
+    parts: list[tuple[DocTable, np.ndarray | None, dict[int, float] | None]],
+    terms: list[str],
+    filter_node: tuple | None,
+    facets: list[tuple[str, int, str]],
+    orderby: list[tuple[str, bool]],
+    select: list[str] | None,
+    top: int,
+    after: list | None,
+) -> dict:
+    """Filter, facet, order and page documents given as (table, live mask, scores by ordinal) parts.
+
+    scores None means every live document matches with score 1.0.
+    """
+    order = orderby or [(odata.SCORE_FIELD, True)]
+    facet_counts: dict[str, dict] = {field: {} for field, _, _ in facets}
+    candidates: list[tuple[dict, float]] = []
+    total = 0
+    for table, live, scores in parts:
+        mask = np.ones(len(table.docs), dtype=bool) if live is None else live.copy()
+        if scores is not None:
+            matched = np.zeros(len(table.docs), dtype=bool)
+            matched[np.fromiter(scores, dtype=np.int64, count=len(scores))] = True
+            mask &= matched
+        if filter_node is not None:
+            mask &= table.filter(filter_node)
+        total += int(mask.sum())
+        for field in facet_counts:
+            column = table.column(field)
+            counts = column.counts(mask)
+            for code in np.flatnonzero(counts):
+                value = column.values[code]
+                facet_counts[field][value] = facet_counts[field].get(value, 0) + int(counts[code])
+        candidates.extend((table.docs[o], 1.0 if scores is None else scores[o]) for o in np.flatnonzero(mask).tolist())
+
+    def sort_values(doc: dict, score: float) -> list:
+        return [score if field == odata.SCORE_FIELD else doc.get(field) for field, _ in order] + [doc.get("id")]
+
+    def sort_key(values: list) -> tuple:
+        return tuple(_SortValue(v, desc) for v, (_, desc) in zip(values, order + [("id", False)], strict=True))
+
+    if len(order) == 1 and order[0][0] == odata.SCORE_FIELD:
+        candidates = _top_by_score(candidates, order[0][1], top + 1, after)
+    keyed = ((sort_key(sort_values(doc, score)), doc, score) for doc, score in candidates)
+    if after is not None:
+        start = sort_key(after)
+        keyed = (entry for entry in keyed if entry[0] > start)
+    page = heapq.nsmallest(top + 1, keyed, key=lambda entry: entry[0])
+    more = len(page) > top
+    page = page[:top]
+
+    facet_results = {}
+    for field, count, sort in facets:
+        items = facet_counts[field].items()
+        if sort.endswith("value"):
+            ordered = sorted(items, key=lambda kv: _SortValue(kv[0], sort.startswith("-")))
+        else:
+            ordered = sorted(items, key=lambda kv: kv[1], reverse=not sort.startswith("-"))
+        facet_results[field] = [{"value": value, "count": n} for value, n in ordered[:count]]
+    return {
+        "results": [_to_result(doc, score, terms, select) for _, doc, score in page],
+        "count": total,
+        "facets": facet_results,
+        "after": sort_values(page[-1][1], page[-1][2]) if more else None,
+    }
+
+
+def highlight(text: str, terms: list[str]) -> list[str]:
+    """Build Azure-style highlight fragments with matched terms wrapped in <em>."""
+    wanted = set(terms)
+    spans = [m.span() for m in _TOKEN_RE.finditer(text) if m.group().lower() in wanted]
+    if not spans:
+        return []
+
+    # Group matches into windows around each hit, merging overlapping windows
+    windows: list[list[tuple[int, int]]] = []
+    for span in spans:
+        if windows and span[0] - windows[-1][-1][1] <= HIGHLIGHT_WINDOW:
+            windows[-1].append(span)
+        else:
+            if len(windows) == MAX_HIGHLIGHTS:
+                break
+            windows.append([span])
+
+    fragments = []
+    for hits in windows:
+        start = max(0, hits[0][0] - HIGHLIGHT_WINDOW // 2)
+        end = min(len(text), hits[-1][1] + HIGHLIGHT_WINDOW // 2)
+        # Snap to word boundaries so fragments don't start or end mid-word
+        if start > 0 and (space := text.find(" ", start, hits[0][0])) != -1:
+            start = space + 1
+        if end < len(text) and (space := text.rfind(" ", hits[-1][1], end)) != -1:
+            end = space
+        parts, cursor = [], start
+        for hit_start, hit_end in hits:
+            parts.append(text[cursor:hit_start])
+            parts.append(f"<em>{text[hit_start:hit_end]}</em>")
+            cursor = hit_end
+        parts.append(text[cursor:end])
+        fragments.append("".join(parts).strip())
+    return fragments
+
+
+_index: LocalSearchIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> LocalSearchIndex:
+    """Return the process-wide local index, opening it on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            directory = pathlib.Path(settings.LOCAL_SEARCH_DIR) if settings.LOCAL_SEARCH_DIR else DEFAULT_INDEX_DIR
+            _index = LocalSearchIndex(directory)
+        return _index
@@ -0,0 +1,250 @@
+"""OData query syntax used by /api/search/query: $filter, $orderby and facet specs.
+
+The local engine (SEARCH_BACKEND=local) evaluates a parsed filter; Azure AI
+Search receives the original strings. Supported filter subset:
+    comparisons     category eq 'news', pages ge 3, language ne null
+    logic           and, or, not, parentheses
+    set membership  search.in(category, 'news,blog'), search.in(f, 'a|b', '|')
+    collections     keyPhrases/any(k: k eq 'azure'), entities/any(),
+                    keyPhrases/all(k: k ne 'draft')
+Filters parse into tuples:
+    ("cmp", op, field, literal)    ("in", field, frozenset)    ("const", bool)
+    ("and", a, b)    ("or", a, b)    ("not", a)
+    ("any" | "all", field, variable, inner or None)
+Inside a lambda, field is the range variable.
+"""
+
+import re
+from typing import Any
+
+COMPARISON_OPS = {"eq", "ne", "gt", "ge", "lt", "le"}
+SCORE_FIELD = "search.score()"
+
+_FIELD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_TOKEN_RE = re.compile(
+    r"\s*(?:(?P<string>'(?:[^']|'')*')|(?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)"
+    r"|(?P<name>[A-Za-z_][\w.]*)|(?P<punct>[()/,:]))"
+)
+
+
+def _tokenize(text: str) -> list[tuple[str, Any]]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        kind = match.lastgroup if match else None
+        if match is None or kind is None:
+            raise ValueError(f"Invalid filter syntax near '{text[position : position + 20].strip()}'")
+        position = match.end()
+        value = match.group(kind)
+        if kind == "string":
+            tokens.append(("literal", value[1:-1].replace("''", "'")))
+        elif kind == "number":
+            tokens.append(("literal", float(value) if any(c in value for c in ".eE") else int(value)))
+        elif kind == "name" and value in ("true", "false", "null"):
+            tokens.append(("literal", {"true": True, "false": False, "null": None}[value]))
+        else:
+            tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text: str) -> None:
+        self.tokens = _tokenize(text)
+        self.position = 0
+
+    def peek(self, offset: int = 0) -> tuple[str, Any] | None:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def take(self, kind: str, value: Any = None) -> Any:
+        token = self.peek()
+        if token is None or token[0] != kind or (value is not None and token[1] != value):
+            found = repr(token[1]) if token else "end of filter"
+            raise ValueError(f"Invalid filter: expected {value or kind}, found {found}")
+        self.position += 1
+        return token[1]
+
+    def accept(self, kind: str, value: Any = None) -> bool:
+        token = self.peek()
+        if token is not None and token[0] == kind and (value is None or token[1] == value):
+            self.position += 1
+            return True
+        return False
+
+    def parse(self) -> tuple:
+        node = self.parse_or(None)
+        token = self.peek()
+        if token is not None:
+            raise ValueError(f"Invalid filter: unexpected {token[1]!r}")
+        return node
+
+    def parse_or(self, variable: str | None) -> tuple:
+        node = self.parse_and(variable)
+        while self.accept("name", "or"):
+            node = ("or", node, self.parse_and(variable))
+        return node
+
+    def parse_and(self, variable: str | None) -> tuple:
+        node = self.parse_unary(variable)
+        while self.accept("name", "and"):
+            node = ("and", node, self.parse_unary(variable))
+        return node
+
+    def parse_unary(self, variable: str | None) -> tuple:
+        if self.accept("name", "not"):
+            return ("not", self.parse_unary(variable))
+        return self.parse_primary(variable)
+
+    def parse_primary(self, variable: str | None) -> tuple:
+        if self.accept("punct", "("):
+            node = self.parse_or(variable)
+            self.take("punct", ")")
+            return node
+        token = self.peek()
+        if token is not None and token[0] == "literal" and isinstance(token[1], bool):
+            self.position += 1
+            return ("const", token[1])
+        name = self.take("name")
+        if name == "search.in":
+            return self.parse_search_in(variable)
+        field = _field(name, variable)
+        if self.accept("punct", "/"):
+            if variable is not None:
+                raise ValueError("Invalid filter: nested any()/all() is not supported")
+            return self.parse_lambda(field)
+        op = self.take("name")
+        if op not in COMPARISON_OPS:
+            raise ValueError(f"Invalid filter: unknown operator '{op}'")
+        return ("cmp", op, field, self.take("literal"))
+
+    def parse_search_in(self, variable: str | None) -> tuple:
+        self.take("punct", "(")
+        field = _field(self.take("name"), variable)
+        self.take("punct", ",")
+        values = self.take("literal")
+        delimiters = " ,"
+        if self.accept("punct", ","):
+            delimiters = self.take("literal")
+        self.take("punct", ")")
+        if not isinstance(values, str) or not isinstance(delimiters, str) or not delimiters:
+            raise ValueError("Invalid filter: search.in expects string arguments")
+        parts = re.split("|".join(re.escape(d) for d in delimiters), values)
+        return ("in", field, frozenset(p for p in parts if p))
+
+    def parse_lambda(self, field: str) -> tuple:
+        kind = self.take("name")
+        if kind not in ("any", "all"):
+            raise ValueError(f"Invalid filter: expected any or all after '{field}/'")
+        self.take("punct", "(")
+        if self.accept("punct", ")"):
+            if kind == "all":
+                raise ValueError("Invalid filter: all() needs a condition")
+            return ("any", field, None, None)
+        variable = self.take("name")
+        self.take("punct", ":")
+        inner = self.parse_or(variable)
+        self.take("punct", ")")
+        return (kind, field, variable, inner)
+
+
+def _field(name: str, variable: str | None) -> str:
+    if variable is not None:
+        if name != variable:
+            raise ValueError(f"Invalid filter: only the range variable '{variable}' can be used inside a lambda")
+        return name
+    return check_field(name)
+
+
+def check_field(name: str) -> str:
+    if not _FIELD_RE.fullmatch(name):
+        raise ValueError(f"Invalid field name '{name}'")
+    return name
+
+
+def parse_filter(text: str) -> tuple:
+    """Parse a $filter expression; raises ValueError with a readable message."""
+    if not text.strip():
+        raise ValueError("Invalid filter: empty expression")
+    return _Parser(text).parse()
+
+
+def compare(value: Any, op: str, literal: Any) -> bool:
+    """One OData comparison; values of different types never compare equal."""
+    if literal is None or value is None:
+        return (value is literal) == (op == "eq") if op in ("eq", "ne") else False
+    if isinstance(value, bool) != isinstance(literal, bool):
+        return op == "ne"
+    try:
+        if op == "eq":
+            return value == literal
+        if op == "ne":
+            return value != literal
+        if op == "gt":
+            return value > literal
+        if op == "ge":
+            return value >= literal
+        if op == "lt":
+            return value < literal
+        return value <= literal
+    except TypeError:
+        return False
+
+
+def matches(node: tuple, value: Any) -> bool:
+    """Evaluate a single-field (or lambda body) expression against one value."""
+    kind = node[0]
+    if kind == "cmp":
+        return compare(value, node[1], node[3])
+    if kind == "in":
+        return value in node[2]
+    if kind == "const":
+        return node[1]
+    if kind == "and":
+        return matches(node[1], value) and matches(node[2], value)
+    if kind == "or":
+        return matches(node[1], value) or matches(node[2], value)
+    if kind == "not":
+        return not matches(node[1], value)
+    raise ValueError("Invalid filter: any()/all() inside a lambda is not supported")
+
+
+def parse_orderby(text: str) -> list[tuple[str, bool]]:
+    """'field [asc|desc], ...' -> [(field, descending)]; search.score() is allowed."""
+    clauses = []
+    for part in text.split(","):
+        words = part.split()
+        if not words or len(words) > 2 or (len(words) == 2 and words[1].lower() not in ("asc", "desc")):
+            raise ValueError(f"Invalid orderby clause '{part.strip()}'")
+        field = words[0] if words[0] == SCORE_FIELD else check_field(words[0])
+        clauses.append((field, len(words) == 2 and words[1].lower() == "desc"))
+    if len(clauses) > 32:
+        raise ValueError("At most 32 orderby clauses are allowed")
+    return clauses
+
+
+def parse_facet(spec: str) -> tuple[str, int, str]:
+    """'field[,count:N][,sort:count|value]' -> (field, count, sort)."""
+    name, *params = [p.strip() for p in spec.split(",")]
+    count, sort = 10, "count"
+    for param in params:
+        key, _, value = param.partition(":")
+        if key == "count" and value.isdigit():
+            count = int(value)
+        elif key == "sort" and value in ("count", "-count", "value", "-value"):
+            sort = value
+        else:
+            raise ValueError(f"Unsupported facet parameter '{param}' (local engine supports count and sort)")
+    return check_field(name), count, sort
+
+
+def literal(value: Any) -> str:
+    """Format a value as an OData literal."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
@@ -30,6 +30,8 @@ def chat_completion(
 
     Called by: generative.router /api/generative/chat
     Returns: The assistant message content as a string.
+    Optional: call usage.record_response(response) (app/services/usage.py) after
+    the API call to report token usage, including cached prompt tokens.
     """
     if settings.DEMO_MODE:
         from app.services.mock_data import mock_chat_completion
@@ -82,6 +84,9 @@ def chat_with_tools(
 
     Called by: agents.router /api/agents/chat
     Returns: Dict with "message" (str) and "tool_calls" (list of dicts).
+    Tip: keep the system prompt identical across turns (instructions, then the
+    tool list in a fixed order) so Azure OpenAI can reuse its prompt cache —
+    see app/services/prompt_builder.py.
     """
     if settings.DEMO_MODE:
         from app.services.mock_data import mock_chat_with_tools
@@ -91,3 +96,21 @@ def chat_with_tools(
         "See docs/labs/06-agents.md — Layer 1. "
         "Hint: reuse the AzureOpenAI client from chat_completion() with a system message"
     )
+
+
+# === Embeddings (Lab 02, Layer 5) ===
+# Vector search, semantic caching and reranking need text embeddings.
+# Batching, deduplication and the on-disk cache live in app/services/embeddings.py.
+
+
+def embed(texts: list[str]) -> list[list[float]]:
+    """Return one embedding vector per input text.
+
+    Called by: generative.router /api/generative/embeddings and the vector index.
+    Uses AZURE_OPENAI_EMBEDDING_DEPLOYMENT, or the offline CPU model when
+    EMBEDDING_BACKEND=local (always in demo mode).
+    Returns: List of float vectors, in input order.
+    """
+    from app.services.embeddings import embed_texts
+
+    return embed_texts(texts).tolist()
@@ -0,0 +1,48 @@
+"""Prompt assembly ordered for upstream prompt caching.
+
+Azure OpenAI caches the longest previously seen prompt prefix (in 128-token
+steps beyond the first 1024), so anything that changes every turn must come
+after everything that does not. build() orders a request as:
+    1. static system instructions (identical on every turn)
+    2. the stable conversation prefix — client system prompt, stored
+       summary and earlier turns, which only ever grow at the end
+    3. volatile per-turn context, e.g. retrieved RAG passages
+    4. the final user turn
+Tool schemas are sent in the request's tools parameter, which the service
+places ahead of the messages; tool_schemas() keeps their order stable.
+"""
+
+RAG_INSTRUCTIONS = (
+    "Answer the user's question using the context from their documents provided in the "
+    "system message just before the question. If the context doesn't contain relevant "
+    "information, say so."
+)
+
+
+def _last_user_index(conversation: list[dict]) -> int:
+    for index in range(len(conversation) - 1, -1, -1):
+        if conversation[index].get("role") == "user":
+            return index
+    return len(conversation)
+
+
+def build(conversation: list[dict], instructions: str = "", context: str | None = None) -> list[dict]:
+    """Order messages as static instructions, stable history, volatile context, final user turn.
+
+    Args:
+        conversation: Client system prompt, history and the new turn, oldest first.
+        instructions: Static system instructions; must not contain per-turn data.
+        context: Per-turn context inserted right before the final user turn.
+    """
+    messages = [{"role": "system", "content": instructions}] if instructions else []
+    split = _last_user_index(conversation)
+    messages.extend(conversation[:split])
+    if context:
+        messages.append({"role": "system", "content": f"Context:\n{context}"})
+    messages.extend(conversation[split:])
+    return messages
+
+
+def tool_schemas(tools: list) -> list[dict]:
+    """Function definitions in name order, so toggling tools in the UI does not reorder the prefix."""
+    return [t.schema() for t in sorted(tools, key=lambda t: t.name)]
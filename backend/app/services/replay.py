@@ -0,0 +1,270 @@
+"""Record/replay backend for realistic, network-free demo and load testing.
+
+REPLAY_MODE selects the behavior (default "off"):
+    record  service functions run normally; each successful result is
+            appended to REPLAY_ARCHIVE together with its latency
+    replay  results are served from the archive; a miss either calls the
+            real function (REPLAY_MISS=passthrough — the mock in demo mode)
+            or raises RuntimeError (REPLAY_MISS=error, a 503)
+install() wraps the lab service functions listed in SERVICE_FUNCTIONS on
+their modules, so routers pick the wrappers up without changes. Calls are
+keyed by the function name and its normalized arguments (whitespace in
+strings collapsed, bytes hashed).
+
+The archive is a gzip stream of JSON lines. A result is stored once per
+key; later calls for the same key only add a latency sample.
+
+Simulated latency in replay mode (REPLAY_LATENCY):
+    none          answer immediately
+    recorded      the latency recorded with that exact call
+    distribution  a sample from all latencies recorded for the function
+scaled by REPLAY_LATENCY_SCALE. Inside a request the delay is applied by
+LatencyMiddleware with asyncio.sleep before the response starts, so
+simulated latency never blocks the event loop or a worker thread. A call
+shared by several requests (singleflight) collects its delay separately and
+each waiting request adds it to its own, see shared_delay().
+
+Code inside bypass() (the /api/validate checks, which must see the real lab
+functions, stubs included) calls the original functions.
+"""
+
+import asyncio
+import contextvars
+import copy
+import functools
+import gzip
+import hashlib
+import importlib
+import json
+import logging
+import pathlib
+import random
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import TextIO
+
+from app import metrics, uploads
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE = pathlib.Path(__file__).resolve().parent.parent.parent / "data" / "replay.jsonl.gz"
+
+SERVICE_FUNCTIONS: dict[str, list[str]] = {
+    "app.services.openai_service": ["chat_completion", "generate_image", "chat_with_tools"],
+    "app.services.vision_service": ["analyze_image", "ocr_image"],
+    "app.services.language_service": ["analyze_text", "translate_text", "speech_to_text", "text_to_speech"],
+    "app.services.search_service": ["search_documents"],
+    "app.services.document_service": ["analyze_document"],
+    "app.services.safety_service": ["analyze_text", "check_prompt"],
+}
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"sha256": hashlib.sha256(value).hexdigest()}
+    if uploads.is_file(value):
+        # Zero-copy uploads key like the same content passed as bytes
+        return {"sha256": uploads.digest(value)[1]}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items())}
+    return value
+
+
+def call_key(name: str, args: tuple, kwargs: dict) -> str:
+    payload = json.dumps([name, _normalize(list(args)), _normalize(kwargs)], sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Archive:
+    """Recorded results and latency samples, loaded from and appended to a gzip JSONL file."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self.results: dict[str, object] = {}
+        self.latencies: dict[str, list[float]] = {}
+        self.function_latencies: dict[str, list[float]] = {}
+        self._writer: TextIO | None = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    self._apply(json.loads(line))
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+            # A recording process that was killed leaves a truncated last member
+            logger.warning("Replay archive %s is truncated; using the records read so far", self.path)
+        logger.info("Loaded %d recorded responses from %s", len(self.results), self.path)
+
+    def _apply(self, record: dict) -> None:
+        if "result" in record:
+            self.results[record["key"]] = record["result"]
+        self.latencies.setdefault(record["key"], []).append(record["latency_ms"])
+        self.function_latencies.setdefault(record["fn"], []).append(record["latency_ms"])
+
+    def append(self, key: str, name: str, result, latency_ms: float) -> None:
+        record = {"key": key, "fn": name, "latency_ms": round(latency_ms, 2)}
+        with self._lock:
+            if key not in self.results:
+                record["result"] = result
+            line = json.dumps(record, separators=(",", ":"))
+            if self._writer is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._writer = gzip.open(self.path, "at", encoding="utf-8")  # noqa: SIM115 — closed in close()
+            self._writer.write(line + "\n")
+            self._writer.flush()
+            self._apply(record)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+class PendingDelay:
+    def __init__(self) -> None:
+        self.seconds = 0.0
+
+
+_pending: contextvars.ContextVar[PendingDelay | None] = contextvars.ContextVar("replay_delay", default=None)
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("replay_bypass", default=False)
+_archive: Archive | None = None
+_rng = random.Random(0)  # noqa: S311 — latency simulation, not security
+_installed = False
+
+
+def _simulated_delay(archive: Archive, key: str, name: str) -> float:
+    mode = settings.REPLAY_LATENCY
+    if mode == "recorded":
+        samples = archive.latencies.get(key, [])
+        delay_ms = samples[-1] if samples else 0.0
+    elif mode == "distribution":
+        samples = archive.function_latencies.get(name, [])
+        delay_ms = _rng.choice(samples) if samples else 0.0
+    else:
+        return 0.0
+    return delay_ms / 1000 * settings.REPLAY_LATENCY_SCALE
+
+
+def _delay(seconds: float) -> None:
+    if seconds <= 0:
+        return
+    pending = _pending.get()
+    if pending is not None:
+        pending.seconds += seconds
+    else:
+        time.sleep(seconds)
+
+
+def shared_delay() -> PendingDelay:
+    """Give the current context its own delay, for a call whose result several requests share.
+
+    Run the shared call in that context, then have every waiting request
+    apply_delay() the collected seconds.
+    """
+    pending = PendingDelay()
+    _pending.set(pending)
+    return pending
+
+
+def apply_delay(seconds: float) -> None:
+    """Add a shared call's simulated latency to the current request's."""
+    pending = _pending.get()
+    if pending is not None and seconds > 0:
+        pending.seconds += seconds
+
+
+@contextmanager
+def bypass() -> Iterator[None]:
+    """Call the original, unwrapped service functions inside this block."""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def _wrap(fn: Callable, name: str) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _bypass.get():
+            return fn(*args, **kwargs)
+        key = call_key(name, args, kwargs)
+        if settings.REPLAY_MODE == "replay":
+            if key in _archive.results:
+                metrics.incr("replay.hits")
+                _delay(_simulated_delay(_archive, key, name))
+                return copy.deepcopy(_archive.results[key])
+            metrics.incr("replay.misses")
+            if settings.REPLAY_MISS == "error":
+                raise RuntimeError(f"No recorded response for {name}. Record one with REPLAY_MODE=record.")
+            return fn(*args, **kwargs)
+
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        latency_ms = (time.perf_counter() - start) * 1000
+        try:
+            _archive.append(key, name, result, latency_ms)
+            metrics.incr("replay.recorded")
+        except (TypeError, ValueError):
+            logger.warning("Result of %s is not JSON-serializable; not recorded", name)
+        return result
+
+    return wrapper
+
+
+def install() -> None:
+    """Wrap the service functions for REPLAY_MODE; no-op when off or already installed."""
+    global _archive, _installed
+    if settings.REPLAY_MODE == "off" or _installed:
+        return
+    path = pathlib.Path(settings.REPLAY_ARCHIVE) if settings.REPLAY_ARCHIVE else DEFAULT_ARCHIVE
+    _archive = Archive(path)
+    for module_name, names in SERVICE_FUNCTIONS.items():
+        module = importlib.import_module(module_name)
+        for attr in names:
+            setattr(module, attr, _wrap(getattr(module, attr), f"{module_name}.{attr}"))
+    _installed = True
+    metrics.register_gauge("replay.recorded_responses", lambda: len(_archive.results))
+    logger.info("Replay backend installed in %s mode (%s)", settings.REPLAY_MODE, path)
+
+
+def close() -> None:
+    if _archive is not None:
+        _archive.close()
+
+
+class LatencyMiddleware:
+    """Applies simulated replay latency with asyncio.sleep before the response starts."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        pending = PendingDelay()
+        token = _pending.set(pending)
+
+        async def delayed_send(message):
+            if message["type"] == "http.response.start" and pending.seconds > 0:
+                await asyncio.sleep(pending.seconds)
+                pending.seconds = 0.0
+            await send(message)
+
+        try:
+            await self.app(scope, receive, delayed_send)
+        finally:
+            _pending.reset(token)
@@ -0,0 +1,59 @@
+"""RAG retrieval — keyword search, optionally fused with local vector search.
+
+generative.router calls retrieve() for grounded chat. Keyword results come
+from search_service.search_documents through the result cache. With
+VECTOR_SEARCH_ENABLED on, keyword and vector rankings are merged by Reciprocal
+Rank Fusion, the same fusion Azure AI Search uses for hybrid queries.
+"""
+
+import logging
+
+from app.config import settings
+from app.services import search_cache
+
+logger = logging.getLogger(__name__)
+
+RRF_K = 60
+
+
+def _result_key(result: dict) -> tuple[str, str]:
+    return result.get("source", ""), result.get("content", "")[:200]
+
+
+def reciprocal_rank_fusion(rankings: list[list[dict]], k: int = RRF_K) -> list[dict]:
+    """Merge ranked result lists; each result scores sum(1 / (k + rank))."""
+    fused: dict[tuple[str, str], dict] = {}
+    scores: dict[tuple[str, str], float] = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, start=1):
+            key = _result_key(result)
+            fused.setdefault(key, result)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    ordered = sorted(scores, key=scores.__getitem__, reverse=True)
+    return [{**fused[key], "score": round(scores[key], 6)} for key in ordered]
+
+
+def retrieve(query: str, top: int = 5) -> list[dict]:
+    """Return the top grounding passages for a RAG query."""
+    keyword_results = search_cache.cached_search(query)
+    if not settings.VECTOR_SEARCH_ENABLED:
+        return keyword_results[:top]
+
+    from app.services.vector_index import get_index
+
+    try:
+        vector_results = get_index().search_text(query, top=top * 2)
+    except Exception:
+        logger.warning("Vector search failed, using keyword results only", exc_info=True)
+        return keyword_results[:top]
+    return reciprocal_rank_fusion([keyword_results, vector_results])[:top]
+
+
+def index_document(filename: str, content: str) -> None:
+    """Add an uploaded document to the vector index when vector search is enabled."""
+    if not settings.VECTOR_SEARCH_ENABLED:
+        return
+    from app.services.vector_index import get_index
+
+    chunks = get_index().add_document(filename, content)
+    logger.info("Indexed %d vector chunks for %s", chunks, filename)
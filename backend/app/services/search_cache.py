@@ -0,0 +1,138 @@
+"""Search query-result cache with index-version invalidation.
+
+/api/search/query and every RAG turn call cached_search() instead of
+search_service.search_documents directly; queries with filters, facets,
+ordering or paging go through cached_query(). Entries are keyed on the
+normalized query, the search options and the current index version; any upload or delete
+calls bump_index_version(), which makes every existing entry unreachable.
+Each entry also carries its own TTL so changes made outside this process
+(e.g. in the Azure portal) are picked up eventually.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from app import metrics
+from app.config import settings
+from app.services import search_query, search_service
+
+# Empty result sets are usually typos or content not indexed yet — keep them briefly
+EMPTY_RESULT_TTL_SECONDS = 10.0
+
+_version = 0
+_version_lock = threading.Lock()
+
+
+def index_version() -> int:
+    return _version
+
+
+def bump_index_version() -> int:
+    """Invalidate all cached results; call after any index write."""
+    global _version
+    with _version_lock:
+        _version += 1
+        _cache.clear()
+    metrics.incr("search_cache.invalidations")
+    return _version
+
+
+def normalize_query(query: str) -> str:
+    """Fold case and whitespace so near-identical queries share an entry."""
+    return " ".join(query.casefold().split()).rstrip("?!. ")
+
+
+class QueryCache:
+    """Bounded LRU cache whose entries each have an expiry time."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, tuple[float, list[dict] | dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> list[dict] | dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                metrics.incr("search_cache.expired")
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value: list[dict] | dict, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.incr("search_cache.evictions")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache = QueryCache(settings.SEARCH_CACHE_MAX_ENTRIES)
+
+metrics.register_gauge("search_cache.entries", lambda: len(_cache))
+metrics.register_gauge("search_cache.index_version", index_version)
+metrics.register_gauge(
+    "search_cache.hit_rate", lambda: metrics.ratio("search_cache.hits", ["search_cache.hits", "search_cache.misses"])
+)
+
+
+def cached_search(query: str) -> list[dict]:
+    """search_service.search_documents with result caching."""
+    ttl = settings.SEARCH_CACHE_TTL_SECONDS
+    if ttl <= 0:
+        return search_service.search_documents(query)
+
+    # Capture the version before searching: a write that lands mid-search
+    # makes this entry unreachable instead of caching stale results under the new version
+    key = (normalize_query(query), settings.SEARCH_BACKEND, index_version())
+    cached = _cache.get(key)
+    if cached is not None:
+        metrics.incr("search_cache.hits")
+        return list(cached)
+
+    metrics.incr("search_cache.misses")
+    results = search_service.search_documents(query)
+    _cache.put(key, results, ttl if results else min(ttl, EMPTY_RESULT_TTL_SECONDS))
+    return list(results)
+
+
+def cached_query(query: str, options: search_query.SearchOptions) -> dict:
+    """search_query.search with result caching; options (filter, facets, cursor, ...) are part of the key."""
+    ttl = settings.SEARCH_CACHE_TTL_SECONDS
+    if ttl <= 0:
+        return search_query.search(query, options)
+
+    key = ("query", normalize_query(query), options, settings.SEARCH_BACKEND, index_version())
+    cached = _cache.get(key)
+    if isinstance(cached, dict):
+        metrics.incr("search_cache.hits")
+        return dict(cached)
+
+    metrics.incr("search_cache.misses")
+    result = search_query.search(query, options)
+    _cache.put(key, result, ttl if result["results"] else min(ttl, EMPTY_RESULT_TTL_SECONDS))
+    return dict(result)
+
+
+def stats() -> dict:
+    return {
+        "entries": len(_cache),
+        "index_version": index_version(),
+        "hits": metrics.get("search_cache.hits"),
+        "misses": metrics.get("search_cache.misses"),
+        "hit_rate": metrics.ratio("search_cache.hits", ["search_cache.hits", "search_cache.misses"]),
+        "ttl_seconds": settings.SEARCH_CACHE_TTL_SECONDS,
+    }
@@ -0,0 +1,209 @@
+"""Filtered, faceted and paged search — the /api/search/query options beyond plain text.
+
+search_service.search_documents(query) stays the plain top-10 lab function
+(and what RAG uses). When a request adds any of these options, the router
+calls search() instead:
+    filter    OData $filter, e.g. "category eq 'tutorial' and keyPhrases/any(k: k eq 'azure')"
+    facets    Azure facet specs, e.g. ["category", "keyPhrases,count:20"]
+    select    fields to return (results then carry score plus those fields)
+    orderby   "field [asc|desc], ...", default search.score() desc
+    top       page size
+    cursor    next_cursor from the previous page
+
+Backends:
+    local     LocalSearchIndex.query() — filters and facets on per-segment
+              columns (see local_search)
+    azure     pushed down through azure_clients.get_search_client(); the index
+              fields used need the filterable / facetable / sortable
+              attributes, and cursor paging with orderby needs a sortable id
+    demo      DEMO_MODE with the azure backend: mock results, filtered and
+              faceted locally
+
+Paging is cursor-based. A cursor holds the last result's sort values and
+the next page starts after them (search-after), so deep pages cost the same
+as the first one. On Azure the cursor becomes a range filter on the orderby
+fields plus id; relevance-ordered Azure results can't be filtered by score
+and page with skip instead.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+from dataclasses import dataclass
+
+from app.config import settings
+from app.services import odata
+
+
+@dataclass(frozen=True)
+class SearchOptions:
+    filter: str | None = None
+    facets: tuple[str, ...] = ()
+    select: tuple[str, ...] | None = None
+    orderby: str | None = None
+    top: int = 10
+    cursor: str | None = None
+
+
+def _fingerprint(query: str, options: SearchOptions) -> str:
+    from app.services.search_cache import normalize_query
+
+    # Cursors are only valid for the query they came from. Normalized like the
+    # result cache key: a cached page (and its cursor) is shared by "Azure" and "azure"
+    basis = json.dumps([settings.SEARCH_BACKEND, normalize_query(query), options.filter, options.orderby])
+    return hashlib.sha256(basis.encode()).hexdigest()[:16]
+
+
+def encode_cursor(query: str, options: SearchOptions, position: dict) -> str:
+    payload = json.dumps({"q": _fingerprint(query, options), **position}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(query: str, options: SearchOptions) -> dict | None:
+    if not options.cursor:
+        return None
+    try:
+        padded = options.cursor + "=" * (-len(options.cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(position, dict) or position.pop("q", None) != _fingerprint(query, options):
+        raise ValueError("Cursor does not belong to this query")
+    return position
+
+
+def search(query: str, options: SearchOptions) -> dict:
+    """Run a search with options. Returns {"results", "count", "facets", "next_cursor"}.
+
+    Raises ValueError for invalid options (bad filter syntax, unknown cursor).
+    """
+    orderby = odata.parse_orderby(options.orderby) if options.orderby else []
+    select = [odata.check_field(f) for f in options.select] if options.select is not None else None
+    position = decode_cursor(query, options)
+
+    if settings.SEARCH_BACKEND == "azure" and not settings.DEMO_MODE:
+        return _azure_search(query, options, orderby, select, position)
+
+    filter_node = odata.parse_filter(options.filter) if options.filter else None
+    facets = [odata.parse_facet(spec) for spec in options.facets]
+    after = position.get("after") if position else None
+    if settings.SEARCH_BACKEND == "local":
+        from app.services.local_search import get_index
+
+        result = get_index().query(query, filter_node, facets, orderby, select, options.top, after)
+    else:
+        result = _demo_search(query, filter_node, facets, orderby, select, options.top, after)
+    next_after = result.pop("after")
+    result["next_cursor"] = encode_cursor(query, options, {"after": next_after}) if next_after else None
+    return result
+
+
+def _demo_search(query, filter_node, facets, orderby, select, top, after) -> dict:
+    from app.services.local_search import DocTable, execute, tokenize
+    from app.services.mock_data import mock_search_documents
+
+    results = mock_search_documents()
+    docs = [
+        {"id": f"demo-{i}", "content": r.get("content", ""), "source": r.get("source"), **r.get("metadata", {})}
+        for i, r in enumerate(results)
+    ]
+    scores = {i: r.get("score", 1.0) for i, r in enumerate(results)}
+    return execute([(DocTable(docs), None, scores)], tokenize(query), filter_node, facets, orderby, select, top, after)
+
+
+def _keyset_filter(order: list[tuple[str, bool]], values: list) -> str:
+    """OData filter for documents after values in the given order (nulls first asc, last desc)."""
+    if len(values) != len(order):
+        raise ValueError("Invalid cursor")
+    clauses = []
+    for i, (field, descending) in enumerate(order):
+        value = values[i]
+        if value is None:
+            if descending:
+                continue  # nothing sorts after null in descending order
+            after = f"{field} ne null"
+        elif descending:
+            after = f"({field} lt {odata.literal(value)} or {field} eq null)"
+        else:
+            after = f"{field} gt {odata.literal(value)}"
+        equal = [f"{f} eq {odata.literal(v)}" for (f, _), v in zip(order[:i], values[:i], strict=True)]
+        clauses.append("(" + " and ".join([*equal, after]) + ")")
+    return "(" + " or ".join(clauses) + ")" if clauses else "false"
+
+
+def _azure_item(result: dict, select: list[str] | None) -> dict:
+    score = result.get("@search.score", 0.0)
+    highlights = (result.get("@search.highlights") or {}).get("content")
+    if select is not None:
+        item = {"score": score, **{key: result[key] for key in select if key in result}}
+    else:
+        item = {"content": result.get("content", ""), "score": score}
+        if result.get("source"):
+            item["source"] = result["source"]
+        metadata = {key: result[key] for key in ("title", "category", "source") if result.get(key)}
+        if metadata:
+            item["metadata"] = metadata
+    if highlights:
+        item["highlights"] = highlights
+    return item
+
+
+def _azure_search(
+    query: str, options: SearchOptions, orderby: list[tuple[str, bool]], select: list[str] | None, position
+) -> dict:
+    from azure.core.exceptions import HttpResponseError
+
+    from app.services.azure_clients import get_search_client
+
+    keyset = bool(orderby) and all(field != odata.SCORE_FIELD for field, _ in orderby)
+    order = orderby + [("id", False)] if keyset else orderby
+    kwargs: dict = {
+        "search_text": query,
+        "top": options.top + 1,  # one extra to know whether there is a next page
+        "include_total_count": True,
+        "highlight_fields": "content",
+    }
+    filters = [f"({options.filter})"] if options.filter else []
+    if position and keyset:
+        filters.append(_keyset_filter(order, position.get("after", [])))
+    elif position:
+        kwargs["skip"] = position.get("skip", 0)
+    if filters:
+        kwargs["filter"] = " and ".join(filters)
+    if order:
+        kwargs["order_by"] = [f"{field} {'desc' if desc else 'asc'}" for field, desc in order]
+    if options.facets:
+        kwargs["facets"] = list(options.facets)
+    if select is not None:
+        # Sort fields are needed to build the next cursor
+        kwargs["select"] = list(dict.fromkeys([*select, *(f for f, _ in order if f != odata.SCORE_FIELD)]))
+
+    try:
+        results = get_search_client().search(**kwargs)
+        items = list(results)
+        facets = results.get_facets() or {}
+        count = results.get_count()
+    except HttpResponseError as e:
+        if e.status_code == 400:
+            raise ValueError(e.message) from e
+        raise
+
+    page = items[: options.top]
+    next_cursor = None
+    if len(items) > options.top:
+        if keyset:
+            last = page[-1]
+            next_cursor = encode_cursor(query, options, {"after": [last.get(field) for field, _ in order]})
+        else:
+            skip = (position or {}).get("skip", 0) + options.top
+            next_cursor = encode_cursor(query, options, {"skip": skip})
+    return {
+        "results": [_azure_item(r, select) for r in page],
+        "count": count,
+        "facets": {
+            field: [{"value": f.get("value"), "count": f.get("count")} for f in values]
+            for field, values in facets.items()
+        },
+        "next_cursor": next_cursor,
+    }
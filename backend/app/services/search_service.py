@@ -26,6 +26,10 @@ def upload_document(filename: str, content: str) -> None:
         filename: Name of the document file.
         content: Text content of the document.
     """
+    if settings.SEARCH_BACKEND == "local":
+        from app.services.local_search import get_index
+
+        return get_index().upload_document(filename, content)
     if settings.DEMO_MODE:
         from app.services.mock_data import mock_upload_document
 
@@ -49,6 +53,10 @@ def search_documents(query: str) -> list[dict]:
         query: The search query string.
     Returns: List of dicts with keys: content, score, source, highlights, metadata.
     """
+    if settings.SEARCH_BACKEND == "local":
+        from app.services.local_search import get_index
+
+        return get_index().search(query, top=10)
     if settings.DEMO_MODE:
         from app.services.mock_data import mock_search_documents
 
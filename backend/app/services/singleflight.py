@@ -0,0 +1,177 @@
+"""Single-flight request coalescing for identical in-flight service calls.
+
+When a class works through the same lab, many identical requests (the same
+image prompt, the same sample image, the same /api/validate/{lab}) arrive
+together. Routers call services through call(); concurrent calls with the
+same function and arguments share one execution:
+    - the first caller starts the call in a worker thread; later identical
+      callers await the same task instead of going upstream again
+    - the result, or the exception, is delivered to every waiter
+    - a waiter that is cancelled (client disconnect) stops waiting without
+      affecting the others; the shared call is cancelled only when its
+      last waiter goes away
+Nothing is cached: the key is released as soon as the call finishes.
+Dedupe counters per function are reported in /api/metrics.
+
+Zero-copy upload arguments (UPLOAD_ZERO_COPY) are request-scoped: Starlette
+closes them when the leader's request ends, even if followers still wait on
+the shared call. The shared call therefore gets its own spooled copy of each
+file argument, closed when the call finishes.
+
+Simulated replay latency collected by the shared call is added to every
+waiting request, not only the one that started it (see replay.shared_delay).
+"""
+
+import asyncio
+import contextvars
+import functools
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from app import metrics, uploads
+from app.config import settings
+from app.services import replay
+
+# Shared copies of file arguments stay in memory up to this size, then spill to disk
+SPOOL_MAX_BYTES = 1024 * 1024
+
+
+def _feed(hasher, value: Any) -> None:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        hasher.update(b"b%d:" % len(value))
+        hasher.update(value)
+    elif uploads.is_file(value):
+        # Zero-copy uploads are keyed by content, not by file object identity
+        size, content_hash = uploads.digest(value)
+        hasher.update(b"f%d:" % size)
+        hasher.update(content_hash.encode("ascii"))
+    elif isinstance(value, (list, tuple)):
+        hasher.update(b"l%d:" % len(value))
+        for item in value:
+            _feed(hasher, item)
+    else:
+        encoded = json.dumps(value, sort_keys=True, default=repr).encode("utf-8")
+        hasher.update(b"j%d:" % len(encoded))
+        hasher.update(encoded)
+
+
+def _detach(value: Any, owned: list) -> Any:
+    """A copy of a file argument that outlives the request it came from."""
+    if not uploads.is_file(value):
+        return value
+    copy = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)  # noqa: SIM115 — closed when the flight ends
+    position = value.tell()
+    value.seek(0)
+    shutil.copyfileobj(value, copy, uploads.READ_CHUNK_BYTES)
+    value.seek(position)
+    copy.seek(position)
+    owned.append(copy)
+    return copy
+
+
+def function_name(fn: Callable) -> str:
+    return f"{fn.__module__}.{fn.__qualname__}"
+
+
+def call_key(fn: Callable, args: tuple, kwargs: dict) -> str:
+    """SHA-256 over the function's qualified name and its arguments."""
+    hasher = hashlib.sha256(function_name(fn).encode("utf-8"))
+    _feed(hasher, list(args))
+    _feed(hasher, sorted(kwargs.items()))
+    return hasher.hexdigest()
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Task
+    delay: replay.PendingDelay
+    waiters: int = 0
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._flights: dict[str, _Flight] = {}
+        self._stats: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, field: str) -> None:
+        with self._lock:
+            entry = self._stats.setdefault(name, {"calls": 0, "executions": 0, "shared": 0, "errors": 0})
+            entry[field] += 1
+        metrics.incr(f"singleflight.{field}")
+
+    def _finished(self, key: str, flight: _Flight, name: str, owned: list, task: asyncio.Task) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        for file in owned:
+            file.close()
+        if not task.cancelled() and task.exception() is not None:
+            self._count(name, "errors")
+
+    async def call(self, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) in a worker thread, sharing it with identical in-flight calls."""
+        name = function_name(fn)
+        key = call_key(fn, args, kwargs)
+        self._count(name, "calls")
+
+        flight = self._flights.get(key)
+        if flight is None:
+            owned: list = []
+            args = tuple(_detach(a, owned) for a in args)
+            kwargs = {k: _detach(v, owned) for k, v in kwargs.items()}
+            context = contextvars.copy_context()
+            delay = context.run(replay.shared_delay)
+            task = asyncio.create_task(asyncio.to_thread(functools.partial(fn, *args, **kwargs)), context=context)
+            flight = _Flight(task, delay)
+            self._flights[key] = flight
+            task.add_done_callback(functools.partial(self._finished, key, flight, name, owned))
+            self._count(name, "executions")
+        else:
+            self._count(name, "shared")
+
+        flight.waiters += 1
+        try:
+            # shield: one waiter being cancelled must not cancel the shared task
+            result = await asyncio.shield(flight.task)
+            replay.apply_delay(flight.delay.seconds)
+            return result
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {name: dict(entry) for name, entry in sorted(self._stats.items())}
+
+
+_group = SingleFlight()
+
+metrics.register_gauge("singleflight.in_flight", _group.in_flight)
+metrics.register_gauge("singleflight.dedupe_rate", lambda: metrics.ratio("singleflight.shared", ["singleflight.calls"]))
+metrics.register_gauge("singleflight.functions", _group.stats)
+
+
+async def call(fn: Callable, *args, **kwargs):
+    """Coalesced call of a blocking service function; see module docstring.
+
+    With SINGLEFLIGHT_ENABLED off, fn is called directly as before.
+    """
+    if not settings.SINGLEFLIGHT_ENABLED:
+        return fn(*args, **kwargs)
+    return await _group.call(fn, *args, **kwargs)
+
+
+def stats() -> dict:
+    return {"in_flight": _group.in_flight(), "functions": _group.stats()}
@@ -0,0 +1,334 @@
+"""Search-as-you-type — suggestions and term autocomplete from an in-memory prefix index.
+
+Two compressed tries (radix trees) are kept in memory:
+    phrases   document titles and enrichment key phrases, keyed from the start
+              of every word ("azure ai services" is also found by "ai se"),
+              for /api/search/suggest
+    terms     single words from the same text, for /api/search/autocomplete,
+              which completes the last word of the input
+Each node caches its best entries (most documents first), so a lookup is a
+walk down the prefix plus a cached list; an update only clears the caches
+on the paths of the keys it touches.
+
+The tries are built on first use from the local index (SEARCH_BACKEND=local)
+or the incremental indexing manifest, and updated as documents are uploaded
+or removed. With SEARCH_BACKEND=azure and AZURE_SEARCH_SUGGESTER set, both
+endpoints pass through to the index's suggester instead.
+"""
+
+import logging
+import os
+import threading
+
+from app import metrics
+from app.config import settings
+from app.services.local_search import tokenize
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 20  # best entries cached per node; also the largest allowed top
+MAX_KEY_CHARS = 100
+MAX_SOURCES_SHOWN = 3
+
+
+class Entry:
+    """A suggestion: display text and the documents it came from."""
+
+    __slots__ = ("text", "sources", "keys")
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.sources: set[str] = set()
+        self.keys: list[str] = []
+
+    @property
+    def weight(self) -> int:
+        return len(self.sources)
+
+
+class _Node:
+    __slots__ = ("label", "children", "entries", "best")
+
+    def __init__(self, label: str = "") -> None:
+        self.label = label
+        self.children: dict[str, _Node] = {}
+        self.entries: list[Entry] = []  # several phrases can share a key ("ai" and "azure ai")
+        self.best: list[Entry] | None = None  # cached top entries of this subtree
+
+
+def _rank(entry: Entry) -> tuple:
+    return (-entry.weight, len(entry.text), entry.text)
+
+
+class RadixTrie:
+    """Compressed trie from string keys to entries with cached top-N per node."""
+
+    def __init__(self) -> None:
+        self.root = _Node()
+
+    def insert(self, key: str, entry: Entry) -> None:
+        node, rest = self.root, key
+        node.best = None
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                child = node.children[rest[0]] = _Node(rest)
+                rest = ""
+            else:
+                common = len(os.path.commonprefix([child.label, rest]))
+                if common < len(child.label):
+                    # Split the edge: node -> middle -> child
+                    middle = _Node(child.label[:common])
+                    child.label = child.label[common:]
+                    middle.children[child.label[0]] = child
+                    node.children[rest[0]] = middle
+                    child = middle
+                rest = rest[common:]
+            node = child
+            node.best = None
+        if entry not in node.entries:
+            node.entries.append(entry)
+
+    def remove(self, key: str, entry: Entry) -> None:
+        path = self._path(key)
+        if path and entry in path[-1].entries:
+            path[-1].entries.remove(entry)
+        self.touch(key)
+
+    def touch(self, key: str) -> None:
+        """Clear cached rankings along a key's path (after its entry's weight changed)."""
+        for node in self._path(key, partial=True):
+            node.best = None
+
+    def _path(self, key: str, partial: bool = False) -> list[_Node]:
+        node, rest = self.root, key
+        path = [node]
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                return path if partial else []
+            if rest.startswith(child.label):
+                rest = rest[len(child.label) :]
+            elif child.label.startswith(rest) and partial:
+                rest = ""
+            else:
+                return path if partial else []
+            node = child
+            path.append(node)
+        return path
+
+    def _find(self, prefix: str) -> _Node | None:
+        node, rest = self.root, prefix
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                return None
+            if rest.startswith(child.label):
+                rest = rest[len(child.label) :]
+            elif child.label.startswith(rest):
+                rest = ""  # the prefix ends inside this edge
+            else:
+                return None
+            node = child
+        return node
+
+    def _best(self, node: _Node) -> list[Entry]:
+        if node.best is None:
+            candidates = list(node.entries)
+            for child in node.children.values():
+                candidates.extend(self._best(child))
+            # An entry reachable by several keys (word starts) is listed once
+            unique = {id(e): e for e in candidates}.values()
+            node.best = sorted(unique, key=_rank)[:MAX_RESULTS]
+        return node.best
+
+    def complete(self, prefix: str, top: int) -> list[Entry]:
+        node = self._find(prefix)
+        return self._best(node)[:top] if node is not None else []
+
+
+def _normalize(text: str) -> str:
+    return " ".join(tokenize(text))[:MAX_KEY_CHARS]
+
+
+class Suggester:
+    def __init__(self) -> None:
+        self.phrases = RadixTrie()
+        self.terms = RadixTrie()
+        self._phrase_entries: dict[str, Entry] = {}
+        self._term_entries: dict[str, Entry] = {}
+        self._by_source: dict[str, tuple[set[str], set[str]]] = {}
+        self._lock = threading.Lock()
+
+    # --- Updates ---
+
+    def add_document(self, source: str, title: str | None = None, key_phrases: list[str] | None = None) -> None:
+        """Index a document's title (default: its source name) and key phrases, replacing earlier ones."""
+        texts = [title or source, *(key_phrases or [])]
+        phrases: dict[str, str] = {}
+        for text in texts:
+            if normalized := _normalize(text):
+                phrases.setdefault(normalized, text.strip())
+        terms = {token for key in phrases for token in key.split() if len(token) > 1 and not token.isdigit()}
+        with self._lock:
+            self._remove_locked(source)
+            for normalized, text in phrases.items():
+                entry = self._phrase_entries.get(normalized)
+                if entry is None:
+                    entry = self._phrase_entries[normalized] = Entry(text)
+                    words = normalized.split(" ")
+                    # Keyed from every word start, so "ai se" finds "azure ai services"
+                    entry.keys = list(dict.fromkeys(" ".join(words[i:]) for i in range(len(words))))
+                    for key in entry.keys:
+                        self.phrases.insert(key, entry)
+                entry.sources.add(source)
+                for key in entry.keys:
+                    self.phrases.touch(key)
+            for term in terms:
+                entry = self._term_entries.get(term)
+                if entry is None:
+                    entry = self._term_entries[term] = Entry(term)
+                    entry.keys = [term]
+                    self.terms.insert(term, entry)
+                entry.sources.add(source)
+                self.terms.touch(term)
+            self._by_source[source] = (set(phrases), terms)
+        metrics.incr("suggest.updates")
+
+    def remove_document(self, source: str) -> None:
+        with self._lock:
+            self._remove_locked(source)
+
+    def _remove_locked(self, source: str) -> None:
+        previous = self._by_source.pop(source, None)
+        if previous is None:
+            return
+        phrases, terms = previous
+        for registry, trie, keys in (
+            (self._phrase_entries, self.phrases, phrases),
+            (self._term_entries, self.terms, terms),
+        ):
+            for normalized in keys:
+                entry = registry[normalized]
+                entry.sources.discard(source)
+                if not entry.sources:
+                    del registry[normalized]
+                    for key in entry.keys:
+                        trie.remove(key, entry)
+                else:
+                    for key in entry.keys:
+                        trie.touch(key)
+
+    # --- Lookups ---
+
+    def suggest(self, text: str, top: int = 5) -> list[dict]:
+        prefix = _normalize(text)
+        if not prefix:
+            return []
+        with self._lock:
+            entries = self.phrases.complete(prefix, top)
+            return [{"text": e.text, "sources": sorted(e.sources)[:MAX_SOURCES_SHOWN]} for e in entries]
+
+    def autocomplete(self, text: str, top: int = 5) -> list[dict]:
+        """Completions of the last (partial) word, Azure "oneTerm" mode."""
+        words = text.split()
+        if not words or text[-1].isspace():
+            return []
+        partial = _normalize(words[-1])
+        if not partial or " " in partial:
+            return []
+        head = " ".join(words[:-1])
+        with self._lock:
+            entries = self.terms.complete(partial, top)
+            return [{"text": e.text, "query_plus_text": f"{head} {e.text}".lstrip()} for e in entries]
+
+    def stats(self) -> dict:
+        return {
+            "phrases": len(self._phrase_entries),
+            "terms": len(self._term_entries),
+            "documents": len(self._by_source),
+        }
+
+
+def _initial_documents() -> dict[str, list[str]]:
+    """source -> titles (other than the source name) and key phrases for everything already indexed."""
+    documents: dict[str, list[str]] = {}
+    if settings.SEARCH_BACKEND == "local":
+        from app.services.local_search import get_index
+
+        for fields in get_index().live_documents():
+            source = fields.get("source") or fields.get("title") or fields.get("id") or ""
+            phrases = documents.setdefault(source, [])
+            title = fields.get("title")
+            for phrase in [*([title] if title and title != source else []), *(fields.get("keyPhrases") or [])]:
+                if phrase not in phrases:
+                    phrases.append(phrase)
+        return documents
+    from app.services.indexing import indexed_documents
+
+    for name in indexed_documents():
+        documents[name] = []
+    if settings.DEMO_MODE and not documents:
+        from app.services.mock_data import mock_search_documents
+
+        for result in mock_search_documents():
+            documents[result.get("source", "demo")] = []
+    return documents
+
+
+_suggester: Suggester | None = None
+_suggester_lock = threading.Lock()
+
+
+def get_suggester() -> Suggester:
+    """The process-wide suggester, built from the current index on first use."""
+    global _suggester
+    with _suggester_lock:
+        if _suggester is None:
+            suggester = Suggester()
+            for source, key_phrases in _initial_documents().items():
+                suggester.add_document(source, key_phrases=key_phrases)
+            metrics.register_gauge("suggest.phrases", lambda: len(suggester._phrase_entries))
+            _suggester = suggester
+            logger.info("Suggestion index built: %s", suggester.stats())
+        return _suggester
+
+
+def _azure_suggester() -> str | None:
+    if settings.SEARCH_BACKEND == "azure" and settings.AZURE_SEARCH_SUGGESTER and not settings.DEMO_MODE:
+        return settings.AZURE_SEARCH_SUGGESTER
+    return None
+
+
+def suggest(text: str, top: int = 5) -> list[dict]:
+    """Titles and key phrases matching the typed prefix: [{"text", "sources"}]."""
+    if suggester_name := _azure_suggester():
+        from app.services.azure_clients import get_search_client
+
+        results = get_search_client().suggest(search_text=text, suggester_name=suggester_name, top=top)
+        return [{"text": r["@search.text"], "sources": [r["source"]] if r.get("source") else []} for r in results]
+    return get_suggester().suggest(text, top)
+
+
+def autocomplete(text: str, top: int = 5) -> list[dict]:
+    """Completions of the last typed word: [{"text", "query_plus_text"}]."""
+    if suggester_name := _azure_suggester():
+        from app.services.azure_clients import get_search_client
+
+        results = get_search_client().autocomplete(
+            search_text=text, suggester_name=suggester_name, mode="oneTerm", top=top
+        )
+        return [{"text": r["text"], "query_plus_text": r["query_plus_text"]} for r in results]
+    return get_suggester().autocomplete(text, top)
+
+
+def add_document(source: str, key_phrases: list[str] | None = None) -> None:
+    """Called after a document is indexed."""
+    if _azure_suggester() is None:
+        get_suggester().add_document(source, key_phrases=key_phrases)
+
+
+def remove_document(source: str) -> None:
+    """Called after a document is removed from the index."""
+    if _azure_suggester() is None:
+        get_suggester().remove_document(source)
@@ -0,0 +1,274 @@
+"""Token accounting and budget enforcement for OpenAI chat calls.
+
+The chat and agent routers wrap every upstream call in admit() / settle():
+    admit    counts the prompt (tiktoken when installed, otherwise a
+             character heuristic; counts are cached by a digest of the text), trims
+             or rejects prompts over TOKEN_MAX_PROMPT_TOKENS, clamps
+             max_tokens to TOKEN_MAX_COMPLETION_TOKENS, checks the caller's
+             TOKEN_DAILY_BUDGET and reserves the prompt plus max_tokens
+             against it, in one step under the ledger lock, so concurrent
+             requests cannot all pass the check before any of them is charged.
+    settle   replaces the reservation with the prompt and completion tokens
+             the service reported (see usage.py), falling back to local counts.
+    release  drops the reservation of a call that failed or whose reply was
+             never delivered.
+Callers are identified by client IP, which the server controls (uvicorn takes
+it from X-Forwarded-For only for --forwarded-allow-ips proxies); a
+client-chosen header would let anyone start a fresh budget per request.
+Each caller sees its own daily totals at /api/usage; /api/metrics has only
+aggregates.
+"""
+
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import Request
+
+from app import metrics
+from app.config import settings
+from app.services import usage
+
+logger = logging.getLogger(__name__)
+
+# Chat format overhead per message and per reply, as documented for the GPT-4 family
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+COUNT_CACHE_SIZE = 8192
+
+
+class TokenLimitError(Exception):
+    """The prompt cannot fit within TOKEN_MAX_PROMPT_TOKENS."""
+
+
+class BudgetExceededError(Exception):
+    """The caller has used up today's token budget."""
+
+
+# === Counting ===
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+    except ImportError:
+        logger.info("tiktoken not installed, using approximate token counts")
+        return None
+    return tiktoken.get_encoding("o200k_base")
+
+
+# Keyed by digest: messages can be 50k characters, too big to keep as cache keys
+_counts: OrderedDict[bytes, int] = OrderedDict()
+_counts_lock = threading.Lock()
+
+
+def count(text: str) -> int:
+    """Tokens in text; cached, so history resent every turn is only counted once."""
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    with _counts_lock:
+        cached = _counts.get(key)
+        if cached is not None:
+            _counts.move_to_end(key)
+            return cached
+    encoding = _encoding()
+    tokens = len(text) // 4 + 1 if encoding is None else len(encoding.encode(text, disallowed_special=()))
+    with _counts_lock:
+        _counts[key] = tokens
+        if len(_counts) > COUNT_CACHE_SIZE:
+            _counts.popitem(last=False)
+    return tokens
+
+
+def count_messages(messages: list[dict]) -> int:
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        content = message.get("content") or ""
+        total += TOKENS_PER_MESSAGE + count(content if isinstance(content, str) else str(content))
+    return total
+
+
+def _trim(messages: list[dict], limit: int) -> list[dict]:
+    """Drop the oldest non-system messages before the final user turn until the prompt fits."""
+    messages = list(messages)
+    last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=len(messages))
+    index = 0
+    while count_messages(messages) > limit:
+        while index < last_user and messages[index].get("role") == "system":
+            index += 1
+        if index >= last_user:
+            raise TokenLimitError(f"Prompt exceeds {limit} tokens even after dropping earlier turns.")
+        messages.pop(index)
+        last_user -= 1
+    return messages
+
+
+# === Daily budgets ===
+
+
+def _today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+class BudgetLedger:
+    """Tokens used and reserved per client key for the current UTC day."""
+
+    def __init__(self) -> None:
+        self._day = _today()
+        self._used: dict[str, dict[str, int]] = {}
+        self._reserved: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _roll(self) -> None:
+        today = _today()
+        if today != self._day:
+            self._day = today
+            self._used.clear()
+            # Reservations of calls still in flight carry over; they settle into the new day
+
+    def reserve(self, key: str, needed: int, amount: int) -> bool:
+        """Reserve amount tokens if needed tokens still fit in today's budget (counting other reservations)."""
+        with self._lock:
+            self._roll()
+            entry = self._used.get(key)
+            used = entry["prompt_tokens"] + entry["completion_tokens"] if entry else 0
+            remaining = _remaining(used + self._reserved.get(key, 0))
+            if remaining is not None and needed > remaining:
+                return False
+            self._reserved[key] = self._reserved.get(key, 0) + amount
+            return True
+
+    def release(self, key: str, amount: int) -> None:
+        with self._lock:
+            self._release(key, amount)
+
+    def _release(self, key: str, amount: int) -> None:
+        left = self._reserved.get(key, 0) - amount
+        if left > 0:
+            self._reserved[key] = left
+        else:
+            self._reserved.pop(key, None)
+
+    def charge(self, key: str, prompt_tokens: int, completion_tokens: int, reserved: int = 0) -> None:
+        """Record a call, replacing its reservation."""
+        with self._lock:
+            self._roll()
+            self._release(key, reserved)
+            entry = self._used.setdefault(key, {"prompt_tokens": 0, "completion_tokens": 0, "requests": 0})
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["requests"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._roll()
+            return {"date": self._day, "keys": {k: dict(v) for k, v in self._used.items()}}
+
+
+_ledger = BudgetLedger()
+
+
+def _remaining(used: int) -> int | None:
+    budget = settings.TOKEN_DAILY_BUDGET
+    return max(budget - used, 0) if budget > 0 else None
+
+
+metrics.register_gauge(
+    "tokens.keys_over_budget",
+    lambda: sum(
+        1
+        for entry in _ledger.snapshot()["keys"].values()
+        if _remaining(entry["prompt_tokens"] + entry["completion_tokens"]) == 0
+    ),
+)
+metrics.register_gauge("tokens.keys_today", lambda: len(_ledger.snapshot()["keys"]))
+
+
+def client_key(request: Request) -> str:
+    """Budget (and conversation owner) key for a request: the client IP."""
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def usage_report(key: str) -> dict:
+    """Today's usage and remaining budget for one caller."""
+    snapshot = _ledger.snapshot()
+    used = snapshot["keys"].get(key, {"prompt_tokens": 0, "completion_tokens": 0, "requests": 0})
+    return {
+        "date": snapshot["date"],
+        "daily_budget": settings.TOKEN_DAILY_BUDGET or None,
+        **used,
+        "remaining": _remaining(used["prompt_tokens"] + used["completion_tokens"]),
+    }
+
+
+# === Admission and settlement ===
+
+
+@dataclass
+class Admission:
+    key: str
+    messages: list[dict]
+    max_tokens: int | None
+    prompt_tokens: int
+    usage_before: tuple[int, int, int]
+    reserved: int = 0  # held against the budget until settle() or release()
+
+
+def _usage_totals() -> tuple[int, int, int]:
+    current = usage.current()
+    return (current.prompt_tokens, current.completion_tokens, current.calls) if current else (0, 0, 0)
+
+
+def admit(key: str, messages: list[dict], max_tokens: int | None = None) -> Admission:
+    """Count, trim or reject, and budget-check a request before it goes upstream.
+
+    The returned admission holds a reservation: pass it to settle() or release().
+    Raises: TokenLimitError or BudgetExceededError.
+    """
+    limit = settings.TOKEN_MAX_PROMPT_TOKENS
+    prompt_tokens = count_messages(messages)
+    if prompt_tokens > limit:
+        if settings.PROMPT_LIMIT_POLICY == "reject":
+            metrics.incr("tokens.rejected")
+            raise TokenLimitError(f"Prompt is {prompt_tokens} tokens; the limit is {limit}.")
+        messages = _trim(messages, limit)
+        metrics.incr("tokens.trimmed")
+        logger.info("Trimmed prompt from %d to %d tokens", prompt_tokens, count_messages(messages))
+        prompt_tokens = count_messages(messages)
+
+    if max_tokens is not None and max_tokens > settings.TOKEN_MAX_COMPLETION_TOKENS:
+        max_tokens = settings.TOKEN_MAX_COMPLETION_TOKENS
+
+    reserved = prompt_tokens + (max_tokens or 0)
+    if not _ledger.reserve(key, prompt_tokens, reserved):
+        metrics.incr("tokens.budget_rejections")
+        raise BudgetExceededError(
+            f"Daily token budget of {settings.TOKEN_DAILY_BUDGET} exhausted; resets at 00:00 UTC."
+        )
+    return Admission(key, messages, max_tokens, prompt_tokens, _usage_totals(), reserved)
+
+
+def release(admission: Admission) -> None:
+    """Drop the reservation of a call that will not be settled; a no-op once settled or released."""
+    _ledger.release(admission.key, admission.reserved)
+    admission.reserved = 0
+
+
+def settle(admission: Admission, reply: str) -> dict:
+    """Charge the caller for one completed call, replacing its reservation; returns the tokens recorded."""
+    prompt_before, completion_before, calls_before = admission.usage_before
+    prompt_after, completion_after, calls_after = _usage_totals()
+    if calls_after > calls_before:
+        # The service reported usage — authoritative, includes tool rounds
+        prompt_tokens, completion_tokens = prompt_after - prompt_before, completion_after - completion_before
+    else:
+        prompt_tokens, completion_tokens = admission.prompt_tokens, count(reply)
+    _ledger.charge(admission.key, prompt_tokens, completion_tokens, admission.reserved)
+    admission.reserved = 0
+    metrics.incr("tokens.prompt", prompt_tokens)
+    metrics.incr("tokens.completion", completion_tokens)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
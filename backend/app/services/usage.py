@@ -0,0 +1,81 @@
+"""Per-request and process-wide token usage from upstream responses.
+
+Routers call track() at the start of a request; every OpenAI call made while
+handling it — including from worker threads started with asyncio.to_thread,
+which copy the context — reports into that request's Usage via
+record_response(). Totals, including prompt tokens served from the
+provider's prompt cache, also go to /api/metrics.
+"""
+
+import contextvars
+import threading
+from dataclasses import dataclass, field
+
+from app import metrics
+
+
+@dataclass
+class Usage:
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    calls: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> None:
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cached_tokens += cached_tokens
+            self.calls += 1
+
+    def as_dict(self) -> dict | None:
+        """Usage for a response body, or None when no upstream call reported usage."""
+        if not self.calls:
+            return None
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "calls": self.calls,
+        }
+
+
+_current: contextvars.ContextVar[Usage | None] = contextvars.ContextVar("usage", default=None)
+
+metrics.register_gauge(
+    "openai.prompt_cache_hit_rate", lambda: metrics.ratio("openai.cached_tokens", ["openai.prompt_tokens"])
+)
+
+
+def track() -> Usage:
+    """Start accumulating usage for the current request."""
+    usage = Usage()
+    _current.set(usage)
+    return usage
+
+
+def current() -> Usage | None:
+    return _current.get()
+
+
+def record(prompt_tokens: int, completion_tokens: int = 0, cached_tokens: int = 0) -> None:
+    metrics.incr("openai.prompt_tokens", prompt_tokens)
+    metrics.incr("openai.completion_tokens", completion_tokens)
+    metrics.incr("openai.cached_tokens", cached_tokens)
+    usage = _current.get()
+    if usage is not None:
+        usage.add(prompt_tokens, completion_tokens, cached_tokens)
+
+
+def record_response(response) -> None:
+    """Record the usage block of an OpenAI SDK response (chat or embeddings)."""
+    data = getattr(response, "usage", None)
+    if data is None:
+        return
+    details = getattr(data, "prompt_tokens_details", None)
+    record(
+        prompt_tokens=getattr(data, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(data, "completion_tokens", 0) or 0,
+        cached_tokens=(getattr(details, "cached_tokens", 0) or 0) if details is not None else 0,
+    )
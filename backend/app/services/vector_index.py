@@ -0,0 +1,277 @@
+"""Local vector index — chunk embeddings with approximate nearest-neighbour search.
+
+Enabled with VECTOR_SEARCH_ENABLED=true. Uploaded documents are chunked,
+embedded in batches (app/services/embeddings.py) and appended to one
+contiguous float32/float16 matrix that lives in a memory-mapped file.
+Queries use an IVF (inverted file) index once the corpus is large enough and
+a vectorized brute-force scan below that.
+
+On-disk layout (default backend/data/vector-index):
+    vectors.bin    row-major matrix, `capacity` rows of `dim` values
+    chunks.jsonl   one line per row: id, content, source, title
+    meta.json      embedding model, dim, dtype, row count, capacity, deleted rows
+"""
+
+import json
+import logging
+import os
+import pathlib
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.services import embeddings
+from app.services.indexing import chunk_text
+from app.services.local_search import document_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = pathlib.Path(__file__).resolve().parent.parent.parent / "data" / "vector-index"
+
+INITIAL_CAPACITY = 1024
+
+# IVF is rebuilt once this fraction of rows was added after the last build
+IVF_REBUILD_RATIO = 0.25
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 20_000
+
+
+class IVFIndex:
+    """Inverted-file ANN index: k-means centroids with per-cluster row lists."""
+
+    def __init__(self, vectors: np.ndarray, live: np.ndarray, seed: int = 0) -> None:
+        rows = np.flatnonzero(live)
+        self.size = len(vectors)
+        n_lists = max(1, int(np.sqrt(len(rows))))
+        rng = np.random.default_rng(seed)
+
+        sample = rows if len(rows) <= KMEANS_SAMPLE else rng.choice(rows, KMEANS_SAMPLE, replace=False)
+        data = np.asarray(vectors[sample], dtype=np.float32)
+        centroids = data[rng.choice(len(data), n_lists, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = data[assign == c]
+                if len(members):
+                    mean = members.mean(axis=0)
+                    centroids[c] = mean / (np.linalg.norm(mean) or 1.0)
+        self.centroids = centroids
+
+        assign = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), 8192):
+            block = np.asarray(vectors[rows[start : start + 8192]], dtype=np.float32)
+            assign[start : start + 8192] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(n_lists + 1))
+        self.lists = [rows[order[bounds[c] : bounds[c + 1]]] for c in range(n_lists)]
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        probe = np.argsort(self.centroids @ query)[::-1][:nprobe]
+        return np.concatenate([self.lists[c] for c in probe])
+
+
+class VectorIndex:
+    """Append-only memory-mapped vector store with IVF and brute-force search."""
+
+    def __init__(self, directory: pathlib.Path, dim: int, dtype: str = "float32", model: str = "") -> None:
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.model = model
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.capacity = 0
+        self.deleted: set[int] = set()
+        self.chunks: list[dict] = []
+        self._rows_by_id: dict[str, int] = {}
+        self._vectors: np.memmap | None = None
+        self._ivf: IVFIndex | None = None
+        self._lock = threading.RLock()
+        self._load()
+
+    # --- Persistence ---
+
+    @property
+    def _vectors_path(self) -> pathlib.Path:
+        return self.directory / "vectors.bin"
+
+    def _load(self) -> None:
+        meta_path = self.directory / "meta.json"
+        if not meta_path.exists():
+            return
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if (meta.get("model", ""), meta["dim"], meta["dtype"]) != (self.model, self.dim, self.dtype.name):
+            logger.warning("Vector index model/dim/dtype changed — starting a new index")
+            for name in ("vectors.bin", "chunks.jsonl", "meta.json"):
+                (self.directory / name).unlink(missing_ok=True)
+            return
+        self.count = meta["count"]
+        self.capacity = meta["capacity"]
+        self.deleted = set(meta.get("deleted", []))
+        chunks_path = self.directory / "chunks.jsonl"
+        with open(chunks_path, encoding="utf-8") as f:
+            lines = f.readlines()
+        if len(lines) > self.count:
+            # An add was interrupted after writing chunks but before meta.json — drop the orphans
+            chunks_path.write_text("".join(lines[: self.count]), encoding="utf-8")
+        self.chunks = [json.loads(line) for line in lines[: self.count]]
+        self._rows_by_id = {c["id"]: row for row, c in enumerate(self.chunks) if row not in self.deleted}
+        self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+", shape=(self.capacity, self.dim))
+        logger.info("Loaded vector index: %d live chunks", len(self._rows_by_id))
+
+    def _save_meta(self) -> None:
+        meta = {
+            "model": self.model,
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "count": self.count,
+            "capacity": self.capacity,
+            "deleted": sorted(self.deleted),
+        }
+        tmp = self.directory / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self.directory / "meta.json")
+
+    def _ensure_capacity(self, needed: int) -> np.memmap:
+        """Grow the vector file to hold at least `needed` rows; returns the mapped array."""
+        if needed <= self.capacity and self._vectors is not None:
+            return self._vectors
+        capacity = max(INITIAL_CAPACITY, self.capacity)
+        while capacity < needed:
+            capacity *= 2
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        # Growing the file keeps existing rows in place; the new tail reads as zeros
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * self.dtype.itemsize)
+        self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+        self.capacity = capacity
+        return self._vectors
+
+    # --- Writes ---
+
+    def add(self, chunks: list[dict], vectors: np.ndarray) -> None:
+        """Append chunks (dicts with id, content, source, title) and their vectors."""
+        if not chunks:
+            return
+        with self._lock:
+            self._delete_ids(c["id"] for c in chunks)
+            start = self.count
+            mapped = self._ensure_capacity(start + len(chunks))
+            mapped[start : start + len(chunks)] = vectors.astype(self.dtype)
+            mapped.flush()
+            with open(self.directory / "chunks.jsonl", "a", encoding="utf-8") as f:
+                for offset, chunk in enumerate(chunks):
+                    f.write(json.dumps(chunk) + "\n")
+                    self._rows_by_id[chunk["id"]] = start + offset
+            self.chunks.extend(chunks)
+            self.count += len(chunks)
+            self._save_meta()
+
+    def add_document(self, filename: str, content: str) -> int:
+        """Chunk, embed and index a document, replacing its previous chunks."""
+        doc_key = document_id(filename)
+        pieces = chunk_text(content)
+        chunks = [
+            {"id": f"{doc_key}_chunk_{i}", "content": piece, "source": filename, "title": filename}
+            for i, piece in enumerate(pieces)
+        ]
+        with self._lock:
+            self.delete_source(filename)
+            self.add(chunks, embeddings.embed_texts(pieces))
+        return len(chunks)
+
+    def delete(self, ids) -> int:
+        with self._lock:
+            removed = self._delete_ids(ids)
+            if removed:
+                self._save_meta()
+            return removed
+
+    def delete_source(self, source: str) -> int:
+        """Delete every chunk that came from the given source file."""
+        with self._lock:
+            ids = [c["id"] for row, c in enumerate(self.chunks) if c["source"] == source and row not in self.deleted]
+            return self.delete(ids)
+
+    def _delete_ids(self, ids) -> int:
+        removed = 0
+        for chunk_id in ids:
+            row = self._rows_by_id.pop(chunk_id, None)
+            if row is not None:
+                self.deleted.add(row)
+                removed += 1
+        return removed
+
+    # --- Reads ---
+
+    def search(self, query_vector: np.ndarray, top: int = 5) -> list[dict]:
+        """Return the top-k chunks by cosine similarity, in the search result shape."""
+        with self._lock:
+            if not self._rows_by_id:
+                return []
+            query = np.asarray(query_vector, dtype=np.float32).ravel()
+            rows, scores = self._candidates(query)
+            if len(rows) > top:
+                best = np.argpartition(scores, -top)[-top:]
+                rows, scores = rows[best], scores[best]
+            order = np.argsort(scores)[::-1]
+            return [self._to_result(int(rows[i]), float(scores[i])) for i in order]
+
+    def _candidates(self, query: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if self._vectors is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        vectors = self._vectors[: self.count]
+        live = self._live_mask()
+        if self.count < settings.VECTOR_ANN_MIN_SIZE:
+            # Exact scan: one matrix-vector product over the contiguous array
+            scores = np.asarray(vectors, dtype=np.float32) @ query
+            rows = np.arange(self.count)
+            return rows[live], scores[live]
+        if self._ivf is None or self.count - self._ivf.size > IVF_REBUILD_RATIO * self._ivf.size:
+            self._ivf = IVFIndex(vectors, live)
+        # Rows appended after the last IVF build are always scanned
+        tail = np.arange(self._ivf.size, self.count)
+        rows = np.concatenate([self._ivf.candidates(query, settings.VECTOR_IVF_NPROBE), tail])
+        rows = rows[live[rows]]
+        scores = np.asarray(vectors[rows], dtype=np.float32) @ query
+        return rows, scores
+
+    def _live_mask(self) -> np.ndarray:
+        live = np.ones(self.count, dtype=bool)
+        if self.deleted:
+            live[np.fromiter(self.deleted, dtype=np.int64)] = False
+        return live
+
+    def _to_result(self, row: int, score: float) -> dict:
+        chunk = self.chunks[row]
+        return {
+            "content": chunk["content"],
+            "score": round(score, 4),
+            "source": chunk["source"],
+            "metadata": {"title": chunk["title"], "source": chunk["source"], "chunk_id": chunk["id"]},
+        }
+
+    def search_text(self, query: str, top: int = 5) -> list[dict]:
+        return self.search(embeddings.embed_texts([query])[0], top=top)
+
+
+_index: VectorIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> VectorIndex:
+    """Return the process-wide vector index, opening it on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            directory = pathlib.Path(settings.VECTOR_INDEX_DIR) if settings.VECTOR_INDEX_DIR else DEFAULT_INDEX_DIR
+            _index = VectorIndex(
+                directory,
+                dim=embeddings.dimensions(),
+                dtype=settings.VECTOR_DTYPE,
+                model=embeddings.model_name(),
+            )
+        return _index
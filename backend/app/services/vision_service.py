@@ -5,6 +5,7 @@ The router (vision.py) calls these functions — signatures must not change.
 """
 
 import logging
+from typing import BinaryIO
 
 from app.config import settings
 
@@ -18,10 +19,13 @@ logger = logging.getLogger(__name__)
 # See docs/labs/04-vision.md — Layer 1
 
 
-def analyze_image(image_bytes: bytes) -> dict:
+def analyze_image(image_bytes: bytes | BinaryIO) -> dict:
     """Analyze an image for descriptions, tags, and detected objects.
 
     Called by: vision.router /api/vision/analyze
+    Args:
+        image_bytes: Image contents, or with UPLOAD_ZERO_COPY the uploaded
+            file object — analyze_image_in_stream accepts either without copying.
     Returns: Dict with keys like "caption", "tags", "objects".
     """
     if settings.DEMO_MODE:
@@ -45,10 +49,12 @@ def analyze_image(image_bytes: bytes) -> dict:
 # See docs/labs/04-vision.md — Layer 3
 
 
-def ocr_image(image_bytes: bytes) -> dict:
+def ocr_image(image_bytes: bytes | BinaryIO) -> dict:
     """Extract text from an image using the Read API (OCR).
 
     Called by: vision.router /api/vision/ocr
+    Args:
+        image_bytes: Image contents or the uploaded file object (see analyze_image).
     Returns: Dict with key "text" containing a list of extracted lines.
     """
     if settings.DEMO_MODE:
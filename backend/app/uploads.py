@@ -0,0 +1,312 @@
+"""Upload size limits and content sniffing shared by the file upload routes.
+
+Size limits are enforced twice:
+    UploadLimitMiddleware  rejects a request with 413 before the multipart
+                           parser runs: up front when Content-Length is over
+                           the route's limit, otherwise while streaming, as
+                           soon as the received body crosses it (chunked
+                           uploads have no Content-Length)
+    read_upload()          reads the parsed file in chunks and stops at the
+                           limit instead of buffering the whole file first
+Routers register their limit with register_limit() at import time.
+
+read_upload() also checks the file type against the route's allowed types
+using the file's first bytes (magic numbers); the client-supplied
+Content-Type is not trusted.
+
+open_upload() does the same checks, but with UPLOAD_ZERO_COPY on it returns
+the upload's spooled temporary file (rewound) instead of a bytes copy, so
+services can stream it into the outbound request (SDK *_in_stream methods,
+or httpx with content=iter_chunks(source)) and peak memory per upload stays
+roughly constant. Services therefore accept bytes or a binary file object.
+
+download() applies the same size cap and content sniffing to files services
+fetch by URL on a caller's behalf, and only fetches public http(s) URLs.
+"""
+
+import codecs
+import hashlib
+import ipaddress
+import os
+import socket
+import time
+from collections.abc import Iterator
+from typing import BinaryIO
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from fastapi import HTTPException, UploadFile
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import metrics
+from app.config import settings
+from app.responses import FastJSONResponse
+
+READ_CHUNK_BYTES = 1024 * 1024
+SNIFF_BYTES = 8192
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+MAX_REDIRECTS = 3
+
+UploadSource = bytes | BinaryIO
+
+# path -> (max file bytes, label used in the 413 message)
+_limits: dict[str, tuple[int, str]] = {}
+
+_SIGNATURES: list[tuple[int, bytes, str]] = [
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"BM", "image/bmp"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"OggS", "audio/ogg"),
+    (0, b"fLaC", "audio/flac"),
+    (0, b"\x1a\x45\xdf\xa3", "audio/webm"),
+]
+_RIFF_TYPES = {b"WEBP": "image/webp", b"WAVE": "audio/wav"}
+
+
+def sniff_content_type(head: bytes) -> str | None:
+    """Content type from a file's first bytes; "text/plain" for UTF-8 text, None if unknown."""
+    for offset, signature, content_type in _SIGNATURES:
+        if head.startswith(signature, offset):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] in _RIFF_TYPES:
+        return _RIFF_TYPES[head[8:12]]
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return "audio/mpeg"  # MPEG audio frame sync without an ID3 tag
+    if b"\x00" not in head:
+        try:
+            # Incremental decoder: a multi-byte character cut off at the end of head is fine
+            codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+            return "text/plain"
+        except UnicodeDecodeError:
+            pass
+    return None
+
+
+def _allowed(content_type: str | None, allowed_types: set[str]) -> bool:
+    if content_type is None:
+        return False
+    if content_type == "text/plain":
+        # Markdown and CSV are indistinguishable from plain text by content
+        return any(t.startswith("text/") for t in allowed_types)
+    return content_type in allowed_types
+
+
+def _too_large(max_bytes: int, label: str) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"{label} too large. Maximum is {max_bytes // (1024 * 1024)} MB.")
+
+
+def _check_head(head: bytes, allowed_types: set[str] | None) -> None:
+    if not head:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    if allowed_types is not None:
+        detected = sniff_content_type(head)
+        if not _allowed(detected, allowed_types):
+            metrics.incr("uploads.rejected_type")
+            found = f"file type '{detected}'" if detected else "file content (type not recognized)"
+            raise HTTPException(
+                status_code=400, detail=f"Unsupported {found}. Allowed: {', '.join(sorted(allowed_types))}."
+            )
+
+
+async def read_upload(
+    file: UploadFile, max_bytes: int, allowed_types: set[str] | None = None, label: str = "File"
+) -> bytes:
+    """Read an uploaded file, enforcing max_bytes and the sniffed content type.
+
+    Raises: HTTPException 400 (empty or unsupported type) or 413 (over max_bytes).
+    """
+    head = await file.read(SNIFF_BYTES)
+    _check_head(head, allowed_types)
+
+    chunks = [head]
+    size = len(head)
+    while size <= max_bytes:
+        chunk = await file.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    if size > max_bytes:
+        metrics.incr("uploads.rejected_size")
+        raise _too_large(max_bytes, label)
+    return b"".join(chunks)
+
+
+async def open_upload(
+    file: UploadFile, max_bytes: int, allowed_types: set[str] | None = None, label: str = "File"
+) -> UploadSource:
+    """read_upload(), or with UPLOAD_ZERO_COPY the validated upload file itself.
+
+    The returned file object is positioned at the start and stays open until
+    the response has been sent.
+    """
+    if not settings.UPLOAD_ZERO_COPY:
+        return await read_upload(file, max_bytes, allowed_types, label)
+    head = await file.read(SNIFF_BYTES)
+    _check_head(head, allowed_types)
+    size = file.size if file.size is not None else file.file.seek(0, os.SEEK_END)
+    if size > max_bytes:
+        metrics.incr("uploads.rejected_size")
+        raise _too_large(max_bytes, label)
+    await file.seek(0)
+    metrics.incr("uploads.zero_copy")
+    return file.file
+
+
+def is_file(value) -> bool:
+    return hasattr(value, "read") and hasattr(value, "seek")
+
+
+def iter_chunks(source: UploadSource, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[bytes]:
+    """Chunks of bytes or of a file object from its current position; usable as an httpx request body."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), chunk_size):
+            yield bytes(view[start : start + chunk_size])
+        return
+    while chunk := source.read(chunk_size):
+        yield chunk
+
+
+def read_all(source: UploadSource) -> bytes:
+    """Whole contents as bytes, for code that cannot stream."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    source.seek(0)
+    try:
+        return source.read()
+    finally:
+        source.seek(0)
+
+
+def digest(source: UploadSource) -> tuple[int, str]:
+    """(size, SHA-256) of the whole contents; a file object is read in chunks and left where it was."""
+    hasher = hashlib.sha256()
+    size = 0
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        hasher.update(source)
+        return len(source), hasher.hexdigest()
+    position = source.tell()
+    source.seek(0)
+    for chunk in iter_chunks(source):
+        hasher.update(chunk)
+        size += len(chunk)
+    source.seek(position)
+    return size, hasher.hexdigest()
+
+
+def _public_address(host: str, port: int) -> str:
+    """Resolve host; raises ValueError unless every address it resolves to is public."""
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f"Cannot resolve host '{host}'") from e
+    addresses = [str(info[4][0]) for info in infos]
+    # is_global excludes loopback, private, link-local (cloud metadata) and reserved ranges
+    if not addresses or not all(ipaddress.ip_address(a).is_global for a in addresses):
+        raise ValueError(f"URL host '{host}' is not a public address")
+    return addresses[0]
+
+
+def download(
+    url: str, max_bytes: int, allowed_types: set[str] | None = None, label: str = "File", timeout: float = 30.0
+) -> bytes:
+    """Fetch a public http(s) URL with the upload checks: size cap and sniffed content type.
+
+    The host must resolve only to public addresses, and the request goes to the
+    address that was checked (TLS still verifies the hostname), so a DNS change
+    between check and connect cannot point it at an internal service. Redirects
+    are followed up to MAX_REDIRECTS, each target checked again. The body is
+    streamed and abandoned as soon as it crosses max_bytes or the timeout.
+
+    Raises: ValueError (disallowed URL, too large, unsupported type, too slow)
+    or httpx.HTTPError.
+    """
+    from app.services import azure_clients
+
+    client = azure_clients.get_http_client()
+    deadline = time.monotonic() + timeout
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError("Only http and https URLs can be fetched")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        address = _public_address(parts.hostname, port)
+        netloc = f"[{address}]:{port}" if ":" in address else f"{address}:{port}"
+        pinned = urlunsplit((parts.scheme, netloc, parts.path or "/", parts.query, ""))
+        headers = {"Host": parts.netloc.rpartition("@")[2]}
+        extensions = {"sni_hostname": parts.hostname}
+        with client.stream("GET", pinned, headers=headers, extensions=extensions) as response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers["location"])
+                continue
+            response.raise_for_status()
+            declared = response.headers.get("content-length", "")
+            if declared.isdigit() and int(declared) > max_bytes:
+                metrics.incr("uploads.rejected_size")
+                raise ValueError(str(_too_large(max_bytes, label).detail))
+            chunks = []
+            size = 0
+            for chunk in response.iter_bytes(READ_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    metrics.incr("uploads.rejected_size")
+                    raise ValueError(str(_too_large(max_bytes, label).detail))
+                if time.monotonic() > deadline:
+                    raise ValueError(f"Download did not finish within {timeout:g}s")
+                chunks.append(chunk)
+        data = b"".join(chunks)
+        try:
+            _check_head(data[:SNIFF_BYTES], allowed_types)
+        except HTTPException as e:
+            raise ValueError(str(e.detail)) from e
+        return data
+    raise ValueError(f"More than {MAX_REDIRECTS} redirects")
+
+
+def register_limit(path: str, max_bytes: int, label: str = "File") -> None:
+    """Cap the request body size for an upload route (exact path match)."""
+    _limits[path] = (max_bytes, label)
+
+
+class UploadLimitMiddleware:
+    """Rejects oversized upload requests with 413 before their body is buffered."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in _limits:
+            await self.app(scope, receive, send)
+            return
+        max_bytes, label = _limits[scope["path"]]
+        body_limit = max_bytes + MULTIPART_OVERHEAD_BYTES
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > body_limit:
+            metrics.incr("uploads.rejected_early")
+            error = _too_large(max_bytes, label)
+            response = FastJSONResponse({"detail": error.detail}, status_code=413, headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > body_limit:
+                    metrics.incr("uploads.rejected_streaming")
+                    # FastAPI re-raises HTTPExceptions from body parsing, so this becomes the 413 response
+                    raise _too_large(max_bytes, label)
+            return message
+
+        await self.app(scope, limited_receive, send)
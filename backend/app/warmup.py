@@ -0,0 +1,143 @@
+"""Startup warm-up — resolve DNS, open pooled connections and prefetch tokens.
+
+The first request to each Azure service otherwise pays DNS, TLS and token
+acquisition cost. Warm-up runs concurrently for every endpoint configured in
+Settings and records per-service timing. /ready reports 503 until it finishes.
+
+Connections only help if they sit in the pool the real calls use. The shared
+AzureOpenAI client sends through azure_clients.get_http_client(), and the
+SearchClient keeps its own transport, so both are warmed through a cheap SDK
+call. Other endpoints get a HEAD through the shared pool, which resolves DNS
+and warms the TLS session for whichever client the lab code creates.
+"""
+
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.services import azure_clients
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupState:
+    """Tracks warm-up progress for the readiness probe."""
+
+    def __init__(self) -> None:
+        self.done = False
+        self.report: dict = {}
+
+    def mark_done(self, report: dict) -> None:
+        self.report = report
+        self.done = True
+
+
+state = WarmupState()
+
+
+def _sdk_request(call) -> int:
+    """Run a cheap SDK call and return its HTTP status (error statuses included)."""
+    try:
+        call()
+    except Exception as e:
+        status = getattr(e, "status_code", None)
+        if status is None:
+            raise
+        return status
+    return 200
+
+
+# Services whose SDK client owns the connections later requests use
+_SDK_WARMERS = {
+    "openai": lambda: azure_clients.get_openai_client().models.list(),
+    "search": lambda: azure_clients.get_search_client().get_document_count(),
+}
+
+
+async def _warm_endpoint(name: str, url: str) -> dict:
+    """Resolve the host and open a pooled keep-alive connection to it."""
+    host = azure_clients.hostname(url)
+    result: dict = {"service": name, "host": host}
+    loop = asyncio.get_running_loop()
+
+    start = time.perf_counter()
+    try:
+        await loop.getaddrinfo(host, 443)
+        result["dns_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+        # Any HTTP response (even 401/404) means DNS + TCP + TLS are done and the
+        # connection sits in the client's pool for the next request.
+        connect_start = time.perf_counter()
+        if name in _SDK_WARMERS:
+            result["client"] = "sdk"
+            result["http_status"] = await asyncio.to_thread(_sdk_request, _SDK_WARMERS[name])
+        else:
+            response = await asyncio.to_thread(azure_clients.get_http_client().head, url)
+            result["http_status"] = response.status_code
+        result["connect_ms"] = round((time.perf_counter() - connect_start) * 1000, 1)
+        result["status"] = "ok"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = type(e).__name__
+        logger.warning("Warm-up failed for %s (%s): %s", name, host, e)
+    result["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+async def _prefetch_token(scope: str) -> dict:
+    """Fetch an Entra ID token so the credential cache is populated."""
+    result: dict = {"scope": scope}
+    start = time.perf_counter()
+    try:
+        credential = azure_clients.get_token_credential()
+        await asyncio.to_thread(credential.get_token, scope)
+        result["status"] = "ok"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = type(e).__name__
+        logger.warning("Token prefetch failed for %s: %s", scope, e)
+    result["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+async def _with_timeout(coro, label: dict) -> dict:
+    try:
+        return await asyncio.wait_for(coro, timeout=settings.WARMUP_TIMEOUT_SECONDS)
+    except TimeoutError:
+        return {**label, "status": "timeout", "total_ms": settings.WARMUP_TIMEOUT_SECONDS * 1000}
+
+
+async def run_warmup() -> dict:
+    """Warm every configured endpoint concurrently and return a timing report."""
+    if settings.DEMO_MODE or not settings.WARMUP_ON_STARTUP:
+        report: dict = {"skipped": True, "reason": "demo mode" if settings.DEMO_MODE else "disabled"}
+        state.mark_done(report)
+        return report
+
+    start = time.perf_counter()
+    endpoints = azure_clients.configured_endpoints()
+    tasks = [_with_timeout(_warm_endpoint(name, url), {"service": name}) for name, url in endpoints.items()]
+
+    if settings.AZURE_USE_MANAGED_IDENTITY:
+        scopes = [azure_clients.COGNITIVE_SERVICES_SCOPE]
+        if settings.AZURE_SEARCH_ENDPOINT:
+            scopes.append(azure_clients.SEARCH_SCOPE)
+        tasks.extend(_with_timeout(_prefetch_token(scope), {"scope": scope}) for scope in scopes)
+
+    results = await asyncio.gather(*tasks)
+    report = {
+        "skipped": False,
+        "endpoints": [r for r in results if "service" in r],
+        "tokens": [r for r in results if "scope" in r],
+        "total_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    failed = [r for r in results if r["status"] != "ok"]
+    logger.info(
+        "Warm-up finished in %.1f ms (%d targets, %d failed)",
+        report["total_ms"],
+        len(results),
+        len(failed),
+    )
+    state.mark_done(report)
+    return report
@@ -0,0 +1,357 @@
+"""Load test for every API router: throughput and tail latency per endpoint.
+
+Each scenario (one endpoint plus a representative payload) is driven by
+--concurrency workers until --requests responses have been collected.
+For each scenario the report gives RPS, p50/p95/p99/max latency and the
+number of error responses (status >= 400 or transport errors).
+
+Targets:
+    in-process (default)  the app is loaded in this process with DEMO_MODE
+                          on and driven through httpx's ASGI transport; all
+                          local state (search/vector index, caches,
+                          progress) goes to a temporary directory
+    --latency-ms/--jitter-ms
+                          in-process, with every Azure-facing service
+                          function replaced by a local stand-in that sleeps
+                          for the given latency before returning the demo
+                          result — the same blocking behavior as a real SDK
+                          call, so routers that call services on the event
+                          loop show up in the tail latencies
+    --url                 a running server, e.g. uvicorn with
+                          REPLAY_MODE=replay serving recorded responses
+
+Usage (from backend/):
+    python -m benchmarks.bench_api
+    python -m benchmarks.bench_api --concurrency 32 --requests 500 --latency-ms 150 --jitter-ms 50
+    python -m benchmarks.bench_api --scenarios chat rag_chat search_query --output after.json
+    python -m benchmarks.bench_api --compare before.json --output after.json --threshold 15
+    python -m benchmarks.bench_api --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import functools
+import importlib
+import json
+import os
+import pathlib
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import httpx
+
+# 1x1 transparent PNG — small enough that upload cost does not dominate
+_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+_PDF = b"%PDF-1.4\n1 0 obj <<>> endobj\ntrailer <<>>\n%%EOF\n"
+_WAV = (
+    b"RIFF$\x00\x00\x00WAVEfmt \x10\x00\x00\x00\x01\x00\x01\x00\x80>\x00\x00"
+    b"\x00}\x00\x00\x02\x00\x10\x00data\x00\x00\x00\x00"
+)
+_DOCUMENT = (
+    "Azure AI Search supports keyword, vector and hybrid retrieval. Semantic ranking "
+    "re-orders the top results with a language model. Indexers pull data from Blob "
+    "Storage, Cosmos DB and SQL, and skillsets enrich documents during indexing.\n"
+) * 8
+
+_CHAT = [{"role": "user", "content": "Explain the difference between keyword and vector search."}]
+
+# Service functions replaced by latency stand-ins (superset of what the replay backend records)
+STUB_FUNCTIONS: dict[str, list[str]] = {
+    "app.services.openai_service": ["chat_completion", "generate_image", "chat_with_tools", "embed"],
+    "app.services.vision_service": ["analyze_image", "ocr_image"],
+    "app.services.language_service": ["analyze_text", "translate_text", "speech_to_text", "text_to_speech"],
+    "app.services.search_service": ["search_documents", "upload_document"],
+    "app.services.document_service": ["analyze_document"],
+    "app.services.safety_service": ["analyze_text", "check_prompt"],
+}
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    json: dict | None = None
+    files: dict | None = None
+    params: dict | None = None
+
+    def request_kwargs(self, n: int) -> dict:
+        kwargs = {}
+        if self.json is not None:
+            kwargs["json"] = self.json
+        if self.files is not None:
+            # Uploads get a unique name so each one is indexed, not deduplicated
+            kwargs["files"] = {
+                key: (name.format(n=n), content, content_type)
+                for key, (name, content, content_type) in self.files.items()
+            }
+        if self.params is not None:
+            kwargs["params"] = self.params
+        return kwargs
+
+
+SCENARIOS: list[Scenario] = [
+    Scenario("health", "GET", "/health"),
+    Scenario("chat", "POST", "/api/generative/chat", json={"messages": _CHAT}),
+    Scenario("rag_chat", "POST", "/api/generative/chat", json={"messages": _CHAT, "use_rag": True}),
+    Scenario("guarded_chat", "POST", "/api/generative/chat", json={"messages": _CHAT, "guarded": True}),
+    Scenario("image", "POST", "/api/generative/image", json={"prompt": "A lighthouse at dawn, watercolor"}),
+    Scenario("embeddings", "POST", "/api/generative/embeddings", json={"input": ["vector search", "hybrid search"]}),
+    Scenario(
+        "agents",
+        "POST",
+        "/api/agents/chat",
+        json={
+            "agent_id": "bench",
+            "messages": [{"role": "user", "content": "What is 17 * 23?"}],
+            "agent_config": {"id": "bench", "name": "Bench", "instructions": "Be brief.", "tools": ["calculator"]},
+        },
+    ),
+    Scenario("vision_analyze", "POST", "/api/vision/analyze", files={"file": ("image.png", _PNG, "image/png")}),
+    Scenario("vision_ocr", "POST", "/api/vision/ocr", files={"file": ("image.png", _PNG, "image/png")}),
+    Scenario("language_analyze", "POST", "/api/language/analyze", json={"text": _DOCUMENT[:400]}),
+    Scenario("translate", "POST", "/api/language/translate", json={"text": "Good morning, class.", "target": "fi"}),
+    Scenario("text_to_speech", "POST", "/api/language/text-to-speech", json={"text": "Welcome to the lab."}),
+    Scenario(
+        "speech_to_text", "POST", "/api/language/speech-to-text", files={"file": ("audio.wav", _WAV, "audio/wav")}
+    ),
+    Scenario(
+        "search_upload",
+        "POST",
+        "/api/search/upload",
+        files={"file": ("bench-{n}.txt", _DOCUMENT.encode("utf-8"), "text/plain")},
+    ),
+    Scenario("search_query", "POST", "/api/search/query", json={"query": "hybrid retrieval semantic ranking"}),
+    Scenario("documents", "POST", "/api/documents/analyze", files={"file": ("invoice.pdf", _PDF, "application/pdf")}),
+    Scenario("safety_text", "POST", "/api/safety/analyze-text", json={"text": "Have a nice day at the lab."}),
+    Scenario("safety_prompt", "POST", "/api/safety/check-prompt", json={"prompt": "Summarize this article."}),
+    Scenario("progress_get", "GET", "/api/progress"),
+    Scenario("progress_complete", "POST", "/api/progress/complete", json={"lab": "01", "layer": 1}),
+    Scenario("validate", "GET", "/api/validate/01"),
+    Scenario("metrics", "GET", "/api/metrics"),
+]
+
+
+# ---------------------------------------------------------------------------
+# Targets
+# ---------------------------------------------------------------------------
+
+
+def _isolate_local_state(directory: pathlib.Path) -> None:
+    """Point every on-disk store at a scratch directory; must run before the app is imported."""
+    os.environ["DEMO_MODE"] = "true"
+    for setting, name in [
+        ("LOCAL_SEARCH_DIR", "search-index"),
+        ("VECTOR_INDEX_DIR", "vector-index"),
+        ("EMBEDDING_CACHE_DIR", "embedding-cache"),
+        ("IMAGE_CACHE_DIR", "images"),
+        ("DOCUMENTS_DIR", "documents"),
+        ("REPLAY_ARCHIVE", "replay.jsonl.gz"),
+    ]:
+        os.environ[setting] = str(directory / name)
+
+
+def _stub(fn: Callable, latency_s: float, jitter_s: float, rng: random.Random) -> Callable:
+    @functools.wraps(fn)
+    def stand_in(*args, **kwargs):
+        time.sleep(max(0.0, latency_s + rng.uniform(-jitter_s, jitter_s)))
+        return fn(*args, **kwargs)
+
+    return stand_in
+
+
+def install_stand_ins(latency_ms: float, jitter_ms: float, seed: int = 0) -> None:
+    """Replace the Azure-facing service functions with demo results after a simulated delay."""
+    rng = random.Random(seed)  # noqa: S311 — simulated latency jitter, not security
+    for module_name, names in STUB_FUNCTIONS.items():
+        module = importlib.import_module(module_name)
+        for attr in names:
+            setattr(module, attr, _stub(getattr(module, attr), latency_ms / 1000, jitter_ms / 1000, rng))
+
+
+def in_process_client(scratch: pathlib.Path, latency_ms: float, jitter_ms: float) -> httpx.AsyncClient:
+    _isolate_local_state(scratch)
+    from app.main import app
+    from app.routers import progress
+    from app.services import indexing
+
+    progress.PROGRESS_FILE = scratch / "progress.json"
+    indexing.MANIFEST_FILE = scratch / "index-manifest.json"
+    if latency_ms > 0 or jitter_ms > 0:
+        install_stand_ins(latency_ms, jitter_ms)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+
+# ---------------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------------
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+@dataclass
+class ScenarioResult:
+    latencies_ms: list[float] = field(default_factory=list)
+    statuses: dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> dict:
+        lat = self.latencies_ms
+        return {
+            "requests": len(lat),
+            "errors": self.errors,
+            "statuses": dict(sorted(self.statuses.items())),
+            "rps": round(len(lat) / self.seconds, 1) if self.seconds else 0.0,
+            "mean_ms": round(statistics.fmean(lat), 2) if lat else None,
+            "p50_ms": round(_percentile(lat, 50), 2) if lat else None,
+            "p95_ms": round(_percentile(lat, 95), 2) if lat else None,
+            "p99_ms": round(_percentile(lat, 99), 2) if lat else None,
+            "max_ms": round(max(lat), 2) if lat else None,
+        }
+
+
+async def _send(client: httpx.AsyncClient, scenario: Scenario, n: int) -> tuple[float, str]:
+    start = time.perf_counter()
+    try:
+        response = await client.request(scenario.method, scenario.path, **scenario.request_kwargs(n))
+        status = str(response.status_code)
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return (time.perf_counter() - start) * 1000, status
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int, warmup: int
+) -> ScenarioResult:
+    for n in range(warmup):
+        await _send(client, scenario, -1 - n)
+
+    result = ScenarioResult()
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        for n in counter:
+            latency_ms, status = await _send(client, scenario, n)
+            result.latencies_ms.append(latency_ms)
+            result.statuses[status] = result.statuses.get(status, 0) + 1
+            if not status.isdigit() or int(status) >= 400:
+                result.errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, requests)))))
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Reporting and regression comparison
+# ---------------------------------------------------------------------------
+
+
+def print_table(results: dict[str, dict]) -> None:
+    print(f"{'scenario':<20} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'errors':>7}")
+    for name, r in results.items():
+        if not r["requests"]:
+            continue
+        print(
+            f"{name:<20} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+            f"{r['p99_ms']:>8.1f} {r['max_ms']:>8.1f} {r['errors']:>7}"
+        )
+
+
+def compare(baseline: dict, current: dict, threshold_pct: float) -> list[str]:
+    """Print per-scenario deltas; returns the scenarios whose p95 or RPS regressed beyond the threshold."""
+    regressions = []
+    print(
+        f"\n{'scenario':<20} {'p95 before':>11} {'p95 after':>10} {'Δp95':>8} "
+        f"{'rps before':>11} {'rps after':>10} {'Δrps':>8}"
+    )
+    for name, after in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before or not before.get("requests") or not after["requests"]:
+            continue
+        d_p95 = (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        d_rps = (after["rps"] - before["rps"]) / before["rps"] * 100 if before["rps"] else 0.0
+        flag = ""
+        # Sub-millisecond p95 shifts are scheduler noise, not regressions
+        slower = d_p95 > threshold_pct and after["p95_ms"] - before["p95_ms"] > 1.0
+        if slower or d_rps < -threshold_pct:
+            regressions.append(name)
+            flag = "  REGRESSED"
+        print(
+            f"{name:<20} {before['p95_ms']:>11.1f} {after['p95_ms']:>10.1f} {d_p95:>+7.1f}% "
+            f"{before['rps']:>11.1f} {after['rps']:>10.1f} {d_rps:>+7.1f}%{flag}"
+        )
+    return regressions
+
+
+async def _run(args: argparse.Namespace, scenarios: list[Scenario]) -> dict:
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        else:
+            client = in_process_client(pathlib.Path(scratch), args.latency_ms, args.jitter_ms)
+        async with client:
+            results = {}
+            for scenario in scenarios:
+                result = await run_scenario(client, scenario, args.requests, args.concurrency, args.warmup)
+                results[scenario.name] = result.summary()
+                print(f"  {scenario.name:<20} {results[scenario.name]['rps']:>8.1f} rps", file=sys.stderr)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process demo app")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per scenario")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated upstream latency (in-process only)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform ± jitter on the simulated latency")
+    parser.add_argument("--scenarios", nargs="+", choices=[s.name for s in SCENARIOS], help="Run only these")
+    parser.add_argument("--output", type=pathlib.Path, help="Write results as JSON to this file")
+    parser.add_argument("--compare", type=pathlib.Path, help="Baseline JSON from an earlier --output")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Regression threshold in percent")
+    args = parser.parse_args()
+
+    if args.url and (args.latency_ms or args.jitter_ms):
+        parser.error("--latency-ms/--jitter-ms apply to the in-process target only")
+    scenarios = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios]
+
+    results = asyncio.run(_run(args, scenarios))
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "target": args.url or "in-process-demo",
+        "python": platform.python_version(),
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "scenarios": results,
+    }
+    print_table(results)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.compare:
+        regressions = compare(json.loads(args.compare.read_text()), report, args.threshold)
+        if regressions:
+            print(f"\nRegressed beyond {args.threshold:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Encode time and allocation benchmark for JSON response serialization.
+
+Payloads are shaped like mock_analyze_document (pages, tables of cells,
+fields) scaled up to realistic multi-page invoices, plus an embeddings
+response. Each serialization path is timed over --repeat runs and its
+peak allocation measured with tracemalloc:
+    fastapi-default   jsonable_encoder + stdlib json (plain dict routes before)
+    encoder+orjson    jsonable_encoder + orjson (default response class alone)
+    fast-response     FastJSONResponse rendering the dict directly
+    typeadapter       precompiled TypeAdapter(dict[str, Any]).dump_json
+    model             model_response() for EmbeddingsResponse
+    model-default     response model validated, then jsonable_encoder + json
+
+Usage (from backend/):
+    python -m benchmarks.bench_json
+    python -m benchmarks.bench_json --pages 50 --tables 20 --rows 80 --output json.json
+"""
+
+import argparse
+import json
+import pathlib
+import random
+import statistics
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+
+from app.responses import FastJSONResponse, encoder, model_response
+from app.routers.generative import EmbeddingsResponse
+from app.services.mock_data import mock_analyze_document
+
+
+def _stdlib_render(content: Any) -> bytes:
+    # What starlette's JSONResponse.render does
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def document_payload(pages: int, tables: int, rows: int, columns: int) -> dict:
+    """mock_analyze_document scaled up: more pages, bigger tables, more fields."""
+    doc = mock_analyze_document()
+    doc["pages"] = [dict(doc["pages"][0], page_number=n + 1) for n in range(pages)]
+    doc["tables"] = [
+        {
+            "row_count": rows,
+            "column_count": columns,
+            "cells": [
+                {"row": r, "column": c, "content": f"Widget {r}" if c == 0 else f"${r * c * 1.25:.2f}"}
+                for r in range(rows)
+                for c in range(columns)
+            ],
+        }
+        for _ in range(tables)
+    ]
+    fields = dict(doc["fields"])
+    for n in range(40):
+        fields[f"Item{n}"] = {"value": f"Widget {n}", "confidence": round(0.8 + n % 20 / 100, 2)}
+    doc["fields"] = fields
+    return doc
+
+
+def embeddings_payload(inputs: int, dimensions: int) -> EmbeddingsResponse:
+    rng = random.Random(0)  # noqa: S311 — synthetic vectors, not security
+    data = [[rng.uniform(-1, 1) for _ in range(dimensions)] for _ in range(inputs)]
+    return EmbeddingsResponse(model="text-embedding-3-small", dimensions=dimensions, data=data)
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> dict:
+    fn()  # warm caches (TypeAdapter build, imports)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_ms": round(statistics.median(times), 3),
+        "min_ms": round(min(times), 3),
+        "peak_alloc_kb": round(peak / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--tables", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--columns", type=int, default=6)
+    parser.add_argument("--embeddings", type=int, default=64, help="Vectors in the embeddings payload")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", type=pathlib.Path, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    doc = document_payload(args.pages, args.tables, args.rows, args.columns)
+    emb = embeddings_payload(args.embeddings, args.dimensions)
+    dict_encoder = encoder(dict[str, Any])
+
+    cases = {
+        "document": {
+            "fastapi-default": lambda: _stdlib_render(jsonable_encoder(doc)),
+            "encoder+orjson": lambda: FastJSONResponse(jsonable_encoder(doc)).body,
+            "fast-response": lambda: FastJSONResponse(doc).body,
+            "typeadapter": lambda: dict_encoder(doc),
+        },
+        "embeddings": {
+            "model-default": lambda: _stdlib_render(
+                jsonable_encoder(EmbeddingsResponse.model_validate(emb.model_dump()))
+            ),
+            "model": lambda: model_response(emb).body,
+        },
+    }
+
+    report = {
+        "payloads": {
+            "document": {"bytes": len(FastJSONResponse(doc).body), "cells": args.tables * args.rows * args.columns},
+            "embeddings": {"bytes": len(model_response(emb).body), "vectors": args.embeddings},
+        },
+        "results": {},
+    }
+    for payload, paths in cases.items():
+        report["results"][payload] = {name: measure(fn, args.repeat) for name, fn in paths.items()}
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Recall/latency benchmark for the local vector index.
+
+Compares IVF approximate search against exact brute force on synthetic
+clustered embeddings and reports recall@k and query latency percentiles.
+
+Usage (from backend/):
+    python -m benchmarks.bench_vector_search
+    python -m benchmarks.bench_vector_search --rows 100000 --nprobe 4 8 16 --dtype float16
+"""
+
+import argparse
+import json
+import pathlib
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.vector_index import VectorIndex
+
+
+def _synthetic_vectors(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    data = centers[rng.integers(0, clusters, rows)] + 0.35 * rng.normal(size=(rows, dim))
+    return (data / np.linalg.norm(data, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _run_queries(index: VectorIndex, queries: np.ndarray, top: int) -> tuple[list[set[str]], list[float]]:
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.search(query, top=top)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append({h["metadata"]["chunk_id"] for h in hits})
+    return results, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--output", type=pathlib.Path, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    vectors = _synthetic_vectors(args.rows, args.dim, clusters=max(8, args.rows // 500), seed=1)
+    queries = _synthetic_vectors(args.queries, args.dim, clusters=max(8, args.rows // 500), seed=2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(pathlib.Path(tmp), dim=args.dim, dtype=args.dtype)
+        chunks = [{"id": f"c{i}", "content": "", "source": "bench", "title": "bench"} for i in range(args.rows)]
+        start = time.perf_counter()
+        index.add(chunks, vectors)
+        ingest_s = time.perf_counter() - start
+
+        # Exact baseline: force brute force by raising the ANN threshold
+        settings.VECTOR_ANN_MIN_SIZE = args.rows + 1
+        exact, exact_latency = _run_queries(index, queries, args.top)
+
+        report = {
+            "rows": args.rows,
+            "dim": args.dim,
+            "dtype": args.dtype,
+            "ingest_seconds": round(ingest_s, 3),
+            "brute_force": {
+                "p50_ms": round(statistics.median(exact_latency), 3),
+                "p95_ms": round(_percentile(exact_latency, 95), 3),
+            },
+            "ivf": [],
+        }
+
+        settings.VECTOR_ANN_MIN_SIZE = 0
+        build_start = time.perf_counter()
+        index.search(queries[0], top=args.top)  # triggers the IVF build
+        report["ivf_build_seconds"] = round(time.perf_counter() - build_start, 3)
+        for nprobe in args.nprobe:
+            settings.VECTOR_IVF_NPROBE = nprobe
+            approx, latency = _run_queries(index, queries, args.top)
+            recall = statistics.mean(len(a & e) / len(e) for a, e in zip(approx, exact, strict=True) if e)
+            report["ivf"].append(
+                {
+                    "nprobe": nprobe,
+                    f"recall@{args.top}": round(recall, 4),
+                    "p50_ms": round(statistics.median(latency), 3),
+                    "p95_ms": round(_percentile(latency, 95), 3),
+                }
+            )
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""Provision many AI-102 lab environments from a manifest.
+
+Each manifest row is one environment (typically one per student) and is
+provisioned with the same dependency plan as `setup_azure.py --parallel`.
+Environments run on a bounded worker pool, progress is saved to a state
+file after every step, and each environment gets its own env file.
+
+Usage:
+    python backend/scripts/provision_batch.py students.csv
+    python backend/scripts/provision_batch.py students.yaml --workers 6 --region eastus
+    python backend/scripts/provision_batch.py students.csv --retry-failed
+
+Manifest formats:
+    CSV   header row with a "name" column and optional "prefix",
+          "resource_group" and "region" columns
+    JSON  a list of objects with the same keys, or {"environments": [...]}
+    YAML  same shape as JSON (requires PyYAML)
+Defaults: prefix "ai102-<name>", resource group "rg-ai102-<name>",
+region from --region.
+
+Rerunning with the same state file skips steps that already succeeded,
+so an interrupted or partially failed batch can simply be run again.
+
+Requirements: Azure CLI logged in; stdlib only (PyYAML for YAML manifests).
+"""
+
+import argparse
+import csv
+import json
+import os
+import pathlib
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+from setup_azure import (
+    BACKEND_DIR,
+    AzCliError,
+    StepResult,
+    build_plan,
+    env_values,
+    log,
+    raise_for_failures,
+    run_az,
+    run_plan,
+    write_env,
+)
+
+DEFAULT_STATE_FILE = BACKEND_DIR / "data" / "provision-state.json"
+DEFAULT_ENV_DIR = BACKEND_DIR / "envs"
+
+_NAME_PATTERN = re.compile(r"^[a-z0-9][a-z0-9-]{0,30}$")
+
+
+@dataclass
+class Environment:
+    name: str
+    prefix: str
+    resource_group: str
+    region: str
+
+
+# ---------------------------------------------------------------------------
+# Manifest
+# ---------------------------------------------------------------------------
+
+
+def _read_rows(path: pathlib.Path) -> list[dict]:
+    suffix = path.suffix.lower()
+    text = path.read_text(encoding="utf-8")
+    if suffix == ".csv":
+        return [{k.strip(): (v or "").strip() for k, v in row.items()} for row in csv.DictReader(text.splitlines())]
+    if suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            sys.exit("ERROR: YAML manifests need PyYAML (pip install pyyaml), or use CSV/JSON.")
+        data = yaml.safe_load(text)
+    elif suffix == ".json":
+        data = json.loads(text)
+    else:
+        sys.exit(f"ERROR: unsupported manifest type '{suffix}' (use .csv, .json, .yaml)")
+    if isinstance(data, dict):
+        data = data.get("environments", [])
+    return data
+
+
+def load_manifest(path: pathlib.Path, default_region: str) -> list[Environment]:
+    environments = []
+    seen = set()
+    for index, row in enumerate(_read_rows(path), start=1):
+        name = str(row.get("name", "")).strip().lower()
+        if not _NAME_PATTERN.match(name):
+            sys.exit(f"ERROR: manifest row {index}: name '{name}' must be 1-31 lowercase letters, digits or '-'")
+        if name in seen:
+            sys.exit(f"ERROR: manifest row {index}: duplicate environment '{name}'")
+        seen.add(name)
+        environments.append(
+            Environment(
+                name=name,
+                prefix=row.get("prefix") or f"ai102-{name}",
+                resource_group=row.get("resource_group") or f"rg-ai102-{name}",
+                region=row.get("region") or default_region,
+            )
+        )
+    return environments
+
+
+# ---------------------------------------------------------------------------
+# Resumable state
+# ---------------------------------------------------------------------------
+
+
+class StateFile:
+    """Completed steps per environment, rewritten atomically after every step."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: dict[str, dict] = {}
+        if path.exists():
+            self._data = json.loads(path.read_text(encoding="utf-8"))
+
+    def completed(self, env: str) -> dict[str, object]:
+        with self._lock:
+            steps = self._data.get(env, {}).get("steps", {})
+            return {name: step.get("value") for name, step in steps.items() if step.get("status") == "ok"}
+
+    def record_step(self, env: str, result: StepResult) -> None:
+        if result.status != "ok" or result.resumed:
+            return
+        with self._lock:
+            entry = self._data.setdefault(env, {"steps": {}})
+            entry["steps"][result.name] = {"status": "ok", "value": result.value, "seconds": round(result.seconds, 1)}
+            self._save()
+
+    def record_outcome(self, env: str, status: str, error: str = "") -> None:
+        with self._lock:
+            entry = self._data.setdefault(env, {"steps": {}})
+            entry["status"] = status
+            entry["error"] = error
+            self._save()
+
+    def status(self, env: str) -> str:
+        with self._lock:
+            return self._data.get(env, {}).get("status", "")
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+# ---------------------------------------------------------------------------
+# Batch run
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class Outcome:
+    env: Environment
+    status: str  # done | failed | skipped
+    seconds: float = 0.0
+    steps_run: int = 0
+    steps_resumed: int = 0
+    error: str = ""
+
+
+def provision_environment(env: Environment, state: StateFile, env_dir: pathlib.Path, max_workers: int) -> Outcome:
+    start = time.monotonic()
+    results = run_plan(
+        build_plan(env.resource_group, env.region, env.prefix),
+        max_workers=max_workers,
+        completed=state.completed(env.name),
+        on_step=lambda result: state.record_step(env.name, result),
+        label=env.name,
+    )
+    outcome = Outcome(
+        env,
+        status="done",
+        steps_run=sum(1 for r in results.values() if r.status == "ok" and not r.resumed),
+        steps_resumed=sum(1 for r in results.values() if r.resumed),
+    )
+    try:
+        raise_for_failures(results)
+        write_env(**env_values(results), env_file=env_dir / f"{env.name}.env")
+        state.record_outcome(env.name, "done")
+    except (AzCliError, OSError) as e:
+        outcome.status, outcome.error = "failed", str(e)
+        state.record_outcome(env.name, "failed", str(e))
+    outcome.seconds = time.monotonic() - start
+    return outcome
+
+
+def print_report(outcomes: list[Outcome], wall_seconds: float) -> dict:
+    done = [o for o in outcomes if o.status == "done"]
+    failed = [o for o in outcomes if o.status == "failed"]
+    skipped = [o for o in outcomes if o.status == "skipped"]
+    provisioned = [o for o in done if o.steps_run]
+
+    log("\n" + "=" * 60)
+    log("Batch report")
+    log("=" * 60)
+    log(f"  {'environment':<24} {'status':<8} {'run':>4} {'resumed':>8} {'time':>8}")
+    for o in sorted(outcomes, key=lambda o: o.env.name):
+        log(f"  {o.env.name:<24} {o.status:<8} {o.steps_run:>4} {o.steps_resumed:>8} {o.seconds:7.1f}s")
+    log(f"\n  Done: {len(done)}  Failed: {len(failed)}  Skipped (already done): {len(skipped)}")
+    minutes = wall_seconds / 60
+    if provisioned and minutes > 0:
+        log(f"  Throughput: {len(provisioned) / minutes:.1f} environments/min over {wall_seconds:.0f}s")
+    for o in failed:
+        log(f"  FAILED {o.env.name}: {o.error.splitlines()[0] if o.error else 'unknown error'}")
+    return {
+        "wall_seconds": round(wall_seconds, 1),
+        "done": len(done),
+        "failed": len(failed),
+        "skipped": len(skipped),
+        "environments": [
+            {
+                "name": o.env.name,
+                "resource_group": o.env.resource_group,
+                "status": o.status,
+                "seconds": round(o.seconds, 1),
+                "steps_run": o.steps_run,
+                "steps_resumed": o.steps_resumed,
+                "error": o.error,
+            }
+            for o in outcomes
+        ],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Provision one AI-102 lab environment per manifest row.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Example manifest (CSV):\n  name,region\n  jane,swedencentral\n  omar,\n",
+    )
+    parser.add_argument("manifest", type=pathlib.Path, help="CSV, JSON or YAML manifest")
+    parser.add_argument("--region", default="swedencentral", help="Default region (default: swedencentral)")
+    parser.add_argument("--workers", type=int, default=4, help="Environments provisioned at once (default: 4)")
+    parser.add_argument("--max-workers", type=int, default=4, help="Parallel az commands per environment (default: 4)")
+    parser.add_argument("--state-file", type=pathlib.Path, default=DEFAULT_STATE_FILE, help="Resumable progress file")
+    parser.add_argument("--env-dir", type=pathlib.Path, default=DEFAULT_ENV_DIR, help="Directory for <name>.env files")
+    parser.add_argument("--report", type=pathlib.Path, help="Also write the batch report as JSON")
+    parser.add_argument("--retry-failed", action="store_true", help="Only rerun environments that failed before")
+    args = parser.parse_args()
+
+    environments = load_manifest(args.manifest, args.region)
+    state = StateFile(args.state_file)
+
+    print("=" * 60)
+    print("AI-102 Command Center — Batch Environment Setup")
+    print("=" * 60)
+    print(f"Manifest:       {args.manifest} ({len(environments)} environments)")
+    print(f"Workers:        {args.workers} environments x {args.max_workers} az commands")
+    print(f"State file:     {args.state_file}")
+    print(f"Env files:      {args.env_dir}")
+
+    try:
+        account = run_az(["account", "show"])
+        if isinstance(account, dict):
+            print(f"Subscription:   {account.get('name', 'unknown')}")
+    except AzCliError as e:
+        print(f"ERROR: {e}\nRun `az login` first.", file=sys.stderr)
+        sys.exit(1)
+    except FileNotFoundError:
+        print("ERROR: Azure CLI (az) not found. Install it: https://aka.ms/installazurecli", file=sys.stderr)
+        sys.exit(1)
+
+    outcomes: list[Outcome] = []
+    pending = []
+    for env in environments:
+        previous = state.status(env.name)
+        if previous == "done" or (args.retry_failed and previous != "failed"):
+            outcomes.append(Outcome(env, "skipped"))
+        else:
+            pending.append(env)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+        futures = {
+            pool.submit(provision_environment, env, state, args.env_dir, args.max_workers): env for env in pending
+        }
+        for future in as_completed(futures):
+            outcome = future.result()
+            outcomes.append(outcome)
+            log(
+                f"\n  {outcome.env.name}: {outcome.status} in {outcome.seconds:.1f}s "
+                f"({len(outcomes)}/{len(environments)})"
+            )
+
+    report = print_report(outcomes, time.monotonic() - start)
+    if args.report:
+        args.report.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        log(f"  Wrote {args.report}")
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,12 @@ Usage:
     python backend/scripts/setup_azure.py
     python backend/scripts/setup_azure.py --resource-group rg-ai102 --region eastus
     python backend/scripts/setup_azure.py --prefix myprefix --region swedencentral
+    python backend/scripts/setup_azure.py --parallel
+
+With --parallel, independent resources are created concurrently: after the
+resource group, the four accounts are provisioned at the same time and the
+model deployments start as soon as the OpenAI account exists. A per-step
+timing summary is printed at the end.
 
 Requirements:
     - Azure CLI installed and logged in (`az login`)
@@ -23,12 +29,17 @@ Resources created:
 """
 
 import argparse
+import functools
 import json
 import os
 import pathlib
 import subprocess
 import sys
+import threading
 import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 
 BACKEND_DIR = pathlib.Path(__file__).resolve().parent.parent
 ENV_FILE = BACKEND_DIR / ".env"
@@ -38,19 +49,38 @@ ENV_FILE = BACKEND_DIR / ".env"
 # Helpers
 # ---------------------------------------------------------------------------
 
+
+class AzCliError(RuntimeError):
+    """An `az` command failed."""
+
+
+_print_lock = threading.Lock()
+_log_context = threading.local()
+
+
+def log(message: str) -> None:
+    """print() that keeps lines from concurrent steps intact, tagged with the step's label if any."""
+    label = getattr(_log_context, "label", "")
+    if label:
+        message = "\n".join(f"[{label}] {line}" if line else line for line in message.split("\n"))
+    with _print_lock:
+        print(message, flush=True)
+
+
 def run_az(args: list[str], check: bool = True) -> dict | list | str:
-    """Run an `az` command and return parsed JSON output."""
+    """Run an `az` command and return parsed JSON output.
+
+    Raises AzCliError when the command fails and check is set.
+    """
     cmd = ["az"] + args + ["--output", "json"]
     result = subprocess.run(cmd, capture_output=True, text=True)
     if check and result.returncode != 0:
         stderr = result.stderr.strip()
         # Treat "already exists" as success
         if "already exists" in stderr.lower() or "conflict" in stderr.lower():
-            print(f"  (already exists, skipping)")
+            log(f"  (already exists, skipping)")
             return {}
-        print(f"ERROR: {' '.join(cmd)}", file=sys.stderr)
-        print(stderr, file=sys.stderr)
-        sys.exit(1)
+        raise AzCliError(f"{' '.join(cmd)}\n{stderr}")
     if not result.stdout.strip():
         return {}
     try:
@@ -59,180 +89,374 @@ def run_az(args: list[str], check: bool = True) -> dict | list | str:
         return result.stdout.strip()
 
 
-def wait_for_deployment(resource_group: str, account_name: str, deployment_name: str, timeout: int = 120) -> None:
-    """Poll until a cognitive services deployment succeeds."""
-    for _ in range(timeout // 5):
+def wait_for_deployment(
+    resource_group: str,
+    account_name: str,
+    deployment_name: str,
+    timeout: int = 120,
+    initial_delay: float = 2.0,
+    max_delay: float = 15.0,
+) -> None:
+    """Poll until a cognitive services deployment succeeds, backing off exponentially."""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while time.monotonic() < deadline:
         try:
-            result = run_az([
-                "cognitiveservices", "account", "deployment", "show",
-                "--resource-group", resource_group,
-                "--name", account_name,
-                "--deployment-name", deployment_name,
-            ], check=False)
+            result = run_az(
+                [
+                    "cognitiveservices",
+                    "account",
+                    "deployment",
+                    "show",
+                    "--resource-group",
+                    resource_group,
+                    "--name",
+                    account_name,
+                    "--deployment-name",
+                    deployment_name,
+                ],
+                check=False,
+            )
             if isinstance(result, dict):
                 state = result.get("properties", {}).get("provisioningState", "")
                 if state.lower() == "succeeded":
                     return
+                if state.lower() == "failed":
+                    break
         except Exception:
             pass
-        time.sleep(5)
-    print(f"  Warning: deployment {deployment_name} did not reach 'Succeeded' within {timeout}s")
+        time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+        delay = min(delay * 2, max_delay)
+    log(f"  Warning: deployment {deployment_name} did not reach 'Succeeded' within {timeout}s")
 
 
 # ---------------------------------------------------------------------------
 # Resource creation functions
 # ---------------------------------------------------------------------------
 
+
 def create_resource_group(name: str, region: str) -> None:
-    print(f"\n1/5  Resource Group: {name}")
+    log(f"\n1/5  Resource Group: {name}")
     run_az(["group", "create", "--name", name, "--location", region])
-    print(f"  Created in {region}")
+    log(f"  Created in {region}")
+
+
+def create_cognitive_account(resource_group: str, name: str, kind: str, sku: str, region: str) -> None:
+    run_az(
+        [
+            "cognitiveservices",
+            "account",
+            "create",
+            "--resource-group",
+            resource_group,
+            "--name",
+            name,
+            "--kind",
+            kind,
+            "--sku",
+            sku,
+            "--location",
+            region,
+            "--yes",
+        ]
+    )
 
 
-def create_openai(resource_group: str, name: str, region: str) -> dict:
-    print(f"\n2/5  Azure OpenAI: {name}")
-    run_az([
-        "cognitiveservices", "account", "create",
-        "--resource-group", resource_group,
-        "--name", name,
-        "--kind", "OpenAI",
-        "--sku", "S0",
-        "--location", region,
-        "--yes",
-    ])
-
-    # Deploy gpt-4o-mini
-    print("  Deploying gpt-4o-mini...")
-    run_az([
-        "cognitiveservices", "account", "deployment", "create",
-        "--resource-group", resource_group,
-        "--name", name,
-        "--deployment-name", "gpt-4o-mini",
-        "--model-name", "gpt-4o-mini",
-        "--model-version", "2024-07-18",
-        "--model-format", "OpenAI",
-        "--sku-capacity", "10",
-        "--sku-name", "GlobalStandard",
-    ])
-    wait_for_deployment(resource_group, name, "gpt-4o-mini")
-
-    # Deploy dall-e-3
-    print("  Deploying dall-e-3...")
-    run_az([
-        "cognitiveservices", "account", "deployment", "create",
-        "--resource-group", resource_group,
-        "--name", name,
-        "--deployment-name", "dall-e-3",
-        "--model-name", "dall-e-3",
-        "--model-version", "3.0",
-        "--model-format", "OpenAI",
-        "--sku-capacity", "1",
-        "--sku-name", "Standard",
-    ])
-    wait_for_deployment(resource_group, name, "dall-e-3")
-
-    # Get keys
-    keys = run_az([
-        "cognitiveservices", "account", "keys", "list",
-        "--resource-group", resource_group,
-        "--name", name,
-    ])
-    endpoint_info = run_az([
-        "cognitiveservices", "account", "show",
-        "--resource-group", resource_group,
-        "--name", name,
-    ])
+def get_account_credentials(resource_group: str, name: str) -> dict:
+    keys = run_az(
+        [
+            "cognitiveservices",
+            "account",
+            "keys",
+            "list",
+            "--resource-group",
+            resource_group,
+            "--name",
+            name,
+        ]
+    )
+    endpoint_info = run_az(
+        [
+            "cognitiveservices",
+            "account",
+            "show",
+            "--resource-group",
+            resource_group,
+            "--name",
+            name,
+        ]
+    )
     endpoint = endpoint_info.get("properties", {}).get("endpoint", "") if isinstance(endpoint_info, dict) else ""
     key = keys.get("key1", "") if isinstance(keys, dict) else ""
-    print(f"  Endpoint: {endpoint}")
+    log(f"  Endpoint: {endpoint}")
     return {"endpoint": endpoint, "key": key}
 
 
+# Model deployments on the OpenAI account: (deployment/model name, version, capacity, sku)
+MODEL_DEPLOYMENTS = [
+    ("gpt-4o-mini", "2024-07-18", "10", "GlobalStandard"),
+    ("dall-e-3", "3.0", "1", "Standard"),
+]
+
+
+def deploy_model(resource_group: str, account_name: str, model: str, version: str, capacity: str, sku: str) -> None:
+    log(f"  Deploying {model}...")
+    run_az(
+        [
+            "cognitiveservices",
+            "account",
+            "deployment",
+            "create",
+            "--resource-group",
+            resource_group,
+            "--name",
+            account_name,
+            "--deployment-name",
+            model,
+            "--model-name",
+            model,
+            "--model-version",
+            version,
+            "--model-format",
+            "OpenAI",
+            "--sku-capacity",
+            capacity,
+            "--sku-name",
+            sku,
+        ]
+    )
+    wait_for_deployment(resource_group, account_name, model)
+
+
+def create_openai(resource_group: str, name: str, region: str) -> dict:
+    log(f"\n2/5  Azure OpenAI: {name}")
+    create_cognitive_account(resource_group, name, "OpenAI", "S0", region)
+    for model, version, capacity, sku in MODEL_DEPLOYMENTS:
+        deploy_model(resource_group, name, model, version, capacity, sku)
+    return get_account_credentials(resource_group, name)
+
+
 def create_ai_services(resource_group: str, name: str, region: str) -> dict:
-    print(f"\n3/5  Azure AI Services (multi-service): {name}")
-    run_az([
-        "cognitiveservices", "account", "create",
-        "--resource-group", resource_group,
-        "--name", name,
-        "--kind", "CognitiveServices",
-        "--sku", "S0",
-        "--location", region,
-        "--yes",
-    ])
-    keys = run_az([
-        "cognitiveservices", "account", "keys", "list",
-        "--resource-group", resource_group,
-        "--name", name,
-    ])
-    endpoint_info = run_az([
-        "cognitiveservices", "account", "show",
-        "--resource-group", resource_group,
-        "--name", name,
-    ])
-    endpoint = endpoint_info.get("properties", {}).get("endpoint", "") if isinstance(endpoint_info, dict) else ""
-    key = keys.get("key1", "") if isinstance(keys, dict) else ""
-    print(f"  Endpoint: {endpoint}")
-    return {"endpoint": endpoint, "key": key, "region": region}
+    log(f"\n3/5  Azure AI Services (multi-service): {name}")
+    create_cognitive_account(resource_group, name, "CognitiveServices", "S0", region)
+    return {**get_account_credentials(resource_group, name), "region": region}
 
 
 def create_search(resource_group: str, name: str, region: str) -> dict:
-    print(f"\n4/5  Azure AI Search (Free tier): {name}")
-    run_az([
-        "search", "service", "create",
-        "--resource-group", resource_group,
-        "--name", name,
-        "--sku", "free",
-        "--location", region,
-    ])
-    keys = run_az([
-        "search", "admin-key", "show",
-        "--resource-group", resource_group,
-        "--service-name", name,
-    ])
+    log(f"\n4/5  Azure AI Search (Free tier): {name}")
+    run_az(
+        [
+            "search",
+            "service",
+            "create",
+            "--resource-group",
+            resource_group,
+            "--name",
+            name,
+            "--sku",
+            "free",
+            "--location",
+            region,
+        ]
+    )
+    keys = run_az(
+        [
+            "search",
+            "admin-key",
+            "show",
+            "--resource-group",
+            resource_group,
+            "--service-name",
+            name,
+        ]
+    )
     key = keys.get("primaryKey", "") if isinstance(keys, dict) else ""
     endpoint = f"https://{name}.search.windows.net/"
-    print(f"  Endpoint: {endpoint}")
+    log(f"  Endpoint: {endpoint}")
     return {"endpoint": endpoint, "key": key}
 
 
 def create_content_safety(resource_group: str, name: str, region: str) -> dict:
-    print(f"\n5/5  Azure Content Safety (Free tier): {name}")
-    run_az([
-        "cognitiveservices", "account", "create",
-        "--resource-group", resource_group,
-        "--name", name,
-        "--kind", "ContentSafety",
-        "--sku", "F0",
-        "--location", region,
-        "--yes",
-    ])
-    keys = run_az([
-        "cognitiveservices", "account", "keys", "list",
-        "--resource-group", resource_group,
-        "--name", name,
-    ])
-    endpoint_info = run_az([
-        "cognitiveservices", "account", "show",
-        "--resource-group", resource_group,
-        "--name", name,
-    ])
-    endpoint = endpoint_info.get("properties", {}).get("endpoint", "") if isinstance(endpoint_info, dict) else ""
-    key = keys.get("key1", "") if isinstance(keys, dict) else ""
-    print(f"  Endpoint: {endpoint}")
-    return {"endpoint": endpoint, "key": key}
+    log(f"\n5/5  Azure Content Safety (Free tier): {name}")
+    create_cognitive_account(resource_group, name, "ContentSafety", "F0", region)
+    return get_account_credentials(resource_group, name)
+
+
+# ---------------------------------------------------------------------------
+# Parallel provisioning
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class Step:
+    name: str
+    run: Callable[[], object]
+    deps: list[str] = field(default_factory=list)
+
+
+@dataclass
+class StepResult:
+    name: str
+    status: str = "pending"  # pending | ok | failed | skipped
+    value: object = None
+    error: str = ""
+    started: float = 0.0
+    finished: float = 0.0
+    resumed: bool = False
+
+    @property
+    def seconds(self) -> float:
+        return self.finished - self.started if self.finished else 0.0
+
+
+def build_plan(resource_group: str, region: str, prefix: str) -> list[Step]:
+    """Dependency DAG: resource group -> accounts -> model deployments."""
+    openai_name = f"{prefix}-openai"
+    plan = [
+        Step("resource-group", lambda: create_resource_group(resource_group, region)),
+        Step(
+            "openai-account",
+            lambda: create_cognitive_account(resource_group, openai_name, "OpenAI", "S0", region),
+            ["resource-group"],
+        ),
+        Step("openai-keys", lambda: get_account_credentials(resource_group, openai_name), ["openai-account"]),
+        Step(
+            "ai-services",
+            lambda: create_ai_services(resource_group, f"{prefix}-ai-services", region),
+            ["resource-group"],
+        ),
+        Step("search", lambda: create_search(resource_group, f"{prefix}-search", region), ["resource-group"]),
+        Step(
+            "content-safety",
+            lambda: create_content_safety(resource_group, f"{prefix}-content-safety", region),
+            ["resource-group"],
+        ),
+    ]
+    # Deployments on one account are serialized — concurrent ones are rejected with a conflict
+    previous = "openai-account"
+    for model, version, capacity, sku in MODEL_DEPLOYMENTS:
+        plan.append(
+            Step(
+                f"deploy-{model}",
+                functools.partial(deploy_model, resource_group, openai_name, model, version, capacity, sku),
+                [previous],
+            )
+        )
+        previous = f"deploy-{model}"
+    return plan
+
+
+def run_plan(
+    plan: list[Step],
+    max_workers: int = 8,
+    completed: dict[str, object] | None = None,
+    on_step: Callable[[StepResult], None] | None = None,
+    label: str = "",
+) -> dict[str, StepResult]:
+    """Run steps as soon as their dependencies succeed; stop scheduling after a failure.
+
+    completed maps step names to values from an earlier run; those steps are not rerun.
+    on_step is called after each step finishes, e.g. to persist progress.
+    """
+    steps = {step.name: step for step in plan}
+    results = {name: StepResult(name) for name in steps}
+    for name, value in (completed or {}).items():
+        if name in results:
+            results[name].status, results[name].value, results[name].resumed = "ok", value, True
+    running: dict[Future, str] = {}
+    failed = False
+
+    def ready(name: str) -> bool:
+        return results[name].status == "pending" and all(results[d].status == "ok" for d in steps[name].deps)
+
+    def timed(name: str) -> object:
+        _log_context.label = label
+        results[name].started = time.monotonic()
+        try:
+            return steps[name].run()
+        finally:
+            results[name].finished = time.monotonic()
+            _log_context.label = ""
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            if not failed:
+                for name in steps:
+                    if ready(name) and name not in running.values():
+                        running[pool.submit(timed, name)] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name].value = future.result()
+                    results[name].status = "ok"
+                except Exception as e:
+                    results[name].status = "failed"
+                    results[name].error = str(e)
+                    log(f"  FAILED {label + ' ' if label else ''}{name}: {e}")
+                    failed = True
+                if on_step is not None:
+                    on_step(results[name])
+
+    for result in results.values():
+        if result.status == "pending":
+            result.status = "skipped"
+    return results
+
+
+def print_timing_summary(results: dict[str, StepResult], wall_seconds: float) -> None:
+    started = [r.started for r in results.values() if r.started]
+    origin = min(started) if started else 0.0
+    log("\nStep timing")
+    log(f"  {'step':<24} {'status':<8} {'start':>8} {'duration':>9}")
+    for r in sorted(results.values(), key=lambda r: (r.started or float("inf"), r.name)):
+        start = f"{r.started - origin:7.1f}s" if r.started else "       -"
+        status = "resumed" if r.resumed else r.status
+        log(f"  {r.name:<24} {status:<8} {start:>8} {r.seconds:8.1f}s")
+    serial = sum(r.seconds for r in results.values())
+    log(f"  Wall clock {wall_seconds:.1f}s vs {serial:.1f}s if run one after another")
+
+
+def env_values(results: dict[str, StepResult]) -> dict:
+    """write_env() arguments from a successful plan run."""
+    return {
+        "openai": results["openai-keys"].value,
+        "ai_services": results["ai-services"].value,
+        "search": results["search"].value,
+        "content_safety": results["content-safety"].value,
+    }
+
+
+def raise_for_failures(results: dict[str, StepResult]) -> None:
+    failures = [r for r in results.values() if r.status == "failed"]
+    if failures:
+        raise AzCliError("; ".join(f"{r.name}: {r.error.splitlines()[0]}" for r in failures))
+
+
+def provision_parallel(resource_group: str, region: str, prefix: str, max_workers: int = 8) -> dict:
+    """Create all resources concurrently; returns the write_env() arguments."""
+    start = time.monotonic()
+    results = run_plan(build_plan(resource_group, region, prefix), max_workers)
+    print_timing_summary(results, time.monotonic() - start)
+    raise_for_failures(results)
+    return env_values(results)
 
 
 # ---------------------------------------------------------------------------
 # .env generation
 # ---------------------------------------------------------------------------
 
+
 def write_env(
     openai: dict,
     ai_services: dict,
     search: dict,
     content_safety: dict,
+    env_file: pathlib.Path = ENV_FILE,
 ) -> None:
-    """Write or update backend/.env with all connection strings."""
+    """Write or update backend/.env (or env_file) with all connection strings."""
     lines = [
         "# ============================================================",
         "# AI-102 Command Center — Auto-generated by setup_azure.py",
@@ -274,19 +498,21 @@ def write_env(
         "",
     ]
 
-    if ENV_FILE.exists():
-        backup = ENV_FILE.with_suffix(".env.bak")
-        ENV_FILE.rename(backup)
-        print(f"\n  Backed up existing .env to {backup.name}")
+    if env_file.exists():
+        backup = env_file.with_name(env_file.name + ".bak")
+        env_file.replace(backup)
+        log(f"\n  Backed up existing {env_file.name} to {backup.name}")
 
-    ENV_FILE.write_text("\n".join(lines))
-    print(f"  Wrote {ENV_FILE}")
+    env_file.parent.mkdir(parents=True, exist_ok=True)
+    env_file.write_text("\n".join(lines))
+    log(f"  Wrote {env_file}")
 
 
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
 
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Create Azure resources for AI-102 Command Center labs.",
@@ -296,20 +522,35 @@ def main() -> None:
             "  python backend/scripts/setup_azure.py\n"
             "  python backend/scripts/setup_azure.py --prefix ai102-jane --region swedencentral\n"
             "  python backend/scripts/setup_azure.py --resource-group rg-existing --region eastus\n"
+            "  python backend/scripts/setup_azure.py --parallel\n"
         ),
     )
     parser.add_argument(
-        "--resource-group", default="rg-ai102-labs",
+        "--resource-group",
+        default="rg-ai102-labs",
         help="Resource group name (default: rg-ai102-labs)",
     )
     parser.add_argument(
-        "--region", default="swedencentral",
+        "--region",
+        default="swedencentral",
         help="Azure region (default: swedencentral — supports OpenAI + DALL-E)",
     )
     parser.add_argument(
-        "--prefix", default="ai102",
+        "--prefix",
+        default="ai102",
         help="Prefix for resource names (default: ai102)",
     )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Create independent resources concurrently and print a timing summary",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=8,
+        help="Concurrent az commands in --parallel mode (default: 8)",
+    )
     args = parser.parse_args()
 
     rg = args.resource_group
@@ -330,17 +571,29 @@ def main() -> None:
         if isinstance(account, dict):
             sub_name = account.get("name", "unknown")
             print(f"Subscription:   {sub_name}")
+    except AzCliError as e:
+        print(f"ERROR: {e}\nRun `az login` first.", file=sys.stderr)
+        sys.exit(1)
     except FileNotFoundError:
         print("ERROR: Azure CLI (az) not found. Install it: https://aka.ms/installazurecli", file=sys.stderr)
         sys.exit(1)
 
-    create_resource_group(rg, region)
-    openai = create_openai(rg, f"{prefix}-openai", region)
-    ai_services = create_ai_services(rg, f"{prefix}-ai-services", region)
-    search = create_search(rg, f"{prefix}-search", region)
-    content_safety = create_content_safety(rg, f"{prefix}-content-safety", region)
+    try:
+        if args.parallel:
+            resources = provision_parallel(rg, region, prefix, args.max_workers)
+        else:
+            create_resource_group(rg, region)
+            resources = {
+                "openai": create_openai(rg, f"{prefix}-openai", region),
+                "ai_services": create_ai_services(rg, f"{prefix}-ai-services", region),
+                "search": create_search(rg, f"{prefix}-search", region),
+                "content_safety": create_content_safety(rg, f"{prefix}-content-safety", region),
+            }
+    except AzCliError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
 
-    write_env(openai, ai_services, search, content_safety)
+    write_env(**resources)
 
     print("\n" + "=" * 60)
     print("Setup complete!")